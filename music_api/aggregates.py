@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import CatalogVersion, Playlist, PlaylistSong
+
+BATCH_SIZE = 500
+
+
+def touch(*playlist_ids, tracks=0):
+    """Record a change to the given playlists: adjust their track count by
+    ``tracks`` and bump their version and modification time.
+
+    Call it inside the transaction that makes the change, so the aggregates
+    commit or roll back with it.
+    """
+    if not playlist_ids:
+        return
+    Playlist.objects.filter(pk__in=playlist_ids).update(
+        track_count=F('track_count') + tracks,
+        version=F('version') + 1,
+        modified_at=timezone.now(),
+    )
+    touch_catalog('playlists')
+
+
+def touch_catalog(*names):
+    """Record a change to the named collections, 'songs' or 'playlists'."""
+    values = {'version': F('version') + 1, 'modified_at': timezone.now()}
+    if CatalogVersion.objects.filter(name__in=names).update(**values) < len(names):
+        CatalogVersion.objects.bulk_create([CatalogVersion(name=name) for name in names], ignore_conflicts=True)
+
+
+def counted_tracks():
+    tracks = PlaylistSong.objects.filter(playlist=OuterRef('pk')).order_by().values('playlist').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(tracks, output_field=IntegerField()), Value(0))
+
+
+def drift(playlist_ids=None):
+    """Return ``(playlist_id, stored, actual)`` for every playlist whose
+    stored track count is wrong."""
+    playlists = Playlist.objects.all()
+    if playlist_ids:
+        playlists = playlists.filter(pk__in=playlist_ids)
+    playlists = playlists.annotate(actual=counted_tracks()).exclude(track_count=F('actual'))
+    return list(playlists.order_by('id').values_list('id', 'track_count', 'actual'))
+
+
+def recompute(playlist_ids=None, batch_size=BATCH_SIZE):
+    """Recount the tracks of every drifted playlist and return the drift
+    that was fixed."""
+    drifted = drift(playlist_ids)
+    for start in range(0, len(drifted), batch_size):
+        batch = [playlist_id for playlist_id, _, _ in drifted[start:start + batch_size]]
+        with transaction.atomic():
+            Playlist.objects.filter(pk__in=batch).update(
+                track_count=counted_tracks(),
+                version=F('version') + 1,
+                modified_at=timezone.now(),
+            )
+            touch_catalog('playlists')
+    return drifted
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MusicApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'music_api'
+
+    def ready(self):
+        from . import signals
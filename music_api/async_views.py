@@ -0,0 +1,250 @@
+import asyncio
+import functools
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import HttpResponse
+from django.urls import reverse
+from django.views import View
+from rest_framework import status
+from .exceptions import ServiceError
+from .models import Song, Playlist, PlaylistSong
+from .serializers import SongSerializer, PlaylistSerializer
+from . import conditional, metrics, pagination, renderers, response_cache, rows, search, snapshots, views
+
+
+RENDERER_CLASSES = [renderers.FastJSONRenderer] + renderers.COMPACT_RENDERER_CLASSES
+
+
+def render(request, data, status=status.HTTP_200_OK):
+    renderer = getattr(request, 'accepted_renderer', None) or renderers.FastJSONRenderer()
+    with metrics.timed('render'):
+        content = renderer.render(data, getattr(request, 'accepted_media_type', None))
+    response = HttpResponse(content, status=status, content_type=renderer.media_type)
+    response.data = data
+    return response
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def afirst(queryset):
+    async for row in queryset[:1]:
+        return row
+    return None
+
+
+async def read_state(request, state, kwargs):
+    row = getattr(request, conditional.STATE_ATTRIBUTE, conditional.UNREAD)
+    if row is conditional.UNREAD:
+        row = await state(**kwargs).afirst()
+        setattr(request, conditional.STATE_ATTRIBUTE, row)
+    return row
+
+
+def conditional_get(state):
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(view, request, *args, **kwargs):
+            row = await read_state(request, state, kwargs)
+            if row is None:
+                return await method(view, request, *args, **kwargs)
+
+            etag, last_modified = conditional.validators(request, row, conditional.media_type(request))
+            response = conditional.not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            response = await method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                conditional.add_headers(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_get(state):
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(view, request, *args, **kwargs):
+            cache = response_cache.get_cache()
+            if cache is None:
+                return await method(view, request, *args, **kwargs)
+
+            row = await read_state(request, state, kwargs)
+            if row is None:
+                return await method(view, request, *args, **kwargs)
+
+            key = response_cache.page_key(row[0::2], request)
+            data = await cache.aget(key)
+            response_cache.counters.record(data is not None)
+            if data is not None:
+                return conditional.cached_response(request, data, row, functools.partial(render, request))
+
+            response = await method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, response.data, timeout=getattr(settings, 'MUSIC_API_RESPONSE_CACHE_TIMEOUT', None))
+            return response
+        return wrapper
+    return decorator
+
+
+async def number_page(request, queryset, base_url, page_size, count):
+    """Fetch the requested page while ``count`` is still running.
+
+    The page number is only checked against the total afterwards, so an out
+    of range page costs one more query to fetch the page that is served
+    instead.
+    """
+    number = pagination.requested_page(request)
+    offset = (number - 1) * page_size
+
+    total, object_list = await asyncio.gather(count, alist(queryset[offset:offset + page_size]))
+
+    paginator = Paginator(queryset, page_size)
+    paginator.count = total
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    if page_obj.number != number:
+        object_list = await alist(page_obj.object_list)
+    return pagination.number_result(request, base_url, page_size, page_obj, object_list)
+
+
+async def snapshot_number_page(request, playlist_songs, playlist_id, base_url, page_size):
+    number = pagination.requested_page(request)
+    state = await afirst(snapshots.page_state(playlist_id, (number - 1) * page_size, page_size))
+    if state is None:
+        return None
+
+    page_obj = snapshots.count_page(request, playlist_songs, page_size, state[0])
+    object_list = None
+    song_ids = snapshots.page_song_ids(state)
+    if song_ids is not None and page_obj.number == number:
+        object_list = snapshots.order_rows(await alist(snapshots.page_rows(playlist_songs, song_ids)), song_ids)
+    if object_list is None:
+        object_list = await alist(page_obj.object_list)
+    return pagination.number_result(request, base_url, page_size, page_obj, object_list)
+
+
+async def cursor_page(request, queryset, base_url, key, page_size, count=None, generation=None):
+    rows, boundary = pagination.cursor_query(request, queryset, key, page_size, generation)
+    if count is None:
+        rows = await alist(rows)
+    else:
+        rows, count = await asyncio.gather(alist(rows), count)
+    return pagination.cursor_result(request, base_url, key, page_size, rows, boundary, count, generation)
+
+
+async def paginate(request, queryset, base_url):
+    page_size = pagination.get_page_size(request)
+    if pagination.is_cursor_request(request):
+        count = queryset.acount() if pagination.wants_count(request) else None
+        return await cursor_page(request, queryset, base_url, 'id', page_size, count)
+    return await number_page(request, queryset, base_url, page_size, queryset.acount())
+
+
+class SyncFallbackView(View):
+    sync_view = None
+
+    def dispatch(self, request, *args, **kwargs):
+        # Pick the response format as the sync views do, before the
+        # conditional GET works out the ETag of the page.
+        if request.method in ('GET', 'HEAD'):
+            accepted = renderers.negotiate(request, RENDERER_CLASSES)
+            if accepted is None:
+                return self.not_acceptable(request)
+            request.accepted_renderer, request.accepted_media_type = accepted
+        return super().dispatch(request, *args, **kwargs)
+
+    async def not_acceptable(self, request):
+        return render(request, {'detail': "Could not satisfy the request Accept header."}, status.HTTP_406_NOT_ACCEPTABLE)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+
+class SongView(SyncFallbackView):
+    sync_view = staticmethod(views.SongView.as_view())
+
+    @cached_get(lambda: conditional.catalog_state('songs'))
+    @conditional_get(lambda: conditional.catalog_state('songs'))
+    async def get(self, request):
+        search_query = request.GET.get('q', '')
+        try:
+            if search_query and views.is_fuzzy_request(request):
+                return render(request, await sync_to_async(views.fuzzy_results)(request, Song, SongSerializer, search_query))
+
+            plan = rows.plan_for(SongSerializer)
+            songs = Song.objects.order_by('id')
+            if search_query:
+                songs = search.search_songs(songs, search_query, ranked=not pagination.is_cursor_request(request))
+            songs = plan.values(songs)
+
+            page = await paginate(request, songs, request.build_absolute_uri(reverse('songs')))
+        except ServiceError as e:
+            return render(request, e.detail, e.status_code)
+
+        with metrics.timed('serialize'):
+            results = plan.shape(page.object_list)
+        return render(request, page.response_data(results))
+
+
+class PlaylistView(SyncFallbackView):
+    sync_view = staticmethod(views.PlaylistView.as_view())
+
+    @cached_get(lambda: conditional.catalog_state('playlists'))
+    @conditional_get(lambda: conditional.catalog_state('playlists'))
+    async def get(self, request):
+        search_query = request.GET.get('q', '')
+        try:
+            if search_query and views.is_fuzzy_request(request):
+                return render(request, await sync_to_async(views.fuzzy_results)(request, Playlist, PlaylistSerializer, search_query))
+
+            plan = rows.plan_for(PlaylistSerializer)
+            playlists = Playlist.objects.order_by('id')
+            if search_query:
+                playlists = playlists.filter(name__icontains=search_query)
+            playlists = plan.values(playlists)
+
+            page = await paginate(request, playlists, request.build_absolute_uri(reverse('playlists')))
+        except ServiceError as e:
+            return render(request, e.detail, e.status_code)
+
+        with metrics.timed('serialize'):
+            results = plan.shape(page.object_list)
+        return render(request, page.response_data(results))
+
+
+class ListPlaylistSongsView(SyncFallbackView):
+    sync_view = staticmethod(views.ListPlaylistSongsView.as_view())
+
+    @cached_get(conditional.playlist_songs_state)
+    @conditional_get(conditional.playlist_songs_state)
+    async def get(self, request, playlist_id):
+        playlist_songs = PlaylistSong.objects.filter(playlist_id=playlist_id).values(*views.PLAYLIST_SONG_FIELDS)
+        base_url = request.build_absolute_uri(reverse('list_playlist_songs', args=[playlist_id]))
+
+        try:
+            page_size = pagination.get_page_size(request)
+            if not pagination.is_cursor_request(request):
+                page = await snapshot_number_page(request, playlist_songs, playlist_id, base_url, page_size)
+            elif pagination.wants_count(request):
+                page = await cursor_page(request, playlist_songs, base_url, 'position', page_size, afirst(views.track_count_query(playlist_id)), views.key_generation(request))
+                if page.count is None:
+                    page = None
+            else:
+                page, exists = await asyncio.gather(
+                    cursor_page(request, playlist_songs, base_url, 'position', page_size, generation=views.key_generation(request)),
+                    Playlist.objects.filter(pk=playlist_id).aexists(),
+                )
+                if not exists:
+                    page = None
+        except ServiceError as e:
+            return render(request, e.detail, e.status_code)
+
+        if page is None:
+            return render(request, "Playlist not found", status.HTTP_404_NOT_FOUND)
+
+        with metrics.timed('serialize'):
+            results = views.playlist_song_results(page)
+        return render(request, page.response_data(results))
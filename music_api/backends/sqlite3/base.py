@@ -0,0 +1,22 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend that opens transactions with the TRANSACTION_MODE of
+    its DATABASES entry, e.g. BEGIN IMMEDIATE.
+
+    A deferred transaction only asks for the write lock at its first write.
+    If another connection commits in between, SQLite fails it at once with
+    "database is locked" whatever the busy timeout. BEGIN IMMEDIATE takes
+    the write lock up front, so concurrent writers wait for each other.
+
+    This overrides _start_transaction_under_autocommit(), a private method
+    of Django's SQLite backend that atomic() calls to open a transaction
+    (Django 5.0). Check it still exists and is still called when upgrading
+    Django. From Django 5.1 the "transaction_mode" entry of OPTIONS does
+    the same, and this backend can be dropped.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
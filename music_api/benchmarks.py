@@ -0,0 +1,452 @@
+import asyncio
+import contextlib
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from django.urls import include, path
+from .models import Song, Playlist, PlaylistSong, Job
+from . import bulk, edits, positions
+
+# Multipliers used to spread request parameters over the catalog without
+# a shared random generator, so that every run sends the same requests.
+STRIDE = 7919
+POSITION_STRIDE = 104729
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies_ms, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies_ms, 95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies_ms, 99), 2) if latencies else None,
+    }
+
+
+def api_urlconf(use_async):
+    from .urls import build_urlpatterns
+    urlconf = ModuleType('music_api_bench_urls')
+    urlconf.urlpatterns = [path('api/', include(build_urlpatterns(use_async)))]
+    return urlconf
+
+
+def route_names():
+    from .urls import build_urlpatterns
+    return [pattern.name for pattern in build_urlpatterns()]
+
+
+async def run_async(client, urls, requests, concurrency):
+    """Issue ``requests`` GETs, cycling through ``urls``, with at most
+    ``concurrency`` in flight. Returns (latencies, statuses, elapsed).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def fetch(url):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(urls[i % len(urls)]) for i in range(requests)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+class Catalog:
+    """IDs and sizes of the current database that the scenarios draw their
+    request parameters from.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.songs = Song.objects.count()
+        self.playlists = Playlist.objects.count()
+        self.max_song_id = Song.objects.aggregate(value=Max('id'))['value'] or 0
+        self.max_playlist_id = Playlist.objects.aggregate(value=Max('id'))['value'] or 0
+        self.song_ids = list(Song.objects.order_by('id').values_list('id', flat=True)[:1000])
+
+        self.large_playlist_id = Playlist.objects.filter(track_count__gt=0).order_by('-track_count', 'id').values_list('id', flat=True).first()
+        self.large_playlist_song_ids = list(
+            PlaylistSong.objects.filter(playlist_id=self.large_playlist_id).order_by('position').values_list('song_id', flat=True)
+        )
+        self.small_playlist_id = (
+            PlaylistSong.objects.exclude(playlist_id=self.large_playlist_id).order_by('id').values_list('playlist_id', flat=True).first()
+            or self.large_playlist_id
+        )
+
+        self.song_names = list(Song.objects.order_by('id').values_list('name', flat=True)[:200])
+        self.song_words = self.words(self.song_names)
+        self.playlist_words = self.words(Playlist.objects.order_by('id').values_list('name', flat=True)[:200])
+        self.scratch_playlist_id = None
+        self.scratch_job_id = None
+        self.lock = threading.Lock()
+
+    def words(self, names):
+        words = sorted({word for name in names for word in name.split() if word.isalpha() and len(word) > 3})
+        return words or ['song']
+
+    def is_empty(self):
+        return not self.songs or self.large_playlist_id is None
+
+    def scratch_playlist(self):
+        # Target of the rename and remove-song scenarios.
+        with self.lock:
+            if self.scratch_playlist_id is None:
+                playlist = Playlist.objects.create(name=f'Benchmark {self.run_id} scratch')
+                self.scratch_playlist_id = playlist.pk
+            return self.scratch_playlist_id
+
+    def scratch_job(self):
+        # A finished job for the job status scenario to poll.
+        with self.lock:
+            if self.scratch_job_id is None:
+                self.scratch_job_id = Job.objects.create(kind='benchmark', status=Job.DONE, result={}).pk
+            return self.scratch_job_id
+
+    def describe(self):
+        return {
+            'songs': self.songs,
+            'playlists': self.playlists,
+            'large_playlist_id': self.large_playlist_id,
+            'large_playlist_tracks': len(self.large_playlist_song_ids),
+            'small_playlist_id': self.small_playlist_id,
+        }
+
+
+class Scenario:
+    """One kind of request. ``build(number)`` returns the method, path and
+    body of the number-th request; it runs before the clock starts, so it
+    may also create whatever the request needs.
+    """
+
+    def __init__(self, name, route, build, writes=False):
+        self.name = name
+        self.route = route
+        self.build = build
+        self.writes = writes
+
+
+def pick(values, number, stride=STRIDE):
+    return values[(number * stride) % len(values)]
+
+
+def misspell(word):
+    if len(word) < 4:
+        return word
+    return word[:1] + word[2] + word[1] + word[3:]
+
+
+def get(url):
+    return lambda number: ('GET', url(number), None)
+
+
+def scenarios(catalog):
+    page_size = getattr(settings, 'MUSIC_API_PAGE_SIZE', 10)
+    song_pages = max(math.ceil(catalog.songs / page_size), 1)
+    playlist_pages = max(math.ceil(catalog.playlists / page_size), 1)
+    track_pages = max(math.ceil(len(catalog.large_playlist_song_ids) / page_size), 1)
+    large = catalog.large_playlist_id
+    run_id = catalog.run_id
+
+    def create_playlist(number):
+        return ('POST', '/api/playlists', {
+            'name': f'Benchmark {run_id} {number}',
+            'songs': [pick(catalog.song_ids, number + offset, 1) for offset in range(20)],
+        })
+
+    def import_songs(number):
+        rows = [
+            json.dumps({'name': f'Benchmark {run_id} {number}-{row}', 'artist': 'Benchmark', 'release_year': 2020})
+            for row in range(100)
+        ]
+        return ('POST', '/api/songs/import', ('\n'.join(rows), 'application/x-ndjson'))
+
+    def import_playlists(number):
+        return ('POST', '/api/playlists/import', {'playlists': [
+            {'name': f'Benchmark {run_id} import {number}-{entry}', 'songs': catalog.song_ids[entry:entry + 20]}
+            for entry in range(5)
+        ]})
+
+    def rename_playlist(number):
+        return ('PUT', f'/api/playlists/{catalog.scratch_playlist()}', {'name': f'Benchmark {run_id} renamed {number}'})
+
+    def delete_playlist(number):
+        playlist = bulk.create_playlist(f'Benchmark {run_id} delete {number}', catalog.song_ids[:20])
+        return ('DELETE', f'/api/playlists/{playlist.pk}', None)
+
+    def move_song(number):
+        song_id = pick(catalog.large_playlist_song_ids, number)
+        position = 1 + (number * POSITION_STRIDE) % len(catalog.large_playlist_song_ids)
+        return ('PUT', f'/api/playlists/{large}/songs/{song_id}', {'position': position})
+
+    def batch_edit(number):
+        # A reorder in an editor: a handful of moves in one request.
+        count = len(catalog.large_playlist_song_ids)
+        operations = [
+            {'op': 'move', 'song': pick(catalog.large_playlist_song_ids, number * 10 + offset), 'position': 1 + ((number * 10 + offset) * POSITION_STRIDE) % count}
+            for offset in range(10)
+        ]
+        return ('POST', f'/api/playlists/{large}/songs/batch', {'operations': operations})
+
+    def add_songs(number):
+        # Takes 1,000 songs out of the large playlist and adds them back at
+        # another position, so the playlist keeps its size.
+        count = len(catalog.large_playlist_song_ids)
+        start = (number * 1000) % count
+        song_ids = catalog.large_playlist_song_ids[start:start + 1000]
+        for offset in range(0, len(song_ids), edits.MAX_OPERATIONS):
+            edits.edit(large, [{'op': 'remove', 'song': song_id} for song_id in song_ids[offset:offset + edits.MAX_OPERATIONS]])
+        position = 1 + (number * POSITION_STRIDE) % (count - len(song_ids) + 1)
+        return ('POST', f'/api/playlists/{large}/songs', {'songs': song_ids, 'position': position})
+
+    def remove_song(number):
+        playlist_id = catalog.scratch_playlist()
+        song_id = pick(catalog.song_ids, number, 1)
+        positions.append(playlist_id, song_id)
+        return ('DELETE', f'/api/playlists/{playlist_id}/songs/{song_id}', None)
+
+    return [
+        Scenario('songs.page', 'songs', get(lambda n: f'/api/songs?page={1 + (n * STRIDE) % min(song_pages, 100)}')),
+        Scenario('songs.last_page', 'songs', get(lambda n: f'/api/songs?page={song_pages}')),
+        Scenario('songs.cursor', 'songs', get(lambda n: '/api/songs?cursor=&page_size=100')),
+        Scenario('songs.search', 'songs', get(lambda n: f'/api/songs?q={pick(catalog.song_words, n, 1)}')),
+        Scenario('songs.fuzzy', 'songs', get(lambda n: f'/api/songs?q={misspell(pick(catalog.song_words, n, 1))}&fuzzy=true')),
+        Scenario('songs.fuzzy_name', 'songs', get(lambda n: f'/api/songs?q={quote(misspell(pick(catalog.song_names, n, 1)))}&fuzzy=true')),
+        Scenario('songs.playlists', 'song_playlists', get(lambda n: f'/api/songs/{pick(catalog.song_ids, n, 1)}/playlists?page_size=100')),
+        Scenario('songs.playlists_lookup', 'lookup_song_playlists', lambda n: ('POST', '/api/songs/playlists', {'songs': [pick(catalog.song_ids, n * 100 + offset, 1) for offset in range(100)]})),
+        Scenario('songs.export', 'export_songs', get(lambda n: f'/api/songs/export?since_id={max(catalog.max_song_id - 1000, 0)}')),
+        Scenario('playlists.page', 'playlists', get(lambda n: f'/api/playlists?page={1 + (n * STRIDE) % min(playlist_pages, 100)}')),
+        Scenario('playlists.search', 'playlists', get(lambda n: f'/api/playlists?q={pick(catalog.playlist_words, n, 1)}')),
+        Scenario('playlists.export', 'export_playlists', get(lambda n: f'/api/playlists/export?since_id={max(catalog.max_playlist_id - 1000, 0)}')),
+        Scenario('playlist_songs.page', 'list_playlist_songs', get(lambda n: f'/api/playlists/{large}/songs?page={1 + (n * STRIDE) % track_pages}')),
+        Scenario('playlist_songs.last_page', 'list_playlist_songs', get(lambda n: f'/api/playlists/{large}/songs?page={track_pages}')),
+        Scenario('playlist_songs.cursor', 'list_playlist_songs', get(lambda n: f'/api/playlists/{large}/songs?cursor=&page_size=100')),
+        Scenario('playlist_songs.export', 'export_playlist_songs', get(lambda n: f'/api/playlists/{catalog.small_playlist_id}/songs/export')),
+        Scenario('cache.stats', 'cache_stats', get(lambda n: '/api/cache/stats')),
+        Scenario('jobs.status', 'job', get(lambda n: f'/api/jobs/{catalog.scratch_job()}')),
+        Scenario('songs.create', 'songs', lambda n: ('POST', '/api/songs', {'name': f'Benchmark {run_id} {n}', 'artist': 'Benchmark', 'release_year': 2020}), writes=True),
+        Scenario('songs.import', 'import_songs', import_songs, writes=True),
+        Scenario('playlists.create', 'playlists', create_playlist, writes=True),
+        Scenario('playlists.import', 'import_playlists', import_playlists, writes=True),
+        Scenario('playlists.rename', 'edit_playlist', rename_playlist, writes=True),
+        Scenario('playlists.delete', 'edit_playlist', delete_playlist, writes=True),
+        Scenario('playlist_songs.move', 'move_playlist_song', move_song, writes=True),
+        Scenario('playlist_songs.remove', 'move_playlist_song', remove_song, writes=True),
+        Scenario('playlist_songs.batch', 'edit_playlist_songs', batch_edit, writes=True),
+        Scenario('playlist_songs.add', 'list_playlist_songs', add_songs, writes=True),
+        Scenario('jobs.start', 'jobs', lambda n: ('POST', '/api/jobs', {'kind': 'recompute_aggregates'}), writes=True),
+    ]
+
+
+def request_kwargs(body):
+    if body is None:
+        return {}
+    if isinstance(body, tuple):
+        data, content_type = body
+        return {'data': data, 'content_type': content_type}
+    return {'data': json.dumps(body), 'content_type': 'application/json'}
+
+
+def read_body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+async def aread_body(response):
+    if not response.streaming:
+        return response.content
+    if response.is_async:
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return await sync_to_async(b''.join)(response.streaming_content)
+
+
+@contextlib.contextmanager
+def count_queries():
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield counter
+
+
+def measure_queries(scenario, samples, offset):
+    """Send ``samples`` requests one at a time and return the mean number of
+    queries each ran. Doubles as the warm-up before the timed run.
+    """
+    client = Client()
+    total = 0
+    with count_queries() as counter:
+        for number in range(offset, offset + samples):
+            method, url, body = scenario.build(number)
+            queries = counter['queries']
+            read_body(client.generic(method, url, **request_kwargs(body)))
+            total += counter['queries'] - queries
+    return round(total / samples, 2) if samples else None
+
+
+def run_wsgi(scenario, requests, concurrency, offset):
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(number):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        method, url, body = scenario.build(number)
+        started = time.perf_counter()
+        response = local.client.generic(method, url, **request_kwargs(body))
+        read_body(response)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(offset, offset + requests)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def run_asgi(scenario, requests, concurrency, offset):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+    build = sync_to_async(scenario.build)
+
+    async def send(number):
+        async with semaphore:
+            method, url, body = await build(number)
+            started = time.perf_counter()
+            response = await client.generic(method, url, **request_kwargs(body))
+            await aread_body(response)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(number) for number in range(offset, offset + requests)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_scenario(scenario, client, requests, concurrency, query_samples):
+    queries = measure_queries(scenario, query_samples, 0)
+    if client == 'asgi':
+        latencies, statuses, elapsed = asyncio.run(run_asgi(scenario, requests, concurrency, query_samples))
+    else:
+        latencies, statuses, elapsed = run_wsgi(scenario, requests, concurrency, query_samples)
+
+    result = {'route': scenario.route, 'queries_per_request': queries}
+    result.update(summarize(latencies, elapsed))
+    result['errors'] = sum(count for code, count in statuses.items() if code >= 400)
+    result['statuses'] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+def compare(previous, current):
+    """Yield (scenario, metric, before, after, change) for the scenarios
+    present in both result sets.
+    """
+    for name, after in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_per_request'):
+            old, new = before.get(metric), after.get(metric)
+            change = round((new - old) / old * 100, 1) if old and new is not None else None
+            yield name, metric, old, new, change
+
+
+def serialization_paths(serializer_class, queryset):
+    """Return {name: function} for the ways a list page can be turned into
+    JSON: model instances through the serializer and DRF's renderer, or
+    values() rows through a field plan and the fast renderer.
+    """
+    from rest_framework.renderers import JSONRenderer
+    from .renderers import FastJSONRenderer
+    from . import rows
+
+    plan = rows.plan_for(serializer_class)
+    fast = FastJSONRenderer()
+
+    def serializer():
+        return JSONRenderer().render(serializer_class(list(queryset), many=True).data)
+
+    def values():
+        return fast.render(plan.shape(plan.values(queryset)))
+
+    def values_json():
+        with override_json_encoder('json'):
+            return fast.render(plan.shape(plan.values(queryset)))
+
+    return {'serializer': serializer, 'values': values, 'values+json': values_json}
+
+
+@contextlib.contextmanager
+def override_json_encoder(name):
+    from django.test import override_settings
+    with override_settings(MUSIC_API_JSON_ENCODER=name):
+        yield
+
+
+def time_serialization(function, repeat):
+    """Run function repeat times; return its best time in seconds and the
+    size of its output."""
+    best, size = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(function())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def format_results(data, renderer_classes, repeat):
+    """Yield the size of data in each renderer's format, plain and gzipped
+    the way the compression middleware does it, with the best times taken
+    to encode and to compress it."""
+    from django.utils.text import compress_string
+    from .compression import CompressionMiddleware
+
+    for renderer_class in renderer_classes:
+        renderer = renderer_class()
+        content = renderer.render(data)
+        encode, size = time_serialization(lambda: renderer.render(data), repeat)
+        compress, compressed = time_serialization(
+            lambda: compress_string(content, max_random_bytes=CompressionMiddleware.max_random_bytes), repeat
+        )
+        yield {
+            'format': renderer.format,
+            'bytes': size,
+            'gzip_bytes': compressed,
+            'encode_ms': round(encode * 1000, 2),
+            'gzip_ms': round(compress * 1000, 2),
+        }
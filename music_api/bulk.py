@@ -0,0 +1,158 @@
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from rest_framework import status
+from .exceptions import ServiceError
+from .models import Song, Playlist, PlaylistSong
+from . import aggregates, fuzzy, positions, snapshots
+
+BATCH_SIZE = 500
+LOOKUP_BATCH_SIZE = 10000
+MAX_ADDED_SONGS = LOOKUP_BATCH_SIZE
+
+
+def clean_song_id(song_id):
+    # Numeric strings such as "12" have always been accepted as IDs.
+    if isinstance(song_id, str):
+        try:
+            song_id = int(song_id)
+        except ValueError:
+            pass
+    if isinstance(song_id, bool) or not isinstance(song_id, int):
+        raise ServiceError(f"Song ID {song_id!r} must be an integer.")
+    return song_id
+
+
+def unique_song_ids(song_ids):
+    seen = set()
+    unique = []
+    for song_id in map(clean_song_id, song_ids):
+        if song_id not in seen:
+            seen.add(song_id)
+            unique.append(song_id)
+    return unique
+
+
+def existing_song_ids(song_ids):
+    song_ids = list(song_ids)
+    existing = set()
+    for start in range(0, len(song_ids), LOOKUP_BATCH_SIZE):
+        batch = song_ids[start:start + LOOKUP_BATCH_SIZE]
+        existing.update(Song.objects.filter(pk__in=batch).values_list('pk', flat=True))
+    return existing
+
+
+def check_songs_exist(song_ids, existing=None):
+    if existing is None:
+        existing = existing_song_ids(song_ids)
+    missing = [song_id for song_id in song_ids if song_id not in existing]
+    if len(missing) == 1:
+        raise ServiceError(f"Song with ID {missing[0]} does not exist.")
+    if missing:
+        raise ServiceError(f"Songs with IDs {', '.join(str(song_id) for song_id in missing)} do not exist.")
+
+
+def playlist_membership(playlist_id, song_ids):
+    """Map each of ``song_ids`` that exists to whether it is already in the
+    playlist, probing the playlist's unique (playlist, song) index once per
+    song."""
+    in_playlist = PlaylistSong.objects.filter(playlist_id=playlist_id, song_id=OuterRef('pk'))
+    return dict(Song.objects.filter(pk__in=song_ids).annotate(member=Exists(in_playlist)).values_list('pk', 'member'))
+
+
+def build_playlist_songs(playlist, song_ids):
+    return [
+        PlaylistSong(playlist=playlist, song_id=song_id, position=positions.key_for_index(index))
+        for index, song_id in enumerate(song_ids)
+    ]
+
+
+def create_playlist(name, song_ids, batch_size=BATCH_SIZE):
+    song_ids = unique_song_ids(song_ids)
+    check_songs_exist(song_ids)
+
+    try:
+        with transaction.atomic():
+            playlist = Playlist.objects.create(name=name, track_count=len(song_ids))
+            PlaylistSong.objects.bulk_create(build_playlist_songs(playlist, song_ids), batch_size=batch_size)
+            snapshots.create([playlist], [song_ids])
+    except IntegrityError:
+        raise ServiceError("A playlist with the same name already exists.")
+    return playlist
+
+
+def add_songs(playlist_id, song_ids, position=None, batch_size=BATCH_SIZE):
+    """Insert songs into a playlist at the 1-based ``position``, or at the
+    end. Songs already in the playlist are skipped. Returns the playlist's
+    new version and track count along with the IDs added and skipped.
+    """
+    song_ids = unique_song_ids(song_ids)
+    if len(song_ids) > MAX_ADDED_SONGS:
+        raise ServiceError(f"Add at most {MAX_ADDED_SONGS} songs per request.")
+
+    with transaction.atomic():
+        # Locks the playlist where the database supports it, so concurrent
+        # inserts cannot pick the same keys.
+        playlist = Playlist.objects.select_for_update().filter(pk=playlist_id).values('version', 'track_count').first()
+        if playlist is None:
+            raise ServiceError("Playlist does not exist.", status.HTTP_404_NOT_FOUND)
+        track_count = playlist['track_count']
+        if position is None:
+            position = track_count + 1
+        if not 1 <= position <= track_count + 1:
+            raise ServiceError("Position is invalid.")
+
+        membership = playlist_membership(playlist_id, song_ids)
+        check_songs_exist(song_ids, membership)
+        added = [song_id for song_id in song_ids if not membership[song_id]]
+        result = {'added': added, 'skipped': [song_id for song_id in song_ids if membership[song_id]]}
+        if not added:
+            return {**playlist, **result}
+
+        keys = positions.make_room(playlist_id, position, len(added), track_count)
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist_id=playlist_id, song_id=song_id, position=key)
+            for song_id, key in zip(added, keys)
+        ], batch_size=batch_size)
+
+        snapshots.update(playlist_id, snapshots.inserted(added, position - 1))
+        aggregates.touch(playlist_id, tracks=len(added))
+    return {'version': playlist['version'] + 1, 'track_count': track_count + len(added), **result}
+
+
+def index_names(playlists):
+    index = fuzzy.index_for(Playlist)
+    for playlist in playlists:
+        index.add(playlist.pk, playlist.name)
+
+
+def import_playlists(entries, batch_size=BATCH_SIZE):
+    names = [entry['name'] for entry in entries]
+    duplicates = sorted(name for name, count in Counter(names).items() if count > 1)
+    if duplicates:
+        raise ServiceError(f"Playlist names must be unique: {', '.join(duplicates)}.")
+
+    existing_names = sorted(Playlist.objects.filter(name__in=names).values_list('name', flat=True))
+    if existing_names:
+        raise ServiceError(f"Playlists with the same name already exist: {', '.join(existing_names)}.")
+
+    song_ids_per_playlist = [unique_song_ids(entry['songs']) for entry in entries]
+    check_songs_exist(list(dict.fromkeys(song_id for song_ids in song_ids_per_playlist for song_id in song_ids)))
+
+    try:
+        with transaction.atomic():
+            playlists = Playlist.objects.bulk_create([Playlist(name=name, track_count=len(song_ids)) for name, song_ids in zip(names, song_ids_per_playlist)], batch_size=batch_size)
+            playlist_songs = []
+            for playlist, song_ids in zip(playlists, song_ids_per_playlist):
+                playlist_songs.extend(build_playlist_songs(playlist, song_ids))
+                if len(playlist_songs) >= batch_size:
+                    PlaylistSong.objects.bulk_create(playlist_songs, batch_size=batch_size)
+                    playlist_songs = []
+            PlaylistSong.objects.bulk_create(playlist_songs, batch_size=batch_size)
+            snapshots.create(playlists, song_ids_per_playlist)
+            aggregates.touch_catalog('playlists')
+            # bulk_create skips the save signals that keep the fuzzy index current.
+            transaction.on_commit(lambda: index_names(playlists))
+    except IntegrityError:
+        raise ServiceError("Playlists with the same name already exist.")
+    return playlists
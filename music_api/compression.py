@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+def min_size():
+    return getattr(settings, 'MUSIC_API_GZIP_MIN_BYTES', 1024)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Gzip responses of at least MUSIC_API_GZIP_MIN_BYTES for clients that
+    accept it. Smaller ones gain too little to be worth the CPU. Streamed
+    exports are always compressed, as their size is not known up front.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < min_size():
+            return response
+        return super().process_response(request, response)
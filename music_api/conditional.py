@@ -0,0 +1,114 @@
+import calendar
+import functools
+import hashlib
+from django.conf import settings
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import CatalogVersion, Playlist
+
+JSON_MEDIA_TYPE = 'application/json'
+# The request attribute that holds the row of its state query.
+STATE_ATTRIBUTE = '_music_api_state'
+UNREAD = object()
+
+
+# Each state query returns a single (version, modified_at, ...) row for the
+# entities a page is built from, or no row if the page would be a 404.
+
+def catalog_state(name):
+    return CatalogVersion.objects.filter(name=name).values_list('version', 'modified_at')
+
+
+def playlist_songs_state(playlist_id):
+    # The key generation comes last, where it counts as one more version;
+    # the view signs its cursors with it.
+    songs = CatalogVersion.objects.filter(name='songs')
+    return Playlist.objects.filter(pk=playlist_id).annotate(
+        songs_version=Subquery(songs.values('version')),
+        songs_modified_at=Subquery(songs.values('modified_at')),
+    ).values_list('version', 'modified_at', 'songs_version', 'songs_modified_at', 'key_generation')
+
+
+def read_state(request, state, kwargs):
+    """Run the state query of a request once. The response cache and
+    conditional_get() are stacked on the same views and share the row."""
+    row = getattr(request, STATE_ATTRIBUTE, UNREAD)
+    if row is UNREAD:
+        row = state(**kwargs).first()
+        setattr(request, STATE_ATTRIBUTE, row)
+    return row
+
+
+def validators(request, state, media_type=JSON_MEDIA_TYPE):
+    """Return the ETag and Last-Modified timestamp of the page ``request``
+    asks for, given the row returned by its state query."""
+    versions = ':'.join(str(version) for version in state[0::2])
+    digest = hashlib.md5(f'{versions}:{media_type}:{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+    modified_at = max(value for value in state[1::2] if value is not None)
+    return quote_etag(digest), calendar.timegm(modified_at.utctimetuple())
+
+
+def add_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    cache_control = getattr(settings, 'MUSIC_API_CACHE_CONTROL', None)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def media_type(request):
+    return getattr(request, 'accepted_media_type', JSON_MEDIA_TYPE)
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    return add_headers(response, etag, last_modified)
+
+
+def cached_response(request, data, row, response_class):
+    """Serve a page from a response cache, or a 304 if the client's copy
+    is the cached one."""
+    if row is None:
+        return response_class(data)
+    etag, last_modified = validators(request, row, media_type(request))
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = add_headers(response_class(data), etag, last_modified)
+    return response
+
+
+def conditional_get(state):
+    """Answer revalidations of a list view with a bodiless 304.
+
+    ``state`` is called with the view's URL kwargs and returns a state
+    query, which is shared with the response cache through read_state().
+    A revalidation costs that one query; the page itself is only
+    built when the client's copy is out of date. The state is read before
+    the page, so a write in between can only make the ETag look older than
+    the page, never newer.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            row = read_state(request, state, kwargs)
+            if row is None:
+                return method(view, request, *args, **kwargs)
+
+            etag, last_modified = validators(request, row, media_type(request))
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                add_headers(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
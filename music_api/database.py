@@ -0,0 +1,71 @@
+import contextvars
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+READ_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+read_only = contextvars.ContextVar('music_api_read_only', default=False)
+
+
+def apply_pragmas(connection):
+    """Run the PRAGMAS listed in a SQLite connection's DATABASES entry."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def pragma_values(using='default'):
+    connection = connections[using]
+    values = {}
+    with connection.cursor() as cursor:
+        for name in connection.settings_dict.get('PRAGMAS') or {}:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+class ReadReplicaRouter:
+    """Send reads made while serving a safe request to the read-only alias.
+
+    Writes, and reads made by unsafe requests, management commands and
+    background threads, go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if read_only.get() and READ_ALIAS in connections.settings:
+            return READ_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != READ_ALIAS
+
+
+@sync_and_async_middleware
+def read_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = read_only.set(request.method in SAFE_METHODS)
+            try:
+                return await get_response(request)
+            finally:
+                read_only.reset(token)
+    else:
+        def middleware(request):
+            token = read_only.set(request.method in SAFE_METHODS)
+            try:
+                return get_response(request)
+            finally:
+                read_only.reset(token)
+    return middleware
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+import time
+from django.conf import settings
+
+TITLE = "Playlist Manager"
+VERSION = "v1"
+DESCRIPTION = "API Testing"
+
+# Views decorated with swagger_auto_schema() below, waiting for load().
+_pending = []
+_loaded = False
+_lock = threading.Lock()
+_document = None
+
+
+def enabled():
+    """Whether the Swagger UI is served. drf_yasg is only imported by the
+    web process when it is."""
+    return getattr(settings, 'MUSIC_API_DOCS', False)
+
+
+def schema_path():
+    return getattr(settings, 'MUSIC_API_OPENAPI_PATH', None)
+
+
+class Deferred:
+    """Stands in for a drf_yasg.openapi attribute, or a call to one, until
+    drf_yasg is imported by load()."""
+
+    def __init__(self, name, args=(), kwargs=None, called=False):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.called = called
+
+    def __call__(self, *args, **kwargs):
+        return Deferred(self.name, args, kwargs, called=True)
+
+    def build(self):
+        from drf_yasg import openapi as drf_openapi
+        value = getattr(drf_openapi, self.name)
+        if not self.called:
+            return value
+        return value(*build(self.args), **build(self.kwargs))
+
+
+class DeferredOpenAPI:
+    def __getattr__(self, name):
+        return Deferred(name)
+
+
+openapi = DeferredOpenAPI()
+
+
+def build(value):
+    if isinstance(value, Deferred):
+        return value.build()
+    if isinstance(value, dict):
+        return {key: build(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(build(item) for item in value)
+    return value
+
+
+def swagger_auto_schema(**kwargs):
+    """Like drf_yasg's decorator of the same name, but only records the
+    arguments. load() applies them."""
+    def decorator(view_method):
+        with _lock:
+            if _loaded:
+                return apply(view_method, kwargs)
+            _pending.append((view_method, kwargs))
+        return view_method
+    return decorator
+
+
+def apply(view_method, kwargs):
+    from drf_yasg.utils import swagger_auto_schema as drf_swagger_auto_schema
+    return drf_swagger_auto_schema(**build(kwargs))(view_method)
+
+
+def load():
+    """Import drf_yasg and apply every recorded swagger_auto_schema()."""
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        for view_method, kwargs in _pending:
+            apply(view_method, kwargs)
+        _pending.clear()
+        _loaded = True
+
+
+def info():
+    load()
+    from drf_yasg import openapi as drf_openapi
+    return drf_openapi.Info(title=TITLE, default_version=VERSION, description=DESCRIPTION)
+
+
+def generate():
+    """Build the OpenAPI document of the API and return it as JSON bytes."""
+    from django.urls import get_resolver
+    # Loading the URL patterns imports the views, whose swagger_auto_schema()
+    # calls must be recorded before load() applies them.
+    get_resolver().url_patterns
+    load()
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    schema = OpenAPISchemaGenerator(info()).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema) + b'\n'
+
+
+def document():
+    """Return ``(content, etag, last_modified)`` for the OpenAPI document.
+
+    It is read from MUSIC_API_OPENAPI_PATH, written by the generate_openapi
+    command. If that file is missing and docs are enabled, it is generated
+    once instead. Returns None when neither is possible.
+    """
+    global _document
+    path = schema_path()
+    if path and os.path.exists(path):
+        last_modified = int(os.path.getmtime(path))
+        if _document is None or _document[2] != last_modified:
+            with open(path, 'rb') as schema_file:
+                content = schema_file.read()
+            _document = (content, '"%s"' % hashlib.md5(content).hexdigest(), last_modified)
+    elif enabled():
+        if _document is None:
+            content = generate()
+            _document = (content, '"%s"' % hashlib.md5(content).hexdigest(), int(time.time()))
+    else:
+        return None
+    return _document
+
+
+def swagger_ui_view():
+    load()
+    from drf_yasg.views import get_schema_view
+    schema_view = get_schema_view(info(), public=True)
+    return schema_view.with_ui('swagger', cache_timeout=0)
@@ -0,0 +1,204 @@
+import bisect
+from django.db import transaction
+from rest_framework import status
+from .exceptions import ServiceError
+from .models import Playlist, PlaylistSong
+from . import aggregates, bulk, positions, snapshots
+
+MAX_OPERATIONS = 500
+BATCH_SIZE = 500
+OPERATIONS = ('add', 'remove', 'move', 'replace')
+
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def clean_operations(operations):
+    """Check the shape of every operation and return the IDs of the songs
+    they add."""
+    if not isinstance(operations, list) or not operations:
+        raise ServiceError("Include at least one operation.")
+    if len(operations) > MAX_OPERATIONS:
+        raise ServiceError(f"Send at most {MAX_OPERATIONS} operations per request.")
+
+    added = []
+    for number, operation in enumerate(operations, start=1):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise ServiceError(f"Operation {number}: op must be one of {', '.join(OPERATIONS)}.")
+
+        op = operation['op']
+        if op == 'replace':
+            songs = operation.get('songs')
+            if not isinstance(songs, list):
+                raise ServiceError(f"Operation {number}: songs must be a list of song IDs.")
+            try:
+                unique = bulk.unique_song_ids(songs)
+            except ServiceError as e:
+                raise ServiceError(f"Operation {number}: {e.detail}")
+            if len(unique) != len(songs):
+                raise ServiceError(f"Operation {number}: songs must not repeat.")
+            operation['songs'] = unique
+            added.extend(unique)
+            continue
+
+        if not is_integer(operation.get('song')):
+            raise ServiceError(f"Operation {number}: song must be an integer.")
+        position = operation.get('position')
+        if op == 'move' and position is None:
+            raise ServiceError(f"Operation {number}: position is required.")
+        if position is not None and not is_integer(position):
+            raise ServiceError(f"Operation {number}: position must be an integer.")
+        if op == 'add':
+            added.append(operation['song'])
+    return added
+
+
+def apply_operations(song_ids, operations):
+    """Replay the operations on a list of song IDs in track order.
+
+    Returns the new list and the set of songs added or moved, or None in
+    place of the set once the whole list has been replaced.
+    """
+    members = set(song_ids)
+    touched = set()
+    for number, operation in enumerate(operations, start=1):
+        op = operation['op']
+        if op == 'replace':
+            song_ids = list(operation['songs'])
+            members = set(song_ids)
+            touched = None
+            continue
+
+        song_id = operation['song']
+        if touched is not None and op != 'remove':
+            touched.add(song_id)
+        position = operation.get('position')
+        if op == 'add':
+            if song_id in members:
+                raise ServiceError(f"Operation {number}: song {song_id} is already in the playlist.")
+            if position is None:
+                position = len(song_ids) + 1
+            if not 1 <= position <= len(song_ids) + 1:
+                raise ServiceError(f"Operation {number}: position is invalid.")
+            song_ids.insert(position - 1, song_id)
+            members.add(song_id)
+            continue
+
+        if song_id not in members:
+            raise ServiceError(f"Operation {number}: song {song_id} is not in the playlist.")
+        if op == 'move' and not 1 <= position <= len(song_ids):
+            raise ServiceError(f"Operation {number}: position is invalid.")
+        song_ids.remove(song_id)
+        if op == 'move':
+            song_ids.insert(position - 1, song_id)
+        else:
+            members.discard(song_id)
+    return song_ids, touched
+
+
+def longest_increasing(keys):
+    """Return the indexes of a longest strictly increasing subsequence of
+    ``keys``, skipping None entries."""
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(keys)
+    for index, key in enumerate(keys):
+        if key is None:
+            continue
+        slot = bisect.bisect_left(tails, key)
+        if slot == len(tails):
+            tails.append(key)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = key
+            tail_indexes[slot] = index
+        previous[index] = tail_indexes[slot - 1] if slot else None
+
+    kept = set()
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        kept.add(index)
+        index = previous[index]
+    return kept
+
+
+def assign_keys(song_ids, current_keys, touched=None):
+    """Return a position key for each song in ``song_ids``.
+
+    Songs that form the longest run still in their current order keep their
+    keys; only the others are given new keys in the gaps between them. If a
+    gap is too small, returns None: every song has to be respaced. When the
+    songs that were added or moved are known, the others are that run
+    already.
+    """
+    if touched is None:
+        keys = [current_keys.get(song_id) for song_id in song_ids]
+        kept = longest_increasing(keys)
+        keys = [key if index in kept else None for index, key in enumerate(keys)]
+    else:
+        keys = [None if song_id in touched else current_keys[song_id] for song_id in song_ids]
+
+    start = 0
+    while start < len(keys):
+        if keys[start] is not None:
+            start += 1
+            continue
+        end = start
+        while end < len(keys) and keys[end] is None:
+            end += 1
+        before = keys[start - 1] if start else None
+        after = keys[end] if end < len(keys) else None
+        run = positions.spread(before, after, end - start)
+        if run is None:
+            return None
+        keys[start:end] = run
+        start = end
+    return keys
+
+
+def edit(playlist_id, operations, expected_version=None, batch_size=BATCH_SIZE):
+    """Apply a list of add, remove, move and replace operations to a
+    playlist in one transaction, writing only the rows whose position
+    changes. Returns the playlist's new version and track count.
+    """
+    bulk.check_songs_exist(list(dict.fromkeys(clean_operations(operations))))
+
+    with transaction.atomic():
+        # Locks the playlist where the database supports it, so concurrent
+        # batches apply one after the other.
+        playlist = Playlist.objects.select_for_update().filter(pk=playlist_id).values('version', 'track_count').first()
+        if playlist is None:
+            raise ServiceError("Playlist does not exist.", status.HTTP_404_NOT_FOUND)
+        if expected_version is not None and expected_version != playlist['version']:
+            raise ServiceError(f"The playlist has changed since version {expected_version}.", status.HTTP_409_CONFLICT)
+
+        rows = list(PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position').values_list('id', 'song_id', 'position'))
+        song_ids, touched = apply_operations([song_id for _, song_id, _ in rows], operations)
+        if song_ids == [song_id for _, song_id, _ in rows]:
+            return playlist
+
+        current = {song_id: (pk, key) for pk, song_id, key in rows}
+        keys = assign_keys(song_ids, {song_id: key for song_id, (_, key) in current.items()}, touched)
+        if keys is None:
+            keys = [positions.key_for_index(index) for index in range(len(song_ids))]
+            positions.rekeyed(playlist_id)
+
+        remaining = set(song_ids)
+        removed = [pk for song_id, (pk, _) in current.items() if song_id not in remaining]
+        changed = []
+        added = []
+        for song_id, key in zip(song_ids, keys):
+            if song_id not in current:
+                added.append(PlaylistSong(playlist_id=playlist_id, song_id=song_id, position=key))
+            elif current[song_id][1] != key:
+                changed.append(PlaylistSong(pk=current[song_id][0], position=key))
+
+        for start in range(0, len(removed), batch_size):
+            PlaylistSong.objects.filter(pk__in=removed[start:start + batch_size]).delete()
+        PlaylistSong.objects.bulk_update(changed, ['position'], batch_size=batch_size)
+        PlaylistSong.objects.bulk_create(added, batch_size=batch_size)
+
+        snapshots.update(playlist_id, lambda _: song_ids)
+        aggregates.touch(playlist_id, tracks=len(song_ids) - len(rows))
+        return {'version': playlist['version'] + 1, 'track_count': len(song_ids)}
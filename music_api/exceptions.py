@@ -0,0 +1,11 @@
+from rest_framework import status
+
+
+class ServiceError(Exception):
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, detail, status_code=None):
+        super().__init__(detail)
+        self.detail = detail
+        if status_code is not None:
+            self.status_code = status_code
@@ -0,0 +1,118 @@
+import csv
+import json
+from .exceptions import ServiceError
+from .models import Song, Playlist, PlaylistSong
+from .renderers import COLUMNS_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, msgpack
+
+CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv', 'columns') + (('msgpack',) if msgpack is not None else ())
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'columns': COLUMNS_MEDIA_TYPE,
+    'msgpack': MSGPACK_MEDIA_TYPE,
+}
+EXTENSIONS = {
+    'ndjson': 'ndjson',
+    'csv': 'csv',
+    'columns': 'json',
+    'msgpack': 'msgpack',
+}
+
+SONG_FIELDS = ('id', 'name', 'artist', 'release_year')
+PLAYLIST_FIELDS = ('id', 'name')
+PLAYLIST_SONG_FIELDS = ('id', 'name', 'artist', 'release_year', 'position')
+
+
+def song_rows(since_id=None, chunk_size=CHUNK_SIZE):
+    songs = Song.objects.order_by('id')
+    if since_id is not None:
+        songs = songs.filter(id__gt=since_id)
+    return songs.values_list(*SONG_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def playlist_rows(since_id=None, chunk_size=CHUNK_SIZE):
+    playlists = Playlist.objects.order_by('id')
+    if since_id is not None:
+        playlists = playlists.filter(id__gt=since_id)
+    return playlists.values_list(*PLAYLIST_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def resume_point(playlist_id, since_id):
+    keys = list(PlaylistSong.objects.filter(playlist_id=playlist_id, song_id=since_id).values_list('position', flat=True))
+    if not keys:
+        raise ServiceError(f"Song with ID {since_id} is not in the playlist.")
+    position = PlaylistSong.objects.filter(playlist_id=playlist_id, position__lte=keys[0]).count()
+    return keys[0], position
+
+
+def playlist_song_rows(playlist_id, resume_from=None, chunk_size=CHUNK_SIZE):
+    """Yield a playlist's tracks in order, with the same 1-based positions as
+    the playlist songs endpoint. ``resume_from`` is a ``resume_point()``.
+    """
+    playlist_songs = PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position')
+    position = 0
+    if resume_from is not None:
+        key, position = resume_from
+        playlist_songs = playlist_songs.filter(position__gt=key)
+
+    rows = playlist_songs.values_list('song_id', 'song__name', 'song__artist', 'song__release_year').iterator(chunk_size=chunk_size)
+    for position, row in enumerate(rows, start=position + 1):
+        yield row + (position,)
+
+
+def render_ndjson(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_columns(fields, rows):
+    # The columnar layout of the list endpoints, streamed a row at a time.
+    yield '{"columns": %s, "results": [' % json.dumps(fields)
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+def render_msgpack(fields, rows):
+    # A sequence of MessagePack arrays, the field names first, which
+    # msgpack.Unpacker reads back one at a time.
+    packer = msgpack.Packer()
+    yield packer.pack(fields)
+    for row in rows:
+        yield packer.pack(row)
+
+
+def format_for_accept(accept):
+    """Return the first format whose content type the Accept header names,
+    or None."""
+    for media_range in accept.split(','):
+        media_type = media_range.split(';')[0].strip()
+        for format in FORMATS:
+            if CONTENT_TYPES[format] == media_type:
+                return format
+    return None
+
+
+def render(format, fields, rows):
+    if format == 'csv':
+        return render_csv(fields, rows)
+    if format == 'columns':
+        return render_columns(fields, rows)
+    if format == 'msgpack':
+        return render_msgpack(fields, rows)
+    return render_ndjson(fields, rows)
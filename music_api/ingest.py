@@ -0,0 +1,138 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from django.db.models import Max
+from rest_framework import serializers
+from .models import Song
+from .serializers import check_release_year
+from . import aggregates, fuzzy
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+NAME_MAX_LENGTH = Song._meta.get_field('name').max_length
+ARTIST_MAX_LENGTH = Song._meta.get_field('artist').max_length
+# Stands in for an NDJSON line that is not valid UTF-8.
+UNDECODABLE = object()
+
+
+def format_for_content_type(content_type):
+    return CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+
+
+def read_csv(lines):
+    # utf-8-sig drops the byte order mark that Excel writes first.
+    reader = csv.DictReader(codecs.iterdecode(lines, 'utf-8-sig'))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                yield line_number, UNDECODABLE
+                continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row
+
+
+def read_rows(lines, format):
+    if format == 'csv':
+        return read_csv(lines)
+    return read_ndjson(lines)
+
+
+def clean_row(row):
+    if row is UNDECODABLE:
+        raise serializers.ValidationError("Row is not valid UTF-8.")
+    if not isinstance(row, dict):
+        raise serializers.ValidationError("Row is not a valid object.")
+
+    name = row.get('name')
+    artist = row.get('artist')
+    if not isinstance(name, str) or not name.strip() or len(name) > NAME_MAX_LENGTH:
+        raise serializers.ValidationError(f"Name must be 1 to {NAME_MAX_LENGTH} characters.")
+    if not isinstance(artist, str) or not artist.strip() or len(artist) > ARTIST_MAX_LENGTH:
+        raise serializers.ValidationError(f"Artist must be 1 to {ARTIST_MAX_LENGTH} characters.")
+
+    try:
+        release_year = int(row.get('release_year'))
+    except (TypeError, ValueError):
+        raise serializers.ValidationError("Release year must be an integer.")
+    check_release_year(release_year)
+
+    return Song(name=name, artist=artist, release_year=release_year)
+
+
+def batched(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest(rows, batch_size=BATCH_SIZE):
+    """Insert songs from ``(line_number, row)`` pairs, one batch at a time.
+
+    Yields a report per batch. Rows that fail validation are listed with
+    their line number; rows that duplicate an existing song are skipped by
+    the database's unique constraint and counted apart from those inserted.
+    """
+    try:
+        for number, batch in enumerate(batched(rows, batch_size), start=1):
+            songs = []
+            rejected = []
+            for line_number, row in batch:
+                try:
+                    songs.append(clean_row(row))
+                except serializers.ValidationError as e:
+                    rejected.append({'line': line_number, 'errors': [str(error) for error in e.detail]})
+
+            with transaction.atomic():
+                # New songs get IDs above the highest one, and nothing else
+                # writes while this transaction holds the write lock.
+                last_id = Song.objects.aggregate(value=Max('pk'))['value'] or 0
+                Song.objects.bulk_create(songs, batch_size=batch_size, ignore_conflicts=True)
+                inserted = Song.objects.filter(pk__gt=last_id).count()
+                if inserted:
+                    aggregates.touch_catalog('songs')
+
+            yield {
+                'batch': number,
+                'received': len(batch),
+                'inserted': inserted,
+                'skipped': len(songs) - inserted,
+                'rejected': rejected,
+            }
+    finally:
+        # bulk_create skips the save signals that keep the fuzzy index current.
+        fuzzy.index_for(Song).invalidate()
+
+
+def summarize(reports):
+    summary = {'batches': 0, 'received': 0, 'inserted': 0, 'skipped': 0, 'rejected': 0}
+    for report in reports:
+        summary['batches'] += 1
+        summary['received'] += report['received']
+        summary['inserted'] += report['inserted']
+        summary['skipped'] += report['skipped']
+        summary['rejected'] += len(report['rejected'])
+        yield report
+    yield {'summary': summary}
@@ -0,0 +1,254 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .exceptions import ServiceError
+from .models import Job, Playlist, PlaylistSnapshot, PlaylistSong
+from . import aggregates, bulk, ingest, positions, search, snapshots
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ROWS = 1000
+MAINTENANCE_KINDS = ('rebuild_snapshots', 'recompute_aggregates', 'rebuild_search_index')
+# Jobs the API queues for itself after edits. Nobody polls them, so their
+# rows are deleted once they succeed instead of piling up.
+INTERNAL_KINDS = ('refresh_snapshot', 'rebalance_positions')
+
+HANDLERS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def workers():
+    """Threads that run jobs inside the web process. With 0, jobs wait for
+    the run_jobs command."""
+    return getattr(settings, 'MUSIC_API_JOB_WORKERS', 1)
+
+
+def batch_size():
+    return getattr(settings, 'MUSIC_API_JOB_BATCH_SIZE', BATCH_SIZE)
+
+
+def pause():
+    # Gives writers waiting on the SQLite lock a chance to take it between
+    # two batches of a job.
+    time.sleep(getattr(settings, 'MUSIC_API_JOB_PAUSE', 0))
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix='music-api-job')
+        return _executor
+
+
+def enqueue(kind, **params):
+    """Record a job and, once the surrounding transaction commits, start it
+    on the in-process workers if there are any."""
+    job = Job.objects.create(kind=kind, params=params)
+    if workers():
+        transaction.on_commit(lambda: executor().submit(run_in_thread, job.pk))
+    return job
+
+
+def find(kind, statuses, **params):
+    jobs = Job.objects.filter(kind=kind, status__in=statuses)
+    for name, value in params.items():
+        jobs = jobs.filter(**{f'params__{name}': value})
+    return jobs.order_by('id').first()
+
+
+def active(kind, **params):
+    """Return the queued or running job of ``kind`` with these parameters,
+    if there is one."""
+    return find(kind, [Job.QUEUED, Job.RUNNING], **params)
+
+
+def enqueue_once(kind, **params):
+    """Enqueue a job unless the same one is queued and not started yet."""
+    return find(kind, [Job.QUEUED], **params) or enqueue(kind, **params)
+
+
+def refresh_snapshot(playlist_id):
+    """Queue a refresh of the playlist's snapshot, which the change being
+    made leaves out of date. Call it inside the transaction that makes the
+    change, after aggregates.touch()."""
+    if snapshots.tracked(playlist_id):
+        enqueue_once('refresh_snapshot', playlist_id=playlist_id)
+
+
+def rebalance_positions(playlist_id):
+    """Queue a respacing of the playlist's position keys."""
+    enqueue_once('rebalance_positions', playlist_id=playlist_id)
+
+
+def run_in_thread(job_id):
+    try:
+        run(job_id)
+    finally:
+        connections.close_all()
+
+
+def claim(job_id):
+    return Job.objects.filter(pk=job_id, status=Job.QUEUED).update(status=Job.RUNNING, started_at=timezone.now()) == 1
+
+
+def run(job_id):
+    """Run a queued job to completion. Returns False if another worker
+    already took it."""
+    if not claim(job_id):
+        return False
+
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = HANDLERS[job.kind](job, **job.params)
+    except ServiceError as e:
+        finish(job, Job.FAILED, error=e.detail)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed.", job.pk, job.kind)
+        finish(job, Job.FAILED, error=str(e) or e.__class__.__name__)
+    else:
+        if job.kind in INTERNAL_KINDS:
+            Job.objects.filter(pk=job.pk).delete()
+        else:
+            finish(job, Job.DONE, result=result)
+    return True
+
+
+def finish(job, status, result=None, error=''):
+    Job.objects.filter(pk=job.pk).update(status=status, result=result, error=error, finished_at=timezone.now())
+
+
+def report(job, progress, total=None):
+    values = {'progress': progress}
+    if total is not None:
+        values['total'] = total
+    Job.objects.filter(pk=job.pk).update(**values)
+
+
+def run_pending(limit=None):
+    """Run queued jobs oldest first and return how many were run."""
+    count = 0
+    while limit is None or count < limit:
+        job_id = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            break
+        if run(job_id):
+            count += 1
+    return count
+
+
+def requeue_interrupted():
+    """Queue again the jobs left running by a stopped process. Only call it
+    when no worker is running. Every job kind can be restarted."""
+    return Job.objects.filter(status=Job.RUNNING).update(status=Job.QUEUED, started_at=None)
+
+
+def upload_dir():
+    return getattr(settings, 'MUSIC_API_JOB_UPLOAD_DIR', None) or os.path.join(tempfile.gettempdir(), 'music_api_jobs')
+
+
+def save_upload(stream, suffix=''):
+    """Copy a request body to a file a job can read later and return its
+    path."""
+    os.makedirs(upload_dir(), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=upload_dir(), suffix=suffix, delete=False) as upload:
+        if stream is not None:
+            shutil.copyfileobj(stream, upload)
+    return upload.name
+
+
+@handler('delete_playlist')
+def delete_playlist(job, playlist_id):
+    # Deleting the playlist row would cascade to all of its songs in one
+    # transaction. Remove them a batch at a time instead, then the playlist.
+    total = Playlist.objects.filter(pk=playlist_id).values_list('track_count', flat=True).first()
+    if total is None:
+        raise ServiceError("Playlist does not exist.")
+    report(job, 0, total)
+    PlaylistSnapshot.objects.filter(pk=playlist_id).delete()
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(PlaylistSong.objects.filter(playlist_id=playlist_id).values_list('id', flat=True)[:batch_size()])
+            if not batch:
+                break
+            PlaylistSong.objects.filter(pk__in=batch).delete()
+            aggregates.touch(playlist_id, tracks=-len(batch))
+        deleted += len(batch)
+        report(job, deleted)
+        pause()
+
+    Playlist.objects.filter(pk=playlist_id).delete()
+    return {'deleted_tracks': deleted}
+
+
+@handler('import_songs')
+def import_songs(job, path, format, batch_size=ingest.BATCH_SIZE):
+    # The rows rejected are listed in the result, up to MAX_REPORTED_ROWS.
+    received = 0
+    rejected = []
+    try:
+        with open(path, 'rb') as stream:
+            for batch_report in ingest.summarize(ingest.ingest(ingest.read_rows(stream, format), batch_size=batch_size)):
+                if 'summary' in batch_report:
+                    return {**batch_report['summary'], 'rejected_rows': rejected}
+                rejected.extend(batch_report['rejected'][:MAX_REPORTED_ROWS - len(rejected)])
+                received += batch_report['received']
+                report(job, received)
+                pause()
+    finally:
+        os.remove(path)
+
+
+@handler('import_playlists')
+def import_playlists(job, entries):
+    report(job, 0, len(entries))
+    playlists = bulk.import_playlists(entries)
+    report(job, len(playlists))
+    return {'created': len(playlists), 'playlist_ids': [playlist.pk for playlist in playlists]}
+
+
+@handler('rebuild_snapshots')
+def rebuild_snapshots(job, playlist_ids=None):
+    return {'snapshotted': len(snapshots.rebuild(playlist_ids))}
+
+
+@handler('refresh_snapshot')
+def refresh_playlist_snapshot(job, playlist_id):
+    return {'snapshotted': snapshots.refresh(playlist_id)}
+
+
+@handler('rebalance_positions')
+def rebalance_playlist_positions(job, playlist_id):
+    return {'rewritten': positions.rebalance(playlist_id)}
+
+
+@handler('recompute_aggregates')
+def recompute_aggregates(job, playlist_ids=None):
+    return {'fixed': len(aggregates.recompute(playlist_ids))}
+
+
+@handler('rebuild_search_index')
+def rebuild_search_index(job):
+    if not search.is_supported():
+        raise ServiceError("The full-text search index is only available on SQLite.")
+    search.install()
+    return {}
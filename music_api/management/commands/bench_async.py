@@ -0,0 +1,57 @@
+import asyncio
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import clear_url_caches
+from music_api.models import PlaylistSong
+from music_api import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput of the sync and async view stacks under concurrent requests through the ASGI handler."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--stack', choices=['sync', 'async', 'both'], default='both')
+        parser.add_argument('--path', action='append', dest='paths', help="Path to request. Can be repeated. Defaults to the three list endpoints.")
+        parser.add_argument('--cache', action='store_true', help="Leave the response cache on.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        stacks = ['sync', 'async'] if options['stack'] == 'both' else [options['stack']]
+
+        results = []
+        for stack in stacks:
+            overrides = {'ROOT_URLCONF': benchmarks.api_urlconf(stack == 'async')}
+            if not options['cache']:
+                overrides['MUSIC_API_RESPONSE_CACHE'] = None
+
+            with override_settings(**overrides):
+                clear_url_caches()
+                latencies, statuses, elapsed = asyncio.run(
+                    benchmarks.run_async(AsyncClient(), paths, options['requests'], options['concurrency'])
+                )
+            clear_url_caches()
+
+            result = {'stack': stack, 'concurrency': options['concurrency'], 'statuses': statuses}
+            result.update(benchmarks.summarize(latencies, elapsed))
+            results.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'stack':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for result in results:
+            self.stdout.write(
+                f"{result['stack']:<6} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+                f"{result['p95_ms']:>8} {result['p99_ms']:>8}  {result['statuses']}"
+            )
+
+    def default_paths(self):
+        playlist_id = PlaylistSong.objects.values_list('playlist_id', flat=True).first()
+        if playlist_id is None:
+            raise CommandError("No playlist with songs to benchmark. Seed the database first.")
+        return ['/api/songs', '/api/playlists', f'/api/playlists/{playlist_id}/songs']
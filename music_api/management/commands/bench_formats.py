@@ -0,0 +1,49 @@
+import itertools
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from music_api.models import Playlist
+from music_api import benchmarks, export, renderers
+
+
+class Command(BaseCommand):
+    help = "Compare the size on the wire and the encoding time of a page of results in each response format, with and without gzip."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows in the page.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each encoding; the best one is reported.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        largest = Playlist.objects.aggregate(Max('track_count'))['track_count__max']
+        playlist = Playlist.objects.filter(track_count=largest).first() if largest else None
+        if playlist is None:
+            raise CommandError("There are no playlist songs to encode. Run seed_catalog first.")
+
+        pages = {
+            'songs': (export.SONG_FIELDS, export.song_rows()),
+            'playlist_songs': (export.PLAYLIST_SONG_FIELDS, export.playlist_song_rows(playlist.pk)),
+        }
+        renderer_classes = [
+            renderer_class for renderer_class in [renderers.FastJSONRenderer] + renderers.COMPACT_RENDERER_CLASSES
+            if getattr(renderer_class, 'available', True)
+        ]
+
+        results = []
+        for resource, (fields, rows) in pages.items():
+            page = [dict(zip(fields, row)) for row in itertools.islice(rows, options['rows'])]
+            data = {'count': len(page), 'next': None, 'previous': None, 'results': page}
+            for result in benchmarks.format_results(data, renderer_classes, options['repeat']):
+                result.update(resource=resource, rows=len(page))
+                results.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'resource':<15} {'format':<8} {'bytes':>10} {'gzip bytes':>11} {'encode ms':>10} {'gzip ms':>8}")
+        for result in results:
+            self.stdout.write(
+                f"{result['resource']:<15} {result['format']:<8} {result['bytes']:>10} "
+                f"{result['gzip_bytes']:>11} {result['encode_ms']:>10} {result['gzip_ms']:>8}"
+            )
@@ -0,0 +1,56 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from music_api.models import Song, Playlist
+from music_api.serializers import SongSerializer, PlaylistSerializer
+from music_api import benchmarks, renderers
+
+RESOURCES = {
+    'songs': (SongSerializer, lambda: Song.objects.order_by('id')),
+    'playlists': (PlaylistSerializer, lambda: Playlist.objects.order_by('id')),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare how fast list pages are turned into JSON by the serializers and by values() rows with the fast renderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per page.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each path; the best one is reported.")
+        parser.add_argument('--resource', choices=sorted(RESOURCES), action='append', dest='resources')
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        results = []
+        for resource in options['resources'] or sorted(RESOURCES):
+            serializer_class, queryset = RESOURCES[resource]
+            queryset = queryset()[:options['rows']]
+            count = queryset.count()
+            if not count:
+                raise CommandError(f"There are no {resource} to serialize. Run seed_catalog first.")
+
+            outputs = set()
+            for name, function in benchmarks.serialization_paths(serializer_class, queryset).items():
+                outputs.add(function())
+                elapsed, size = benchmarks.time_serialization(function, options['repeat'])
+                results.append({
+                    'resource': resource,
+                    'path': name,
+                    'rows': count,
+                    'ms': round(elapsed * 1000, 2),
+                    'rows_per_second': round(count / elapsed),
+                    'bytes': size,
+                })
+            if len(outputs) != 1:
+                raise CommandError(f"The paths rendered different JSON for {resource}.")
+
+        if options['json']:
+            self.stdout.write(json.dumps({'encoder': renderers.encoder(), 'results': results}, indent=2))
+            return
+
+        self.stdout.write(f"JSON encoder: {renderers.encoder()}")
+        self.stdout.write(f"{'resource':<10} {'path':<12} {'rows':>6} {'ms':>8} {'rows/s':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['resource']:<10} {result['path']:<12} {result['rows']:>6} "
+                f"{result['ms']:>8} {result['rows_per_second']:>10}"
+            )
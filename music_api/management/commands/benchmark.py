@@ -0,0 +1,114 @@
+import datetime
+import json
+import platform
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from music_api import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API route against the current database and report latency percentiles, throughput and queries per request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--client', choices=['wsgi', 'asgi'], default='wsgi', help="Send requests through the WSGI or the ASGI handler.")
+        parser.add_argument('--async-views', action='store_true', help="Serve the list endpoints from the async views.")
+        parser.add_argument('--scenario', action='append', dest='scenarios', help="Only run scenarios starting with this name, e.g. songs. or playlist_songs.page. Can be repeated.")
+        parser.add_argument('--writes', action='store_true', help="Also run the scenarios that create, change and delete data.")
+        parser.add_argument('--cache', action='store_true', help="Leave the response cache on.")
+        parser.add_argument('--query-samples', type=int, default=3, help="Untimed requests per scenario used to count queries and warm up.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Compare with the results in this JSON file.")
+        parser.add_argument('--list', action='store_true', help="List the scenarios and exit.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['query_samples'] < 0:
+            raise CommandError("Requests and concurrency must be positive and query samples not negative.")
+
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        run_id = int(time.time())
+        catalog = benchmarks.Catalog(run_id)
+        if catalog.is_empty():
+            raise CommandError("Benchmarks need songs and at least one playlist with songs. Run seed_catalog first.")
+
+        selected = [
+            scenario for scenario in benchmarks.scenarios(catalog)
+            if (options['writes'] or not scenario.writes)
+            and (not options['scenarios'] or scenario.name.startswith(tuple(options['scenarios'])))
+        ]
+        if options['list']:
+            for scenario in selected:
+                self.stdout.write(f"{scenario.name:<28} {scenario.route}{' (writes)' if scenario.writes else ''}")
+            return
+        if not selected:
+            raise CommandError("No scenario matches.")
+
+        if not options['scenarios']:
+            missing = set(benchmarks.route_names()) - {scenario.route for scenario in selected}
+            if missing:
+                self.stderr.write(f"Not covered without --writes: {', '.join(sorted(missing))}")
+
+        overrides = {}
+        if options['async_views']:
+            overrides['ROOT_URLCONF'] = benchmarks.api_urlconf(True)
+        if not options['cache']:
+            overrides['MUSIC_API_RESPONSE_CACHE'] = None
+
+        results = {}
+        with override_settings(**overrides):
+            for scenario in selected:
+                result = benchmarks.run_scenario(scenario, options['client'], options['requests'], options['concurrency'], options['query_samples'])
+                results[scenario.name] = result
+                self.stdout.write(
+                    f"{scenario.name:<28} {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                    f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  {result['queries_per_request']} queries"
+                    + (self.style.ERROR(f"  {result['errors']} errors {result['statuses']}") if result['errors'] else '')
+                )
+
+        report = {
+            'meta': {
+                'started_at': datetime.datetime.fromtimestamp(run_id, datetime.timezone.utc).isoformat(),
+                'commit': self.commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'client': options['client'],
+                'async_views': options['async_views'],
+                'cache': options['cache'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'database': str(settings.DATABASES['default']['NAME']),
+                'catalog': catalog.describe(),
+            },
+            'scenarios': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if previous is not None:
+            self.stdout.write(f"Compared with {previous.get('meta', {}).get('commit') or options['compare']}:")
+            for name, metric, before, after, change in benchmarks.compare(previous, report):
+                change = f"{change:+.1f}%" if change is not None else 'n/a'
+                self.stdout.write(f"{name:<28} {metric:<20} {before} -> {after} ({change})")
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,49 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from music_api.exceptions import ServiceError
+from music_api.models import Playlist
+from music_api import export
+
+
+class Command(BaseCommand):
+    help = "Stream songs, playlists or a playlist's songs to a file as NDJSON, CSV, columnar JSON or MessagePack."
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', choices=['songs', 'playlists', 'playlist-songs'])
+        parser.add_argument('--playlist', type=int, help="Playlist to export, for playlist-songs.")
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--since-id', type=int, help="Resume after this ID. For playlist-songs, the ID of the last song already exported.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+        parser.add_argument('-o', '--output', default='-', help="File to write, or - for standard output.")
+
+    def handle(self, *args, **options):
+        entity = options['entity']
+        since_id = options['since_id']
+        chunk_size = options['chunk_size']
+
+        if entity == 'songs':
+            fields, rows = export.SONG_FIELDS, export.song_rows(since_id, chunk_size)
+        elif entity == 'playlists':
+            fields, rows = export.PLAYLIST_FIELDS, export.playlist_rows(since_id, chunk_size)
+        else:
+            playlist_id = options['playlist']
+            if playlist_id is None:
+                raise CommandError("Pass --playlist to export a playlist's songs.")
+            if not Playlist.objects.filter(pk=playlist_id).exists():
+                raise CommandError("Playlist does not exist.")
+            try:
+                resume_from = export.resume_point(playlist_id, since_id) if since_id is not None else None
+            except ServiceError as e:
+                raise CommandError(e.detail)
+            fields, rows = export.PLAYLIST_SONG_FIELDS, export.playlist_song_rows(playlist_id, resume_from, chunk_size)
+
+        if options['format'] == 'msgpack':
+            output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        else:
+            output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='', encoding='utf-8')
+        try:
+            for line in export.render(options['format'], fields, rows):
+                output.write(line)
+        finally:
+            if output not in (sys.stdout, sys.stdout.buffer):
+                output.close()
@@ -0,0 +1,31 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from music_api import docs
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI document served at /api-docs/openapi.json, or check that it is up to date."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write. Defaults to MUSIC_API_OPENAPI_PATH.")
+        parser.add_argument('--check', action='store_true', help="Fail if the file differs from the document the code describes.")
+
+    def handle(self, *args, **options):
+        path = options['output'] or docs.schema_path()
+        if not path:
+            raise CommandError("Pass --output or set MUSIC_API_OPENAPI_PATH.")
+
+        content = docs.generate()
+        if options['check']:
+            existing = None
+            if os.path.exists(path):
+                with open(path, 'rb') as schema_file:
+                    existing = schema_file.read()
+            if existing != content:
+                raise CommandError(f"{path} is out of date. Run manage.py generate_openapi.")
+            self.stdout.write(self.style.SUCCESS(f"{path} is up to date."))
+            return
+
+        with open(path, 'wb') as schema_file:
+            schema_file.write(content)
+        self.stdout.write(self.style.SUCCESS(f"Wrote the OpenAPI document to {path}."))
@@ -0,0 +1,42 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from music_api import ingest
+
+
+class Command(BaseCommand):
+    help = "Stream songs from a CSV or NDJSON file into the catalog in batches, skipping songs that already exist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input.")
+        parser.add_argument('--format', choices=ingest.FORMATS, help="Input format. Guessed from the file extension when omitted.")
+        parser.add_argument('--batch-size', type=int, default=ingest.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            if path.endswith('.csv'):
+                format = 'csv'
+            elif path.endswith(('.ndjson', '.jsonl')):
+                format = 'ndjson'
+            else:
+                raise CommandError("Cannot guess the input format. Pass --format csv or --format ndjson.")
+        if options['batch_size'] < 1:
+            raise CommandError("Batch size must be a positive integer.")
+
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            rows = ingest.read_rows(stream, format)
+            for report in ingest.summarize(ingest.ingest(rows, batch_size=options['batch_size'])):
+                if 'summary' in report:
+                    summary = report['summary']
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Imported {summary['inserted']} of {summary['received']} rows in {summary['batches']} batches. "
+                        f"Skipped {summary['skipped']} songs that already existed and rejected {summary['rejected']} rows."
+                    ))
+                elif report['rejected']:
+                    self.stderr.write(json.dumps(report))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
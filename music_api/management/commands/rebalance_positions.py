@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from music_api.models import Playlist
+from music_api import positions
+
+
+class Command(BaseCommand):
+    help = "Respace playlist song position keys once the gaps between neighbours run low."
+
+    def add_arguments(self, parser):
+        parser.add_argument('playlist_ids', nargs='*', type=int, help="Only rebalance these playlists.")
+        parser.add_argument('--min-gap', type=int, default=positions.REBALANCE_MIN_GAP, help="Rebalance playlists whose smallest gap is below this value.")
+        parser.add_argument('--force', action='store_true', help="Rebalance regardless of the current gaps.")
+
+    def handle(self, *args, **options):
+        playlist_ids = options['playlist_ids'] or Playlist.objects.order_by('id').values_list('id', flat=True)
+
+        rebalanced = 0
+        for playlist_id in playlist_ids:
+            if not options['force']:
+                gap = positions.min_gap(playlist_id)
+                if gap is None or gap >= options['min_gap']:
+                    continue
+
+            updated = positions.rebalance(playlist_id)
+            rebalanced += 1
+            self.stdout.write(f"Playlist {playlist_id}: {updated} positions rewritten.")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {rebalanced} playlist(s)."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from music_api.models import PlaylistSnapshot
+from music_api import snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the packed track order kept for large playlists, or check it against their playlist songs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('playlist_ids', nargs='*', type=int, help="Only these playlists.")
+        parser.add_argument('--check', action='store_true', help="Compare existing snapshots with the playlist songs and fail on any mismatch.")
+
+    def handle(self, *args, **options):
+        playlist_ids = options['playlist_ids'] or None
+        if not options['check']:
+            built = snapshots.rebuild(playlist_ids)
+            self.stdout.write(self.style.SUCCESS(f"Snapshotted {len(built)} playlist(s)."))
+            return
+
+        existing = PlaylistSnapshot.objects.order_by('playlist_id').values_list('playlist_id', flat=True)
+        if playlist_ids:
+            existing = existing.filter(playlist_id__in=playlist_ids)
+
+        mismatched = []
+        checked = 0
+        for playlist_id in existing:
+            checked += 1
+            if not snapshots.check(playlist_id):
+                mismatched.append(playlist_id)
+                self.stdout.write(f"Playlist {playlist_id}: snapshot does not match its songs.")
+
+        if mismatched:
+            raise CommandError(f"{len(mismatched)} of {checked} snapshot(s) are out of date.")
+        self.stdout.write(self.style.SUCCESS(f"All {checked} snapshot(s) match."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from music_api import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the song full-text search index and its sync triggers, then reindex every song."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("The full-text search index is only available on SQLite. Other backends use the fallback search.")
+
+        search.install()
+        self.stdout.write(self.style.SUCCESS("Song search index rebuilt."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from music_api import aggregates
+
+
+class Command(BaseCommand):
+    help = "Recount playlist tracks and fix playlists whose stored aggregates have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('playlist_ids', nargs='*', type=int, help="Only check these playlists.")
+        parser.add_argument('--check', action='store_true', help="Report drift without fixing it, and fail if there is any.")
+
+    def handle(self, *args, **options):
+        playlist_ids = options['playlist_ids'] or None
+        if options['check']:
+            drifted = aggregates.drift(playlist_ids)
+        else:
+            drifted = aggregates.recompute(playlist_ids)
+
+        for playlist_id, stored, actual in drifted:
+            self.stdout.write(f"Playlist {playlist_id}: stored {stored} tracks, counted {actual}.")
+
+        if options['check'] and drifted:
+            raise CommandError(f"{len(drifted)} playlist(s) have drifted.")
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drifted)} playlist(s)."))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from music_api import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs, such as large playlist deletes and imports started with ?background=true."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs instead of exiting when the queue is empty.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+        parser.add_argument('--requeue', action='store_true', help="First queue again the jobs left running by a stopped process.")
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            self.stdout.write(f"Requeued {jobs.requeue_interrupted()} interrupted job(s).")
+
+        while True:
+            count = jobs.run_pending()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} job(s)."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from music_api.models import Song, Playlist
+from music_api import seed
+
+
+class Command(BaseCommand):
+    help = "Fill an empty database with a deterministic synthetic catalog for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=seed.SCALES, default='small', help="Preset sizes. The options below override them.")
+        parser.add_argument('--songs', type=int)
+        parser.add_argument('--playlists', type=int)
+        parser.add_argument('--tracks', type=int, help="Average number of songs per playlist.")
+        parser.add_argument('--large-playlist-tracks', type=int, help="Number of songs in the first playlist.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=seed.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if Song.objects.exists() or Playlist.objects.exists():
+            raise CommandError("The catalog is not empty. Seed a fresh database, e.g. by pointing DATABASE_PATH at a new file and running migrate.")
+        if options['batch_size'] < 1:
+            raise CommandError("Batch size must be a positive integer.")
+
+        sizes = seed.scale(
+            options['scale'],
+            songs=options['songs'],
+            playlists=options['playlists'],
+            tracks=options['tracks'],
+            large_playlist_tracks=options['large_playlist_tracks'],
+        )
+        if any(value < 0 for value in sizes.values()):
+            raise CommandError("Sizes must not be negative.")
+
+        started = time.perf_counter()
+        counts = seed.seed_catalog(seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write, **sizes)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['songs']} songs, {counts['playlists']} playlists and {counts['playlist_songs']} playlist songs "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,59 @@
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from .exceptions import ServiceError
+from .models import PlaylistSong
+from .serializers import PlaylistSerializer
+from . import bulk, rows
+
+# Cursor key of a song's playlists. It reads PlaylistSong.playlist_id, so
+# pages are ranges of the (song, playlist) index.
+KEY = 'playlist__id'
+MAX_SONGS = 1000
+
+
+def plan():
+    return rows.plan_for(PlaylistSerializer, prefix='playlist__')
+
+
+def playlists_of(song_id):
+    """The playlists holding a song, as values() rows for plan().shape()."""
+    return plan().values(PlaylistSong.objects.filter(song_id=song_id)).order_by(KEY)
+
+
+def count(song_id):
+    return PlaylistSong.objects.filter(song_id=song_id).count()
+
+
+def grouped(song_ids, limit):
+    """Return ``{song_id: (count, rows)}`` with the number of playlists
+    holding each of ``song_ids`` and the first ``limit`` of them by ID.
+    Songs in no playlist are left out.
+
+    The memberships are ranked and counted in the (song, playlist) index
+    alone; only the ones kept are joined to their playlists.
+    """
+    memberships = PlaylistSong.objects.filter(song_id__in=song_ids)
+    totals = dict(memberships.values('song_id').annotate(total=Count('*')).values_list('song_id', 'total'))
+    if not totals:
+        return {}
+
+    kept = memberships.annotate(
+        rank=Window(RowNumber(), partition_by=F('song_id'), order_by=F('playlist_id').asc()),
+    ).filter(rank__lte=limit).values('pk')
+
+    found = list(PlaylistSong.objects.filter(pk__in=kept).values('song_id', *plan().lookups).order_by('song_id', KEY))
+    groups = {}
+    # shape() returns new dicts without song_id, as the plan renames fields.
+    for row, playlist in zip(found, plan().shape(found)):
+        groups.setdefault(row['song_id'], (totals[row['song_id']], []))[1].append(playlist)
+    return groups
+
+
+def clean_song_ids(song_ids):
+    if not isinstance(song_ids, list) or not song_ids:
+        raise ServiceError("Include at least one song ID.")
+    song_ids = bulk.unique_song_ids(song_ids)
+    if len(song_ids) > MAX_SONGS:
+        raise ServiceError(f"Look up at most {MAX_SONGS} songs at a time.")
+    bulk.check_songs_exist(song_ids)
+    return song_ids
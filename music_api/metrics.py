@@ -0,0 +1,216 @@
+import bisect
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from .renderers import FastJSONRenderer
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+current = contextvars.ContextVar('music_api_request_timings', default=None)
+
+
+class Timings:
+    """Time spent by one request, broken down by phase.
+
+    Also acts as the ``execute_wrapper`` that counts and times queries.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.phases = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.phases['db'] += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.phases["db"] * 1000:.2f};desc="{self.queries} queries"']
+        entries += [f'{name};dur={self.phases[name] * 1000:.2f}' for name in ('serialize', 'render')]
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+@contextlib.contextmanager
+def timed(phase):
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+        series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in sorted(self.series.items()):
+            label_text = format_labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series['counts']):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{label_text}}} {series["sum"]}'
+            yield f'{self.name}_count{{{label_text}}} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{{{format_labels(self.labels, labels)}}} {value}'
+
+
+def format_labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        labels = ('route', 'method')
+        self.responses = Counter('music_api_responses_total', "Responses by route, method and status.", labels + ('status',))
+        self.duration = Histogram('music_api_request_duration_seconds', "Time to produce a response.", labels, DURATION_BUCKETS)
+        self.phases = {
+            phase: Histogram(f'music_api_request_{phase}_seconds', f"Time spent in {phase}, for sampled requests.", labels, DURATION_BUCKETS)
+            for phase in ('db', 'serialize', 'render')
+        }
+        self.queries = Histogram('music_api_request_queries', "Queries per request, for sampled requests.", labels, QUERY_BUCKETS)
+
+    def record(self, route, method, status, duration, timings=None):
+        labels = (route, method)
+        with self.lock:
+            self.responses.inc(labels + (status,))
+            self.duration.observe(labels, duration)
+            if timings is not None:
+                for phase, histogram in self.phases.items():
+                    histogram.observe(labels, timings.phases[phase])
+                self.queries.observe(labels, timings.queries)
+
+    def render(self):
+        with self.lock:
+            metrics = [self.responses, self.duration, *self.phases.values(), self.queries]
+            return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+
+class TimedJSONRenderer(FastJSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def route_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+def start_request():
+    """Return the request's Timings if it is sampled, else None."""
+    rate = getattr(settings, 'MUSIC_API_METRICS_SAMPLE_RATE', 1.0)
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    return Timings()
+
+
+def finish_request(request, response, started, timings):
+    duration = time.perf_counter() - started
+    registry.record(route_label(request), request.method, str(response.status_code), duration, timings)
+    if timings is not None:
+        response['Server-Timing'] = timings.server_timing(duration)
+
+
+def add_wrappers(timings):
+    for alias in connections:
+        connections[alias].execute_wrappers.append(timings)
+
+
+def remove_wrappers(timings):
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if timings in wrappers:
+            wrappers.remove(timings)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Record every response in the per-route histograms. Sampled requests
+    also get their SQL, serializer and render time recorded and returned in
+    a Server-Timing header.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            timings = start_request()
+            if timings is None:
+                response = await get_response(request)
+            else:
+                # Connections are per thread, so the wrappers have to be
+                # installed from the thread that runs this request's queries.
+                token = current.set(timings)
+                await sync_to_async(add_wrappers)(timings)
+                try:
+                    response = await get_response(request)
+                finally:
+                    await sync_to_async(remove_wrappers)(timings)
+                    current.reset(token)
+            finish_request(request, response, started, timings)
+            return response
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            timings = start_request()
+            if timings is None:
+                response = get_response(request)
+            else:
+                token = current.set(timings)
+                add_wrappers(timings)
+                try:
+                    response = get_response(request)
+                finally:
+                    remove_wrappers(timings)
+                    current.reset(token)
+            finish_request(request, response, started, timings)
+            return response
+    return middleware
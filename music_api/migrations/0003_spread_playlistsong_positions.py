@@ -0,0 +1,36 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:00
+
+from django.db import migrations
+from django.db.models import F
+
+POSITION_GAP = 1024
+
+
+def spread_positions(apps, schema_editor):
+    PlaylistSong = apps.get_model('music_api', 'PlaylistSong')
+    PlaylistSong.objects.update(position=F('position') * POSITION_GAP)
+
+
+def compact_positions(apps, schema_editor):
+    PlaylistSong = apps.get_model('music_api', 'PlaylistSong')
+    changed = []
+    playlist_id = None
+    for playlist_song in PlaylistSong.objects.order_by('playlist_id', 'position').iterator():
+        if playlist_song.playlist_id != playlist_id:
+            playlist_id = playlist_song.playlist_id
+            position = 0
+        position += 1
+        playlist_song.position = position
+        changed.append(playlist_song)
+    PlaylistSong.objects.bulk_update(changed, ['position'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0002_alter_playlistsong_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_positions, compact_positions),
+    ]
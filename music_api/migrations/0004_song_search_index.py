@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:00
+
+from django.db import migrations
+
+# A copy of the SQL in music_api.search as it was when this migration was
+# written, so later changes to that module cannot alter the migration.
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS music_api_song_fts USING fts5("
+    "name, artist, content='music_api_song', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_ai AFTER INSERT ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_ad AFTER DELETE ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(music_api_song_fts, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); END",
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_au AFTER UPDATE OF name, artist ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(music_api_song_fts, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); "
+    "INSERT INTO music_api_song_fts(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+    "INSERT INTO music_api_song_fts(music_api_song_fts) VALUES ('rebuild')",
+]
+
+UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS music_api_song_fts_ai',
+    'DROP TRIGGER IF EXISTS music_api_song_fts_ad',
+    'DROP TRIGGER IF EXISTS music_api_song_fts_au',
+    'DROP TABLE IF EXISTS music_api_song_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in INSTALL_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in UNINSTALL_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0003_spread_playlistsong_positions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+TRIGGER_SQL = [
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_ai AFTER INSERT ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_ad AFTER DELETE ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(music_api_song_fts, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); END",
+    "CREATE TRIGGER IF NOT EXISTS music_api_song_fts_au AFTER UPDATE OF name, artist ON music_api_song BEGIN "
+    "INSERT INTO music_api_song_fts(music_api_song_fts, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); "
+    "INSERT INTO music_api_song_fts(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+    "INSERT INTO music_api_song_fts(music_api_song_fts) VALUES ('rebuild')",
+]
+
+
+def merge_duplicate_songs(apps, schema_editor):
+    Song = apps.get_model('music_api', 'Song')
+    PlaylistSong = apps.get_model('music_api', 'PlaylistSong')
+
+    duplicates = Song.objects.values('name', 'artist').annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Song.objects.filter(name=duplicate['name'], artist=duplicate['artist']).exclude(pk=keep_id).values_list('pk', flat=True))
+
+        for playlist_song in PlaylistSong.objects.filter(song_id__in=extra_ids).order_by('position'):
+            if PlaylistSong.objects.filter(playlist_id=playlist_song.playlist_id, song_id=keep_id).exists():
+                playlist_song.delete()
+            else:
+                playlist_song.song_id = keep_id
+                playlist_song.save(update_fields=['song'])
+
+        Song.objects.filter(pk__in=extra_ids).delete()
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # SQLite adds the constraint by rebuilding the song table, which drops the
+    # triggers that keep the search index in sync.
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in TRIGGER_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0004_song_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_songs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='song',
+            constraint=models.UniqueConstraint(fields=('name', 'artist'), name='unique_song_name_artist'),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+NAME_MAX_LENGTH = 100
+
+
+def remove_duplicate_playlist_songs(apps, schema_editor):
+    # Keep the first occurrence of a song in each playlist.
+    PlaylistSong = apps.get_model('music_api', 'PlaylistSong')
+
+    duplicates = PlaylistSong.objects.values('playlist_id', 'song_id').annotate(total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        playlist_songs = PlaylistSong.objects.filter(playlist_id=duplicate['playlist_id'], song_id=duplicate['song_id']).order_by('position', 'id')
+        keep_id = playlist_songs.values_list('id', flat=True).first()
+        playlist_songs.exclude(pk=keep_id).delete()
+
+
+def rename_duplicate_playlists(apps, schema_editor):
+    # The oldest playlist keeps its name, the others get " (2)", " (3)"...
+    Playlist = apps.get_model('music_api', 'Playlist')
+
+    duplicates = Playlist.objects.values('name').annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        name = duplicate['name']
+        number = 1
+        for playlist in Playlist.objects.filter(name=name).exclude(pk=duplicate['keep_id']).order_by('id'):
+            while True:
+                number += 1
+                suffix = f' ({number})'
+                new_name = name[:NAME_MAX_LENGTH - len(suffix)] + suffix
+                if not Playlist.objects.filter(name=new_name).exists():
+                    break
+            playlist.name = new_name
+            playlist.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0005_song_unique_name_artist'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_playlist_songs, migrations.RunPython.noop),
+        migrations.RunPython(rename_duplicate_playlists, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='playlistsong',
+            name='playlist',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='music_api.playlist'),
+        ),
+        migrations.AddConstraint(
+            model_name='playlistsong',
+            constraint=models.UniqueConstraint(fields=('playlist', 'song'), name='unique_playlist_song'),
+        ),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'position'], name='playlistsong_playlist_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='playlist',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_playlist_name'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:47
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_tracks(apps, schema_editor):
+    Playlist = apps.get_model('music_api', 'Playlist')
+    PlaylistSong = apps.get_model('music_api', 'PlaylistSong')
+
+    tracks = PlaylistSong.objects.filter(playlist=OuterRef('pk')).order_by().values('playlist').annotate(total=Count('id')).values('total')
+    Playlist.objects.update(track_count=Coalesce(Subquery(tracks, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0006_playlist_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1),
+        ),
+        migrations.RunPython(count_tracks, migrations.RunPython.noop),
+    ]
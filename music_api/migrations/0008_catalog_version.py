@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    CatalogVersion = apps.get_model('music_api', 'CatalogVersion')
+    CatalogVersion.objects.bulk_create([CatalogVersion(name='songs'), CatalogVersion(name='playlists')])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0007_playlist_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
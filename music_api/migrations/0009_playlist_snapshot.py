@@ -0,0 +1,22 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0008_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaylistSnapshot',
+            fields=[
+                ('playlist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='music_api.playlist')),
+                ('version', models.PositiveBigIntegerField()),
+                ('song_ids', models.BinaryField()),
+            ],
+        ),
+    ]
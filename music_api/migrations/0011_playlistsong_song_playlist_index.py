@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-18 21:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The (song, playlist) index serves the song foreign key too. Dropping the
+# foreign key's own index with AlterField would copy the whole table on SQLite,
+# so it is dropped by the name Django gave it in 0001_initial.
+SONG_INDEX = 'music_api_playlistsong_song_id_1aee4090'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['song', 'playlist'], name='playlistsong_song_playlist'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='playlistsong',
+                    name='song',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='music_api.song'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS "%s"' % SONG_INDEX,
+                    'CREATE INDEX IF NOT EXISTS "%s" ON "music_api_playlistsong" ("song_id")' % SONG_INDEX,
+                ),
+            ],
+        ),
+    ]
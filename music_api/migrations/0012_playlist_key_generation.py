@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_api', '0011_playlistsong_song_playlist_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='key_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,27 +1,106 @@
 from django.db import models
+from django.utils import timezone
 
 class Song(models.Model):
     name = models.CharField(max_length=100)
     artist = models.CharField(max_length=100)
     release_year = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'artist'], name='unique_song_name_artist'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Playlist(models.Model):
     name = models.CharField(max_length=100)
     songs = models.ManyToManyField(Song, through='PlaylistSong', related_name='playlist')
+    # Kept up to date by music_api.aggregates. The version only moves when
+    # the playlist's songs change.
+    track_count = models.PositiveIntegerField(default=0)
+    modified_at = models.DateTimeField(default=timezone.now)
+    version = models.PositiveBigIntegerField(default=1)
+    # Moves whenever the position keys of songs that stay in place are
+    # rewritten, which makes the cursors issued before stale.
+    key_generation = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_playlist_name'),
+        ]
 
     def __str__(self):
         return self.name
 
 class PlaylistSong(models.Model):
-    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
-    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    # Each foreign key leads one of the composite indexes below, so neither
+    # needs an index of its own.
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, db_index=False)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, db_index=False)
     position = models.IntegerField()  
 
     class Meta:
         ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['playlist', 'song'], name='unique_playlist_song'),
+        ]
+        indexes = [
+            # Not unique: SQLite checks uniqueness row by row, so shifting a
+            # range of positions by one UPDATE could collide midway.
+            models.Index(fields=['playlist', 'position'], name='playlistsong_playlist_position'),
+            # The playlists a song is in, in playlist order.
+            models.Index(fields=['song', 'playlist'], name='playlistsong_song_playlist'),
+        ]
+
+    def __str__(self):
+        return f"{self.playlist.name} - {self.song.name}"
+class PlaylistSnapshot(models.Model):
+    # The playlist's song IDs in track order, packed as little-endian int64s
+    # so a page can be read with substr(). Only valid while version matches
+    # the playlist's. Maintained by music_api.snapshots.
+    playlist = models.OneToOneField(Playlist, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    version = models.PositiveBigIntegerField()
+    song_ids = models.BinaryField()
+
+    def __str__(self):
+        return str(self.playlist_id)
+
+class CatalogVersion(models.Model):
+    # One row per collection ('songs', 'playlists'), bumped by
+    # music_api.aggregates on every write that changes it.
+    name = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    modified_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+class Job(models.Model):
+    # Background work run by music_api.jobs, polled by clients at
+    # /api/jobs/<id>.
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    progress = models.PositiveBigIntegerField(default=0)
+    total = models.PositiveBigIntegerField(null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status'),
+        ]
 
     def __str__(self):
-        return f"{self.playlist.name} - {self.song.name}"
\ No newline at end of file
+        return f"{self.kind} {self.pk}"
@@ -0,0 +1,161 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.core.paginator import Paginator
+from rest_framework import status
+from .exceptions import ServiceError
+
+PAGE_SIZE = getattr(settings, 'MUSIC_API_PAGE_SIZE', 10)
+MAX_PAGE_SIZE = getattr(settings, 'MUSIC_API_MAX_PAGE_SIZE', 100)
+
+
+class Page:
+    def __init__(self, object_list, start_position, count, next_url, previous_url):
+        self.object_list = object_list
+        self.start_position = start_position
+        self.count = count
+        self.next_url = next_url
+        self.previous_url = previous_url
+
+    def response_data(self, results):
+        return {
+            'count': self.count,
+            'next': self.next_url,
+            'previous': self.previous_url,
+            'results': results
+        }
+
+
+def get_page_size(request):
+    page_size = request.GET.get('page_size')
+    if page_size is None:
+        return PAGE_SIZE
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise ServiceError("Page size must be a positive integer.")
+    if page_size < 1:
+        raise ServiceError("Page size must be a positive integer.")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(key, position, reverse, generation=None):
+    data = {'k': key, 'p': position, 'r': int(reverse)}
+    if generation is not None:
+        data['g'] = generation
+    data = json.dumps(data, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        key, position, reverse, generation = data['k'], data['p'], bool(data['r']), data.get('g')
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise ServiceError("Invalid cursor.")
+    if not isinstance(key, int) or not isinstance(position, int) or not isinstance(generation, (int, type(None))):
+        raise ServiceError("Invalid cursor.")
+    return key, position, reverse, generation
+
+
+def requested_page(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+
+def wants_count(request):
+    return request.GET.get('count', '').lower() in ('1', 'true', 'yes')
+
+
+def is_cursor_request(request):
+    return 'cursor' in request.GET
+
+
+def paginate(request, queryset, base_url, key='id', count=None):
+    page_size = get_page_size(request)
+    if is_cursor_request(request):
+        return cursor_page(request, queryset, base_url, key, page_size, count)
+    return number_page(request, queryset, base_url, page_size, count)
+
+
+def number_page(request, queryset, base_url, page_size, count=None):
+    paginator = Paginator(queryset, page_size)
+    if count is not None:
+        paginator.count = count
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    return number_result(request, base_url, page_size, page_obj, list(page_obj.object_list))
+
+
+def number_result(request, base_url, page_size, page_obj, object_list):
+    suffix = f'&page_size={page_size}' if 'page_size' in request.GET else ''
+    next_url = base_url + f'?page={page_obj.next_page_number()}' + suffix if page_obj.has_next() else None
+    previous_url = base_url + f'?page={page_obj.previous_page_number()}' + suffix if page_obj.has_previous() else None
+
+    return Page(object_list, page_obj.start_index(), page_obj.paginator.count, next_url, previous_url)
+
+
+def cursor_page(request, queryset, base_url, key, page_size, count=None, generation=None):
+    rows, boundary = cursor_query(request, queryset, key, page_size, generation)
+    rows = list(rows)
+    if count is None and wants_count(request):
+        count = queryset.count()
+    return cursor_result(request, base_url, key, page_size, rows, boundary, count, generation)
+
+
+def cursor_query(request, queryset, key, page_size, generation=None):
+    """Return the queryset for a cursor page, fetching one extra row to tell
+    whether another page follows, and the (position, reverse) boundary
+    decoded from the cursor, or None for the first page.
+
+    Keys that can be rewritten pass the ``generation`` they are at. Cursors
+    issued at another generation are turned away, as their key no longer
+    marks the same place.
+    """
+    cursor = request.GET.get('cursor')
+    queryset = queryset.order_by(key)
+    if not cursor:
+        return queryset[:page_size + 1], None
+
+    boundary, position, reverse, cursor_generation = decode_cursor(cursor)
+    if cursor_generation != generation:
+        raise ServiceError("The songs were respaced since this cursor was issued. Start again with an empty cursor.", status.HTTP_409_CONFLICT)
+    if reverse:
+        return queryset.filter(**{f'{key}__lt': boundary}).order_by(f'-{key}')[:page_size + 1], (position, True)
+    return queryset.filter(**{f'{key}__gt': boundary})[:page_size + 1], (position, False)
+
+
+def cursor_result(request, base_url, key, page_size, rows, boundary, count=None, generation=None):
+    if boundary is None:
+        has_next, has_previous = len(rows) > page_size, False
+        object_list = rows[:page_size]
+        start_position = 1
+    else:
+        position, reverse = boundary
+        if reverse:
+            has_next, has_previous = True, len(rows) > page_size
+            object_list = rows[:page_size][::-1]
+            start_position = max(position - len(object_list), 1)
+        else:
+            has_next, has_previous = len(rows) > page_size, True
+            object_list = rows[:page_size]
+            start_position = position + 1
+
+    def link(obj, position, reverse):
+        params = request.GET.copy()
+        params.pop('page', None)
+        value = obj[key] if isinstance(obj, dict) else getattr(obj, key)
+        params['cursor'] = encode_cursor(value, position, reverse, generation)
+        return base_url + '?' + params.urlencode()
+
+    next_url = None
+    previous_url = None
+    if object_list:
+        if has_next:
+            next_url = link(object_list[-1], start_position + len(object_list) - 1, False)
+        if has_previous:
+            previous_url = link(object_list[0], start_position, True)
+
+    return Page(object_list, start_position, count, next_url, previous_url)
@@ -0,0 +1,166 @@
+from django.db import connection, transaction
+from django.db.models import F, Max
+from .models import Playlist, PlaylistSong
+from . import aggregates, jobs, snapshots
+
+# PlaylistSong.position holds a sparse sort key rather than the 1-based
+# position shown to clients. Keys start POSITION_GAP apart so a song can be
+# moved or inserted between two neighbours by writing a single row.
+POSITION_GAP = 1024
+# A move or insert that leaves two neighbours closer than this queues a
+# rebalance_positions job, before the gap runs out and later songs have to
+# be shifted.
+REBALANCE_MIN_GAP = 16
+
+
+def key_for_index(index):
+    return (index + 1) * POSITION_GAP
+
+
+def key_between(before, after):
+    if before is None and after is None:
+        return POSITION_GAP
+    if before is None:
+        return after - POSITION_GAP
+    if after is None:
+        return before + POSITION_GAP
+    if after - before > 1:
+        return (before + after) // 2
+    return None
+
+
+def spread(before, after, count):
+    """Return ``count`` increasing keys strictly between two neighbours, or
+    None if the gap is too small."""
+    if before is None and after is None:
+        return [key_for_index(index) for index in range(count)]
+    if before is None:
+        return [after - (count - index) * POSITION_GAP for index in range(count)]
+    if after is None:
+        return [before + (index + 1) * POSITION_GAP for index in range(count)]
+    step = (after - before) // (count + 1)
+    if step < 1:
+        return None
+    return [before + (index + 1) * step for index in range(count)]
+
+
+def neighbours(playlist_id, position, exclude=None):
+    siblings = PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position')
+    if exclude is not None:
+        siblings = siblings.exclude(pk=exclude)
+
+    if position == 1:
+        keys = list(siblings.values_list('position', flat=True)[:1])
+        return None, keys[0] if keys else None
+
+    keys = list(siblings.values_list('position', flat=True)[position - 2:position])
+    before = keys[0] if keys else None
+    after = keys[1] if len(keys) > 1 else None
+    return before, after
+
+
+def crowded(*keys):
+    keys = [key for key in keys if key is not None]
+    return any(after - before < REBALANCE_MIN_GAP for before, after in zip(keys, keys[1:]))
+
+
+def rekeyed(playlist_id):
+    """Record that the playlist's keys were rewritten, so that cursors
+    holding the old keys are turned away."""
+    Playlist.objects.filter(pk=playlist_id).update(key_generation=F('key_generation') + 1)
+
+
+def shift(playlist_id, from_key, delta, exclude=None):
+    playlist_songs = PlaylistSong.objects.filter(playlist_id=playlist_id, position__gte=from_key)
+    if exclude is not None:
+        playlist_songs = playlist_songs.exclude(pk=exclude)
+    rekeyed(playlist_id)
+    return playlist_songs.update(position=F('position') + delta)
+
+
+def move(playlist_song, position):
+    with transaction.atomic():
+        before, after = neighbours(playlist_song.playlist_id, position, exclude=playlist_song.pk)
+        key = key_between(before, after)
+        if key is None:
+            shift(playlist_song.playlist_id, after, POSITION_GAP, exclude=playlist_song.pk)
+            key = key_between(before, after + POSITION_GAP)
+        elif crowded(before, key, after):
+            jobs.rebalance_positions(playlist_song.playlist_id)
+
+        playlist_song.position = key
+        playlist_song.save(update_fields=['position'])
+        aggregates.touch(playlist_song.playlist_id)
+        jobs.refresh_snapshot(playlist_song.playlist_id)
+
+
+def remove(playlist_song):
+    with transaction.atomic():
+        playlist_song.delete()
+        aggregates.touch(playlist_song.playlist_id, tracks=-1)
+        jobs.refresh_snapshot(playlist_song.playlist_id)
+
+
+def append(playlist_id, song_id):
+    with transaction.atomic():
+        last = PlaylistSong.objects.filter(playlist_id=playlist_id).aggregate(value=Max('position'))['value']
+        playlist_song = PlaylistSong.objects.create(playlist_id=playlist_id, song_id=song_id, position=key_between(last, None))
+        aggregates.touch(playlist_id, tracks=1)
+        jobs.refresh_snapshot(playlist_id)
+    return playlist_song
+
+
+def make_room(playlist_id, position, count, track_count):
+    """Return keys for ``count`` songs inserted at the 1-based ``position``.
+
+    If they do not fit between their neighbours, the songs after them are
+    shifted with a single range update.
+    """
+    if position > track_count:
+        last = PlaylistSong.objects.filter(playlist_id=playlist_id).aggregate(value=Max('position'))['value']
+        return spread(last, None, count)
+
+    before, after = neighbours(playlist_id, position)
+    keys = spread(before, after, count)
+    if keys is None:
+        shift(playlist_id, after, count * POSITION_GAP)
+        keys = spread(before, after + count * POSITION_GAP, count)
+    elif crowded(before, *keys, after):
+        jobs.rebalance_positions(playlist_id)
+    return keys
+
+
+def rebalance(playlist_id):
+    """Respace the playlist's keys POSITION_GAP apart and return how many
+    were rewritten."""
+    with transaction.atomic():
+        rows = PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position').values_list('id', 'position')
+        changed = [
+            (key_for_index(index), pk)
+            for index, (pk, position) in enumerate(rows)
+            if position != key_for_index(index)
+        ]
+        if not changed:
+            return 0
+
+        # One prepared UPDATE per row rather than bulk_update(), whose CASE
+        # expression SQLite evaluates linearly for every row it updates.
+        table = connection.ops.quote_name(PlaylistSong._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'UPDATE {table} SET position = %s WHERE id = %s', changed)
+        # The order is unchanged, but the page a cursor points at is not.
+        snapshots.update(playlist_id, lambda song_ids: song_ids)
+        rekeyed(playlist_id)
+        aggregates.touch(playlist_id)
+    return len(changed)
+
+
+def min_gap(playlist_id):
+    smallest = None
+    previous = None
+    keys = PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position').values_list('position', flat=True)
+    for key in keys.iterator(chunk_size=2000):
+        if previous is not None and (smallest is None or key - previous < smallest):
+            smallest = key - previous
+        previous = key
+    return smallest
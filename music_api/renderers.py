@@ -0,0 +1,150 @@
+import operator
+from django.conf import settings
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNS_MEDIA_TYPE = 'application/vnd.playlist-manager.columns+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# Floats that orjson formats differently from the json module: 1e16 is
+# "1e16" rather than "1e+16", and 1e-05 is "0.00001". Output that might
+# contain one is rendered again with the json module. Digits are mapped to
+# 0 to look for exponents with a substring search, which is much faster
+# than a regular expression.
+DIGITS = bytes.maketrans(b'123456789', b'000000000')
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def encoder():
+    """The JSON encoder in use: 'orjson' when it is installed and enabled,
+    else 'json'."""
+    if orjson is not None and getattr(settings, 'MUSIC_API_JSON_ENCODER', 'orjson') == 'orjson':
+        return 'orjson'
+    return 'json'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Renders the same bytes as DRF's JSONRenderer, with orjson when it is
+    installed."""
+
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None
+            or encoder() != 'orjson'
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            # Dates and times go through DRF's encoder, which formats them
+            # differently from orjson.
+            content = orjson.dumps(data, default=self.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except orjson.JSONEncodeError:
+            # Integers past 64 bits, non-string keys and the like.
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'0.0000' in content or b'0e' in content.translate(DIGITS):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            content = content.replace(separator, escaped)
+        return content
+
+
+def columns(data):
+    """Return a list page with its results as arrays of values, and the
+    field names once under "columns". Anything else is returned as is."""
+    if not isinstance(data, dict) or not isinstance(data.get('results'), list):
+        return data
+    results = data['results']
+    if not all(isinstance(row, dict) for row in results):
+        return data
+
+    names = list(results[0]) if results else []
+    shaped = {key: value for key, value in data.items() if key != 'results'}
+    shaped['columns'] = names
+    if len(names) > 1:
+        # Tuples, which render as arrays.
+        shaped['results'] = list(map(operator.itemgetter(*names), results))
+    else:
+        shaped['results'] = [[row[name] for name in names] for row in results]
+    return shaped
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """JSON with the field names of list results sent once instead of on
+    every row."""
+
+    media_type = COLUMNS_MEDIA_TYPE
+    format = 'columns'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(columns(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """The same data as the JSON renderer, as MessagePack. Only offered when
+    the msgpack package is installed."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.default)
+
+
+# Formats offered on top of JSON by the list endpoints, picked with the
+# Accept header.
+COMPACT_RENDERER_CLASSES = [ColumnarJSONRenderer, MessagePackRenderer]
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    """DRF's negotiation, leaving out renderers whose optional dependency is
+    not installed."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+def negotiate(request, renderer_classes):
+    """Pick the renderer for a Django view the way DRF's views do. Returns
+    ``(renderer, media_type)``, or None if none of them is acceptable."""
+    renderers = [renderer_class() for renderer_class in renderer_classes]
+    try:
+        return ContentNegotiation().select_renderer(Request(request), renderers)
+    except NotAcceptable:
+        return None
+
+
+class FallbackContentNegotiation(ContentNegotiation):
+    """For views that pick their own output format from the Accept header:
+    headers no renderer matches get the first renderer instead of a 406."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
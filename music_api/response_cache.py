@@ -0,0 +1,143 @@
+import functools
+import hashlib
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+from . import conditional
+
+_sizes = {}
+_usage = {}
+
+
+class BoundedLocMemCache(LocMemCache):
+    """Local-memory cache with a byte budget.
+
+    Entries are evicted least recently used first once either MAX_ENTRIES or
+    the MAX_BYTES option is exceeded.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._sizes = _sizes.setdefault(name, {})
+        self._usage = _usage.setdefault(name, {'bytes': 0, 'evictions': 0})
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._delete(key)
+        size = len(value)
+        while self._cache and (len(self._cache) >= self._max_entries or self._usage['bytes'] + size > self._max_bytes):
+            evicted, _ = self._cache.popitem()
+            self._expire_info.pop(evicted, None)
+            self._usage['bytes'] -= self._sizes.pop(evicted, 0)
+            self._usage['evictions'] += 1
+        self._cache[key] = value
+        self._cache.move_to_end(key, last=False)
+        self._expire_info[key] = self.get_backend_timeout(timeout)
+        self._sizes[key] = size
+        self._usage['bytes'] += size
+
+    def _delete(self, key):
+        deleted = super()._delete(key)
+        if deleted:
+            self._usage['bytes'] -= self._sizes.pop(key, 0)
+        return deleted
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self._sizes.clear()
+            self._usage['bytes'] = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._usage['bytes'],
+                'max_bytes': self._max_bytes,
+                'evictions': self._usage['evictions'],
+            }
+
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+counters = Counters()
+
+
+def get_cache():
+    alias = getattr(settings, 'MUSIC_API_RESPONSE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def page_key(versions, request):
+    versions = ':'.join(str(version) for version in versions)
+    digest = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+    return f'music_api:response:{versions}:{digest}'
+
+
+def cached_get(state):
+    """Cache a list view's response data under the versions its page is
+    built from.
+
+    ``state`` is called with the view's URL kwargs and returns the same
+    state query as the view's conditional_get(). The versions it reads are
+    the ones every write moves in the database, so a page cached by any
+    worker becomes unreachable for all of them as soon as a write commits.
+    A lookup costs that one query, read once through
+    conditional.read_state() for both decorators, and a hit replays the
+    validators of the row it read.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return method(view, request, *args, **kwargs)
+
+            row = conditional.read_state(request, state, kwargs)
+            if row is None:
+                return method(view, request, *args, **kwargs)
+
+            key = page_key(row[0::2], request)
+            data = cache.get(key)
+            counters.record(data is not None)
+            if data is not None:
+                return conditional.cached_response(request, data, row, Response)
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout=getattr(settings, 'MUSIC_API_RESPONSE_CACHE_TIMEOUT', None))
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    cache = get_cache()
+    with counters.lock:
+        data = {
+            'enabled': cache is not None,
+            'hits': counters.hits,
+            'misses': counters.misses,
+        }
+    lookups = data['hits'] + data['misses']
+    data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else None
+    if isinstance(cache, BoundedLocMemCache):
+        data.update(cache.stats())
+    return data
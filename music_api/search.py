@@ -0,0 +1,114 @@
+import re
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'music_api_song_fts'
+SONG_TABLE = 'music_api_song'
+SEARCH_FIELDS = ('name', 'artist')
+
+# Ranking weights for bm25(), in SEARCH_FIELDS order. A match on the song
+# name counts for more than a match on the artist.
+FIELD_WEIGHTS = (10.0, 5.0)
+
+INSTALL_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"name, artist, content='{SONG_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {SONG_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {SONG_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, artist ON {SONG_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, artist) VALUES ('delete', old.id, old.name, old.artist); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, artist) VALUES (new.id, new.name, new.artist); END",
+]
+
+UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+TERM_PATTERN = re.compile(r'(?:(name|artist):)?("[^"]*"|\S+)')
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection, rebuild=True):
+    with using.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(REBUILD_SQL)
+
+
+def uninstall(using=connection):
+    with using.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def parse_query(query):
+    """Split a search box query into (field, text, prefix) terms.
+
+    ``artist:queen`` scopes a term to one field, ``"we will"`` keeps a phrase
+    together and a trailing ``*`` asks for a prefix match. The last bare term
+    is always matched as a prefix so that results follow the user's typing.
+    """
+    terms = []
+    for field, text in TERM_PATTERN.findall(query):
+        prefix = text.endswith('*')
+        text = text.strip('"*').strip()
+        if text:
+            terms.append([field or None, text, prefix])
+    if terms and not terms[-1][1].count(' '):
+        terms[-1][2] = True
+    return [tuple(term) for term in terms]
+
+
+def match_expression(terms):
+    parts = []
+    for field, text, prefix in terms:
+        part = '"' + text.replace('"', '""') + '"'
+        if prefix:
+            part += '*'
+        if field:
+            part = f'{field} : {part}'
+        parts.append(part)
+    return ' AND '.join(parts)
+
+
+def search_songs(queryset, query, ranked=True):
+    terms = parse_query(query)
+    if not terms:
+        return queryset.none()
+
+    if not is_supported():
+        return fallback_search(queryset, terms)
+
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {SONG_TABLE}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match_expression(terms)],
+    )
+    if ranked:
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS)
+        queryset = queryset.order_by().extra(
+            select={'rank': f'bm25({FTS_TABLE}, {weights})'},
+            order_by=['rank', 'id'],
+        )
+    return queryset
+
+
+def fallback_search(queryset, terms):
+    for field, text, prefix in terms:
+        fields = (field,) if field else SEARCH_FIELDS
+        condition = Q()
+        for name in fields:
+            condition |= Q(**{f'{name}__icontains': text})
+        queryset = queryset.filter(condition)
+    return queryset
@@ -0,0 +1,137 @@
+import random
+from django.db import connection, transaction
+from django.utils import timezone
+from .ingest import batched
+from .models import Song, Playlist, PlaylistSong
+from . import aggregates, positions, search, snapshots
+
+BATCH_SIZE = 5000
+
+SCALES = {
+    'small': {'songs': 10000, 'playlists': 1000, 'tracks': 20, 'large_playlist_tracks': 5000},
+    'medium': {'songs': 200000, 'playlists': 20000, 'tracks': 30, 'large_playlist_tracks': 50000},
+    'large': {'songs': 2000000, 'playlists': 200000, 'tracks': 30, 'large_playlist_tracks': 50000},
+}
+
+ADJECTIVES = (
+    'Blue', 'Broken', 'Burning', 'Crystal', 'Dancing', 'Distant', 'Electric', 'Empty', 'Endless', 'Fading',
+    'Falling', 'Golden', 'Hidden', 'Hollow', 'Lonely', 'Lost', 'Midnight', 'Neon', 'Paper', 'Quiet',
+    'Restless', 'Rising', 'Royal', 'Secret', 'Silent', 'Silver', 'Sleepless', 'Summer', 'Sweet', 'Velvet',
+    'Wild', 'Winter',
+)
+NOUNS = (
+    'Avenue', 'Balloon', 'Bridge', 'Candle', 'City', 'Dream', 'Echo', 'Fire', 'Garden', 'Heart',
+    'Highway', 'Horizon', 'Island', 'Letter', 'Light', 'Memory', 'Mirror', 'Moon', 'Ocean', 'Radio',
+    'River', 'Road', 'Shadow', 'Sky', 'Song', 'Star', 'Storm', 'Street', 'Sun', 'Thunder',
+    'Train', 'Window',
+)
+FIRST_NAMES = (
+    'Alex', 'Ana', 'Ben', 'Carla', 'Dev', 'Elena', 'Finn', 'Grace', 'Hiro', 'Ines',
+    'Jon', 'Kira', 'Leo', 'Maya', 'Nico', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam',
+)
+LAST_NAMES = (
+    'Adams', 'Bauer', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jensen',
+    'Kowalski', 'Lopez', 'Moreau', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber',
+)
+BANDS = ('The {} {}s', '{} {}', '{} & the {}s')
+
+
+def scale(name, **overrides):
+    options = dict(SCALES[name])
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def artist_names(rng, count):
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            names.append(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}')
+        else:
+            names.append(rng.choice(BANDS).format(rng.choice(ADJECTIVES), rng.choice(NOUNS)))
+    return names
+
+
+def generate_songs(count, seed):
+    # Names carry their index so that (name, artist) is always unique.
+    rng = random.Random(f'{seed}:songs')
+    artists = artist_names(rng, max(count // 12, 1))
+    for i in range(count):
+        yield (i + 1, f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}', rng.choice(artists), rng.randint(1950, 2024))
+
+
+def generate_playlists(count, seed):
+    rng = random.Random(f'{seed}:playlists')
+    for i in range(count):
+        yield (i + 1, f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} Mix {i + 1}')
+
+
+def generate_tracks(playlists, songs, tracks, large_playlist_tracks, seed):
+    """Yield playlist songs for playlists 1 to ``playlists``. The first one
+    gets ``large_playlist_tracks`` songs, the others 1 to ``2 * tracks - 1``.
+    """
+    rng = random.Random(f'{seed}:tracks')
+    for playlist_id in range(1, playlists + 1):
+        size = large_playlist_tracks if playlist_id == 1 else rng.randint(1, max(2 * tracks - 1, 1))
+        picks = rng.sample(range(1, songs + 1), min(size, songs))
+        for index, song_id in enumerate(picks):
+            yield (playlist_id, song_id, positions.key_for_index(index))
+
+
+def insert(model, fields, rows, batch_size):
+    # Plain executemany() rather than bulk_create(): building and
+    # preparing millions of model instances costs several times more than
+    # the inserts themselves.
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+
+    count = 0
+    for batch in batched(rows, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def seed_catalog(songs, playlists, tracks, large_playlist_tracks, seed=0, batch_size=BATCH_SIZE, log=None):
+    """Fill an empty catalog with a deterministic synthetic dataset.
+
+    The same arguments always produce the same rows, IDs included. Returns
+    the number of songs, playlists and playlist songs created.
+    """
+    log = log or (lambda message: None)
+    fts = search.is_supported()
+    if fts:
+        # Building the search index once at the end is much faster than
+        # maintaining it row by row through the triggers.
+        search.uninstall()
+
+    try:
+        song_count = insert(Song, ('id', 'name', 'artist', 'release_year'), generate_songs(songs, seed), batch_size)
+        log(f"Created {song_count} songs.")
+
+        modified_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = (playlist + (0, modified_at, 1, 0) for playlist in generate_playlists(playlists, seed))
+        playlist_count = insert(Playlist, ('id', 'name', 'track_count', 'modified_at', 'version', 'key_generation'), rows, batch_size)
+        log(f"Created {playlist_count} playlists.")
+
+        track_count = 0
+        if songs:
+            rows = generate_tracks(playlists, songs, tracks, large_playlist_tracks, seed)
+            track_count = insert(PlaylistSong, ('playlist', 'song', 'position'), rows, batch_size)
+        log(f"Created {track_count} playlist songs.")
+
+        aggregates.recompute()
+        log("Counted playlist tracks.")
+
+        snapshotted = snapshots.rebuild()
+        log(f"Snapshotted {len(snapshotted)} playlists.")
+    finally:
+        if fts:
+            search.install()
+            log("Rebuilt the search index.")
+
+    aggregates.touch_catalog('songs', 'playlists')
+    return {'songs': song_count, 'playlists': playlist_count, 'playlist_songs': track_count}
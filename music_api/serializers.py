@@ -3,6 +3,13 @@ from django.utils import timezone
 from .models import Song
 from .models import Playlist
 from .models import PlaylistSong
+from .models import Job
+
+def check_release_year(release_year):
+    current_year = timezone.now().year
+    if release_year < 1900 or release_year > current_year:
+        raise serializers.ValidationError("Invalid release year.")
+
 
 class SongSerializer(serializers.ModelSerializer):
     def validate_data(self, data):
@@ -10,9 +17,7 @@ class SongSerializer(serializers.ModelSerializer):
         artist = data.get('artist')
         release_year = data.get('release_year')
 
-        current_year = timezone.now().year
-        if release_year < 1900 or release_year > current_year:
-            raise serializers.ValidationError("Invalid release year.")
+        check_release_year(release_year)
 
         existing_songs = Song.objects.filter(name=name, artist=artist)
         if existing_songs.exists():
@@ -23,13 +28,33 @@ class SongSerializer(serializers.ModelSerializer):
     class Meta:
         model = Song
         fields = ['id', 'name', 'artist', 'release_year']
+        # Duplicates are rejected by the unique constraint on insert rather
+        # than by a separate lookup that can race with other writers.
+        validators = []
 
 class PlaylistSerializer(serializers.ModelSerializer):
     class Meta:
         model = Playlist
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'track_count', 'modified_at', 'version']
+        read_only_fields = ['track_count', 'modified_at', 'version']
+        # The views report duplicate names in their own words, and the
+        # unique constraint catches the ones that race past that check.
+        extra_kwargs = {'name': {'validators': []}}
+
+    def update(self, instance, validated_data):
+        # Save only the edited fields, so a rename cannot write back stale
+        # aggregates over a concurrent change to the playlist's songs.
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 class PlaylistSongSerializer(serializers.ModelSerializer):
     class Meta:
         model = PlaylistSong
         fields = ['playlist', 'song', 'position']
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'progress', 'total', 'result', 'error', 'created_at', 'started_at', 'finished_at']
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Song, Playlist, PlaylistSong
+from . import aggregates, database, fuzzy, jobs
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Playlist)
+def index_name(sender, instance, **kwargs):
+    fuzzy.index_for(sender).add(instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Playlist)
+def unindex_name(sender, instance, **kwargs):
+    fuzzy.index_for(sender).discard(instance.pk)
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+def bump_songs_version(sender, instance, **kwargs):
+    aggregates.touch_catalog('songs')
+
+
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+def bump_playlists_version(sender, instance, **kwargs):
+    aggregates.touch_catalog('playlists')
+
+
+@receiver(pre_delete, sender=Song)
+def untrack_song(sender, instance, **kwargs):
+    # Deleting a song cascades to its playlist songs, which bypasses the
+    # services that keep the playlist aggregates current.
+    playlist_ids = list(PlaylistSong.objects.filter(song=instance).values_list('playlist_id', flat=True))
+    aggregates.touch(*playlist_ids, tracks=-1)
+    for playlist_id in playlist_ids:
+        jobs.refresh_snapshot(playlist_id)
+
+
+@receiver(request_started, dispatch_uid='music_api_warm_fuzzy_indexes')
+def warm_fuzzy_indexes(sender, **kwargs):
+    request_started.disconnect(dispatch_uid='music_api_warm_fuzzy_indexes')
+    if getattr(settings, 'MUSIC_API_FUZZY_PRELOAD', True):
+        fuzzy.warm([Song, Playlist])
+
+
+@receiver(connection_created, dispatch_uid='music_api_apply_pragmas')
+def apply_pragmas(sender, connection, **kwargs):
+    database.apply_pragmas(connection)
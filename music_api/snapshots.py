@@ -0,0 +1,236 @@
+import sys
+from array import array
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import BinaryField, Q
+from django.db.models.functions import Length, Substr
+from .models import Playlist, PlaylistSnapshot, PlaylistSong
+from . import pagination
+
+ITEM_SIZE = 8
+
+
+def min_tracks():
+    """Playlists with at least this many tracks get a snapshot. None turns
+    snapshots off."""
+    return getattr(settings, 'MUSIC_API_SNAPSHOT_MIN_TRACKS', None)
+
+
+def pack(song_ids):
+    song_ids = array('q', song_ids)
+    if sys.byteorder == 'big':
+        song_ids.byteswap()
+    return song_ids.tobytes()
+
+
+def unpack(blob):
+    song_ids = array('q')
+    song_ids.frombytes(bytes(blob))
+    if sys.byteorder == 'big':
+        song_ids.byteswap()
+    return song_ids
+
+
+def ordered_song_ids(playlist_id):
+    return PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position').values_list('song_id', flat=True)
+
+
+def save(playlist_id, song_ids, version):
+    values = {'song_ids': pack(song_ids), 'version': version}
+    if not PlaylistSnapshot.objects.filter(pk=playlist_id).update(**values):
+        PlaylistSnapshot.objects.create(playlist_id=playlist_id, **values)
+
+
+def create(playlists, song_ids_per_playlist):
+    """Snapshot new playlists, given the song IDs of each in order."""
+    threshold = min_tracks()
+    if threshold is None:
+        return
+    PlaylistSnapshot.objects.bulk_create([
+        PlaylistSnapshot(playlist=playlist, song_ids=pack(song_ids), version=playlist.version)
+        for playlist, song_ids in zip(playlists, song_ids_per_playlist)
+        if len(song_ids) >= threshold
+    ])
+
+
+def build(playlist_id):
+    """Snapshot the playlist's current track order and return its length,
+    or None if the playlist does not exist."""
+    with transaction.atomic():
+        version = Playlist.objects.filter(pk=playlist_id).values_list('version', flat=True).first()
+        if version is None:
+            return None
+        song_ids = list(ordered_song_ids(playlist_id))
+        save(playlist_id, song_ids, version)
+    return len(song_ids)
+
+
+def rebuild(playlist_ids=None):
+    """Snapshot every playlist big enough to have one and drop the other
+    snapshots. Returns the IDs of the playlists snapshotted."""
+    threshold = min_tracks()
+    playlists = Playlist.objects.all()
+    if playlist_ids:
+        playlists = playlists.filter(pk__in=playlist_ids)
+
+    snapshots = PlaylistSnapshot.objects.filter(playlist__in=playlists)
+    if threshold is not None:
+        snapshots = snapshots.filter(playlist__track_count__lt=threshold)
+    snapshots.delete()
+    if threshold is None:
+        return []
+
+    built = list(playlists.filter(track_count__gte=threshold).order_by('id').values_list('id', flat=True))
+    for playlist_id in built:
+        build(playlist_id)
+    return built
+
+
+def tracked(playlist_id):
+    """Return whether the playlist has a snapshot or is big enough to have
+    one."""
+    threshold = min_tracks()
+    if threshold is None:
+        return False
+    return Playlist.objects.filter(Q(snapshot__isnull=False) | Q(track_count__gte=threshold), pk=playlist_id).exists()
+
+
+def refresh(playlist_id):
+    """Snapshot the playlist again after changes that left its snapshot out
+    of date, and return its length, or None if nothing was saved.
+
+    The track order is read before taking the write lock, in one statement
+    along with the version it belongs to. It is only saved if the playlist
+    is still at that version; a change made in between queues another
+    refresh.
+    """
+    rows = list(PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position').values_list('song_id', 'playlist__version'))
+    threshold = min_tracks()
+    with transaction.atomic():
+        state = Playlist.objects.filter(pk=playlist_id).values_list('track_count', 'version').first()
+        if state is None:
+            return None
+        track_count, version = state
+        if threshold is None or track_count < threshold:
+            PlaylistSnapshot.objects.filter(pk=playlist_id).delete()
+            return None
+        # An empty playlist has no row to carry the version; it is empty now
+        # whatever version it was read at.
+        if len(rows) != track_count or (rows and rows[0][1] != version):
+            return None
+        save(playlist_id, [song_id for song_id, _ in rows], version)
+    return len(rows)
+
+
+def update(playlist_id, change):
+    """Apply ``change`` to the playlist's snapshot. Used by the batch edits;
+    single-track changes queue a refresh instead, as rewriting the snapshot
+    would cost more than the change itself.
+
+    Call it inside the transaction that changes the playlist's songs, after
+    the change and before aggregates.touch(), which moves the playlist to
+    the version the snapshot is saved under. ``change`` takes the list of
+    song IDs in track order and returns the new one. A missing or stale
+    snapshot is rebuilt from the rows instead, if the playlist is big
+    enough to have one.
+    """
+    threshold = min_tracks()
+    if threshold is None:
+        return
+    state = Playlist.objects.filter(pk=playlist_id).values_list('track_count', 'version', 'snapshot__version', 'snapshot__song_ids').first()
+    if state is None:
+        return
+
+    track_count, version, snapshot_version, blob = state
+    if snapshot_version == version:
+        song_ids = change(list(unpack(blob)))
+    elif track_count >= threshold:
+        song_ids = list(ordered_song_ids(playlist_id))
+    else:
+        return
+
+    if len(song_ids) >= threshold:
+        save(playlist_id, song_ids, version + 1)
+    else:
+        PlaylistSnapshot.objects.filter(pk=playlist_id).delete()
+
+
+def inserted(song_ids, index):
+    return lambda existing: existing[:index] + list(song_ids) + existing[index:]
+
+
+def page_state(playlist_id, offset, limit):
+    """Query the playlist's track count and version along with tracks
+    ``offset + 1`` to ``offset + limit`` of its snapshot.
+
+    Only the bytes of the page are read from the snapshot, so deep pages
+    cost the same as the first one.
+    """
+    return Playlist.objects.filter(pk=playlist_id).annotate(
+        snapshot_size=Length('snapshot__song_ids'),
+        snapshot_page=Substr('snapshot__song_ids', offset * ITEM_SIZE + 1, limit * ITEM_SIZE, output_field=BinaryField()),
+    ).values_list('track_count', 'version', 'snapshot__version', 'snapshot_size', 'snapshot_page')
+
+
+def page_song_ids(state):
+    """Return the song IDs from a page_state() row, or None if the snapshot
+    is missing or stale."""
+    track_count, version, snapshot_version, size, page = state
+    if snapshot_version != version or size != track_count * ITEM_SIZE:
+        return None
+    return unpack(page)
+
+
+def page_rows(playlist_songs, song_ids):
+    return playlist_songs.filter(song_id__in=list(song_ids)).order_by()
+
+
+def order_rows(rows, song_ids):
+    """Put the rows fetched by page_rows() in snapshot order. Returns None
+    if they disagree with the snapshot, so the caller can fall back to
+    paging through the rows themselves."""
+    by_song = {row['song_id']: row for row in rows}
+    ordered = [by_song.get(song_id) for song_id in song_ids]
+    if None in ordered:
+        return None
+    if any(before['position'] >= after['position'] for before, after in zip(ordered, ordered[1:])):
+        return None
+    return ordered
+
+
+def count_page(request, queryset, page_size, count):
+    paginator = Paginator(queryset, page_size)
+    paginator.count = count
+    return paginator.get_page(request.GET.get('page', 1))
+
+
+def number_page(request, playlist_songs, playlist_id, base_url, page_size):
+    """Like pagination.number_page(), but served from the playlist's
+    snapshot when it has a valid one. Returns None if the playlist does not
+    exist.
+    """
+    number = pagination.requested_page(request)
+    state = page_state(playlist_id, (number - 1) * page_size, page_size).first()
+    if state is None:
+        return None
+
+    page_obj = count_page(request, playlist_songs, page_size, state[0])
+    object_list = None
+    song_ids = page_song_ids(state)
+    if song_ids is not None and page_obj.number == number:
+        object_list = order_rows(page_rows(playlist_songs, song_ids), song_ids)
+    if object_list is None:
+        object_list = list(page_obj.object_list)
+    return pagination.number_result(request, base_url, page_size, page_obj, object_list)
+
+
+def check(playlist_id):
+    """Return whether the playlist's snapshot matches its rows, or None if
+    it has no snapshot."""
+    with transaction.atomic():
+        state = PlaylistSnapshot.objects.filter(pk=playlist_id).values_list('version', 'playlist__version', 'song_ids').first()
+        if state is None:
+            return None
+        version, playlist_version, blob = state
+        return version == playlist_version and list(unpack(blob)) == list(ordered_song_ids(playlist_id))
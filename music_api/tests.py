@@ -1,3 +1,1151 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router, transaction
+from django.db.models import Count
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .exceptions import ServiceError
+from .models import Song, Playlist, PlaylistSong, Job
+from .serializers import SongSerializer, PlaylistSerializer
+from . import aggregates, benchmarks, database, export, fuzzy, jobs, membership, pagination, positions, renderers, response_cache, rows, search, seed, snapshots, views
 
-# Create your tests here.
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class ListPlaylistSongsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.songs = songs = Song.objects.bulk_create([Song(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(60)])
+        cls.playlist = Playlist.objects.create(name="Playlist1")
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=cls.playlist, song=song, position=positions.key_for_index(index))
+            for index, song in enumerate(reversed(songs))
+        ])
+        aggregates.recompute()
+        cls.url = reverse('list_playlist_songs', args=[cls.playlist.pk])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # The ETag lookup, the stored track count and the page.
+        for page_size in (5, 50):
+            with self.assertNumQueries(3):
+                response = self.client.get(self.url, {'page_size': page_size})
+            self.assertEqual(len(response.json()['results']), page_size)
+
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'cursor': '', 'page_size': 50})
+
+    def test_results_match_serializer_shape(self):
+        response = self.client.get(self.url, {'page': 2})
+        data = response.json()
+        self.assertEqual(data['count'], 60)
+        song = self.songs[49]
+        self.assertEqual(data['results'][0], {'id': song.pk, 'name': song.name, 'artist': song.artist, 'release_year': song.release_year, 'position': 11})
+
+    def test_missing_playlist(self):
+        url = reverse('list_playlist_songs', args=[self.playlist.pk + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {'cursor': ''}).status_code, 404)
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([(song['id'], song['position']) for song in data['results']])
+            url = data[direction]
+        return pages
+
+    def test_page_links(self):
+        data = self.client.get(self.url, {'page': 2, 'page_size': 20}).json()
+        self.assertEqual(data['next'], f'http://testserver{self.url}?page=3&page_size=20')
+        self.assertEqual(data['previous'], f'http://testserver{self.url}?page=1&page_size=20')
+        self.assertIsNone(self.client.get(self.url, {'page': 3, 'page_size': 20}).json()['next'])
+        self.assertEqual(self.client.get(self.url, {'page': 9}).json()['results'][0]['position'], 51)
+
+    def test_cursor_links_walk_both_ways(self):
+        expected = [(song.pk, position) for position, song in enumerate(reversed(self.songs), start=1)]
+        forward = self.walk(f'{self.url}?cursor=&page_size=25', 'next')
+        self.assertEqual([len(page) for page in forward], [25, 25, 10])
+        self.assertEqual(sum(forward, []), expected)
+
+        last = self.client.get(f'{self.url}?cursor=&page_size=25').json()
+        last = self.client.get(self.client.get(last['next']).json()['next']).json()
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(backward, forward[:2][::-1])
+
+    def test_cursor_count_is_optional(self):
+        self.assertIsNone(self.client.get(self.url, {'cursor': ''}).json()['count'])
+        self.assertEqual(self.client.get(self.url, {'cursor': '', 'count': 'true'}).json()['count'], 60)
+        self.assertEqual(self.client.get(reverse('songs'), {'cursor': '', 'count': '1'}).json()['count'], 60)
+
+    def test_invalid_cursors_and_page_sizes(self):
+        tampered = base64.urlsafe_b64encode(b'{"k":"1024","p":1,"r":0}').decode()
+        for params in ({'cursor': 'not a cursor'}, {'cursor': tampered}, {'cursor': 'e30'}, {'page_size': 0}, {'page_size': 'ten'}):
+            for url in (self.url, reverse('songs')):
+                self.assertEqual(self.client.get(url, params).status_code, 400, (url, params))
+
+    def test_page_size_is_capped(self):
+        Song.objects.bulk_create([Song(name=f"Extra{i}", artist="Artist", release_year=2000) for i in range(50)])
+        data = self.client.get(reverse('songs'), {'page_size': 1000}).json()
+        self.assertEqual(len(data['results']), pagination.MAX_PAGE_SIZE)
+        self.assertTrue(data['next'].endswith('?page=2&page_size=100'))
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class SongSearchTests(TestCase):
+    def search(self, query):
+        response = self.client.get(reverse('songs'), {'q': query})
+        return [song['name'] for song in response.json()['results']]
+
+    def test_ranked_prefix_and_field_search(self):
+        Song.objects.create(name="Bohemian Rhapsody", artist="Queen", release_year=1975)
+        Song.objects.create(name="Queen of the Night", artist="Whitney Houston", release_year=1992)
+        Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+
+        self.assertEqual(self.search("queen"), ["Queen of the Night", "Bohemian Rhapsody"])
+        self.assertEqual(self.search("artist:queen"), ["Bohemian Rhapsody"])
+        self.assertEqual(self.search("beat"), ["Yesterday"])
+
+    def test_index_follows_writes(self):
+        song = Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+        song.name = "Let It Be"
+        song.save()
+        self.assertEqual(self.search("yesterday"), [])
+        self.assertEqual(self.search("let it"), ["Let It Be"])
+
+        song.delete()
+        self.assertEqual(self.search("let it"), [])
+
+
+class TrigramIndexTests(TestCase):
+    def test_misspelled_names_match(self):
+        Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+        Song.objects.create(name="Bohemian Rhapsody", artist="Queen", release_year=1975)
+        index = fuzzy.TrigramIndex(Song)
+        index.build()
+
+        matches = index.search("yesturday")
+        self.assertEqual([Song.objects.get(pk=pk).name for pk, _ in matches], ["Yesterday"])
+
+    def test_updates_after_build(self):
+        song = Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+        index = fuzzy.TrigramIndex(Song)
+        index.build()
+
+        index.add(song.pk, "Let It Be")
+        self.assertEqual(index.search("yesterday"), [])
+        self.assertEqual([pk for pk, _ in index.search("let it bee")], [song.pk])
+
+        index.discard(song.pk)
+        self.assertEqual(index.search("let it be"), [])
+
+    def test_renames_keep_postings_sorted(self):
+        songs = [Song.objects.create(name=name, artist="Artist", release_year=2000) for name in ("Help", "Let It Be", "Yesterday")]
+        index = fuzzy.TrigramIndex(Song)
+        index.build()
+
+        index.add(songs[0].pk, "Let It Go")
+        index.add(songs[1].pk, "Let Me Be")
+        index.add(songs[1].pk, "Let It Be")
+        for pks in index.postings.values():
+            self.assertEqual(list(pks), sorted(set(pks)))
+        self.assertEqual(list(index.postings['let']), [songs[0].pk, songs[1].pk])
+
+    def test_common_trigrams_are_looked_up_past_the_scan_limit(self):
+        for name in ("Midnight", "Fading Light", "Night Drive", "Dinner Party", "Mountain"):
+            Song.objects.create(name=name, artist="Artist", release_year=2000)
+        index = fuzzy.TrigramIndex(Song)
+        index.build()
+
+        matches = index.search("mdinight", max_postings=1)
+        self.assertEqual(matches[0], index.search("mdinight")[0])
+        self.assertEqual(index.names[matches[0][0]], "Midnight")
+
+    def test_failed_build_wakes_waiting_searches(self):
+        song = Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+        index = fuzzy.TrigramIndex(Song)
+        index.building = True
+
+        def fail():
+            with index.lock:
+                index.building = False
+                index.error = RuntimeError("database table is locked")
+                index.finished.notify_all()
+
+        threading.Timer(0.05, fail).start()
+        self.assertEqual([pk for pk, _ in index.search("yesturday")], [song.pk])
+
+    def test_search_gives_up_on_a_slow_build(self):
+        index = fuzzy.TrigramIndex(Song)
+        index.building = True
+        with self.assertRaises(ServiceError) as raised:
+            index.ensure_built(timeout=0.01)
+        self.assertEqual(raised.exception.status_code, 503)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(3)]
+            self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in songs]}, content_type='application/json')
+        self.songs = songs
+        self.playlist = Playlist.objects.get(name="Playlist1")
+        self.url = reverse('list_playlist_songs', args=[self.playlist.pk])
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_misses_read_the_state_once(self):
+        # The state row, the stored track count and the page.
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        response_cache.get_cache().clear()
+        with override_settings(ROOT_URLCONF=benchmarks.api_urlconf(True)), self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_pages_are_keyed_by_database_versions(self):
+        # A write made by another worker only moves the versions stored in
+        # the database, which is all this one gets to see.
+        self.client.get(self.url)
+        PlaylistSong.objects.filter(playlist=self.playlist, song=self.songs[0]).delete()
+        aggregates.touch(self.playlist.pk, tracks=-1)
+        self.assertEqual(len(self.client.get(self.url).json()['results']), 2)
+
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[2].pk]), {'position': 1}, content_type='application/json')
+        self.assertEqual(self.client.get(self.url).json()['results'][0]['id'], self.songs[2].pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.songs[2].name = "Renamed"
+            self.songs[2].save()
+        self.assertEqual(self.client.get(self.url).json()['results'][0]['name'], "Renamed")
+
+    def test_membership_changes_invalidate_playlist_lists(self):
+        self.assertEqual(self.client.get(reverse('playlists')).json()['results'][0]['track_count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[0].pk]))
+        self.assertEqual(self.client.get(reverse('playlists')).json()['results'][0]['track_count'], 2)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        songs = Song.objects.bulk_create([Song(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(15)])
+        cls.playlist = Playlist.objects.create(name="Playlist1")
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=cls.playlist, song=song, position=positions.key_for_index(index))
+            for index, song in enumerate(songs)
+        ])
+
+    async def test_async_views_match_sync_views(self):
+        paths = [
+            '/api/songs?page=2',
+            '/api/songs?q=Song1',
+            '/api/playlists',
+            f'/api/playlists/{self.playlist.pk}/songs?cursor=',
+            f'/api/playlists/{self.playlist.pk + 1}/songs',
+        ]
+        accepts = ['*/*', renderers.COLUMNS_MEDIA_TYPE, 'application/xml']
+        responses = {}
+        for use_async in (False, True):
+            with override_settings(ROOT_URLCONF=benchmarks.api_urlconf(use_async)):
+                responses[use_async] = [
+                    await self.async_client.get(path, headers={'Accept': accept})
+                    for path in paths for accept in accepts
+                ]
+
+        for sync_response, async_response in zip(responses[False], responses[True]):
+            self.assertEqual(sync_response.status_code, async_response.status_code)
+            self.assertEqual(sync_response.content, async_response.content)
+            self.assertEqual(sync_response['Content-Type'], async_response['Content-Type'])
+            self.assertEqual(sync_response.get('ETag'), async_response.get('ETag'))
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class BenchmarkSuiteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = seed.seed_catalog(songs=300, playlists=20, tracks=5, large_playlist_tracks=120, seed=7)
+
+    def test_seed_is_deterministic(self):
+        self.assertEqual(self.counts['songs'], 300)
+        self.assertEqual(PlaylistSong.objects.filter(playlist_id=1).count(), 120)
+        self.assertEqual(self.counts['playlist_songs'], PlaylistSong.objects.count())
+        self.assertEqual(aggregates.drift(), [])
+        self.assertEqual(list(seed.generate_tracks(20, 300, 5, 120, 7)), list(seed.generate_tracks(20, 300, 5, 120, 7)))
+        self.assertEqual(list(Song.objects.order_by('id').values_list('id', 'name', 'artist', 'release_year')), list(seed.generate_songs(300, 7)))
+
+        word = Song.objects.get(pk=1).name.split()[0]
+        self.assertTrue(self.client.get(reverse('songs'), {'q': word}).json()['results'])
+
+    def test_scenarios_cover_every_route(self):
+        catalog = benchmarks.Catalog(run_id=1)
+        scenarios = benchmarks.scenarios(catalog)
+        self.assertEqual({scenario.route for scenario in scenarios}, set(benchmarks.route_names()))
+
+        for scenario in scenarios:
+            method, url, body = scenario.build(1)
+            response = self.client.generic(method, url, **benchmarks.request_kwargs(body))
+            benchmarks.read_body(response)
+            self.assertLess(response.status_code, 400, scenario.name)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_METRICS_SAMPLE_RATE=1.0)
+class MetricsTests(TestCase):
+    def test_server_timing_and_histograms(self):
+        playlist = Playlist.objects.create(name="Playlist1")
+        song = Song.objects.create(name="Song1", artist="Artist", release_year=2000)
+        PlaylistSong.objects.create(playlist=playlist, song=song, position=positions.key_for_index(0))
+        aggregates.recompute()
+        response = self.client.get(reverse('list_playlist_songs', args=[playlist.pk]))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('music_api_request_duration_seconds_count{route="api/playlists/<int:playlist_id>/songs",method="GET"}', text)
+        self.assertIn('music_api_request_queries_bucket{route="api/playlists/<int:playlist_id>/songs",method="GET",le="3"}', text)
+
+    @override_settings(MUSIC_API_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        response = self.client.get(reverse('songs'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertIn('music_api_responses_total{route="api/songs",method="GET",status="200"}', self.client.get(reverse('metrics')).content.decode())
+
+
+class DatabaseTests(TransactionTestCase):
+    def test_transactions_take_the_write_lock_up_front(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Song.objects.exists()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        values = database.pragma_values()
+        self.assertEqual((values['synchronous'], values['cache_size'], values['temp_store']), (1, -65536, 2))
+
+        # The test database lives in memory, which has no WAL or mmap.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_connection = connections['default'].__class__({**connection.settings_dict, 'NAME': os.path.join(directory.name, 'db.sqlite3')}, 'file')
+        self.addCleanup(file_connection.close)
+        with file_connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA mmap_size')
+            self.assertEqual(cursor.fetchone()[0], 256 * 1024 * 1024)
+
+    def route(self, method):
+        routed = []
+        middleware = database.read_routing_middleware(lambda request: routed.append(router.db_for_read(Song)))
+        middleware(RequestFactory().generic(method, '/api/songs'))
+        return routed[0] or 'default'
+
+    def test_reads_of_safe_requests_go_to_the_replica(self):
+        self.assertEqual(self.route('GET'), 'default')
+
+        # Only the presence of the alias is checked, no connection is made.
+        connections.settings[database.READ_ALIAS] = dict(connection.settings_dict)
+        self.addCleanup(connections.settings.pop, database.READ_ALIAS)
+        self.assertEqual([self.route(method) for method in ('GET', 'HEAD', 'OPTIONS')], [database.READ_ALIAS] * 3)
+        self.assertEqual([self.route(method) for method in ('POST', 'PUT', 'DELETE')], ['default'] * 3)
+        self.assertEqual(router.db_for_read(Song), 'default')
+        self.assertEqual(router.db_for_write(Song), 'default')
+
+
+class QueryPlanTests(TestCase):
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        self.assertNotRegex(plan, re.compile(r'SCAN \w+$', re.MULTILINE), plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        if index:
+            self.assertIn(index, plan)
+
+    def test_playlist_song_queries(self):
+        playlist_songs = PlaylistSong.objects.filter(playlist_id=1)
+        self.assertUsesIndex(playlist_songs.values(*views.PLAYLIST_SONG_FIELDS)[10:20], 'playlistsong_playlist_position')
+        self.assertUsesIndex(playlist_songs.filter(position__gt=1024).values(*views.PLAYLIST_SONG_FIELDS)[:10], 'playlistsong_playlist_position')
+        self.assertUsesIndex(playlist_songs.filter(position__gte=1024).order_by(), 'playlistsong_playlist_position')
+        self.assertUsesIndex(views.track_count_query(1), 'USING INTEGER PRIMARY KEY')
+        self.assertUsesIndex(playlist_songs.filter(song_id=2))
+        self.assertUsesIndex(PlaylistSong.objects.filter(song_id=2).order_by())
+
+    def test_song_playlist_queries(self):
+        self.assertUsesIndex(membership.playlists_of(2)[:10], 'COVERING INDEX playlistsong_song_playlist (song_id=?)')
+        self.assertUsesIndex(membership.playlists_of(2).filter(playlist__id__gt=5)[:10], 'playlistsong_song_playlist (song_id=? AND playlist_id>?)')
+        totals = PlaylistSong.objects.filter(song_id__in=[1, 2]).values('song_id').annotate(total=Count('*'))
+        self.assertUsesIndex(totals, 'COVERING INDEX playlistsong_song_playlist')
+
+    def test_duplicate_checks(self):
+        self.assertUsesIndex(Song.objects.filter(name="Song1", artist="Artist"))
+        self.assertUsesIndex(Playlist.objects.filter(name="Playlist1"))
+
+    def test_song_queries(self):
+        self.assertUsesIndex(Song.objects.order_by('id').filter(id__gt=10)[:10], 'INTEGER PRIMARY KEY')
+
+        # Matches come from the full-text index and are then sorted, which
+        # only touches the matching rows.
+        plan = search.search_songs(Song.objects.order_by('id'), "river", ranked=False)[:10].explain()
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertIn('SEARCH music_api_song USING INTEGER PRIMARY KEY', plan)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class PlaylistAggregateTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(4)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+
+    def assertAggregates(self, track_count, version):
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.track_count, self.playlist.version), (track_count, version))
+        self.assertEqual(aggregates.drift(), [])
+
+    def test_membership_changes_maintain_aggregates(self):
+        self.assertAggregates(4, 1)
+        modified_at = self.playlist.modified_at
+
+        # The lookup, the neighbour keys, the move, the snapshot check and
+        # the two version bumps in a savepoint; no COUNT.
+        with self.assertNumQueries(8):
+            self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[3].pk]), {'position': 1}, content_type='application/json')
+        self.assertAggregates(4, 2)
+        self.assertGreater(self.playlist.modified_at, modified_at)
+
+        self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[0].pk]))
+        self.assertAggregates(3, 3)
+
+        self.songs[1].delete()
+        self.assertAggregates(2, 4)
+
+        self.client.put(reverse('edit_playlist', args=[self.playlist.pk]), {'name': "Renamed"}, content_type='application/json')
+        self.assertAggregates(2, 4)
+        self.assertGreater(self.playlist.modified_at, modified_at)
+
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('list_playlist_songs', args=[self.playlist.pk])).json()
+        self.assertEqual(data['count'], 2)
+
+    def test_recompute_fixes_drift(self):
+        Playlist.objects.update(track_count=9)
+        with self.assertRaises(CommandError):
+            call_command('recompute_playlist_aggregates', '--check', stdout=StringIO())
+
+        call_command('recompute_playlist_aggregates', stdout=StringIO())
+        self.assertAggregates(4, 2)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_CACHE_CONTROL='public, max-age=5')
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(3)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+        self.url = reverse('list_playlist_songs', args=[self.playlist.pk])
+
+    def revalidate(self, url, response, queries=1):
+        with self.assertNumQueries(queries):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in (reverse('songs'), reverse('playlists'), self.url):
+            response = self.client.get(url)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=5')
+            self.assertTrue(response.has_header('Last-Modified'))
+
+            not_modified = self.revalidate(url, response)
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        self.assertNotEqual(self.client.get(self.url, {'page_size': 1})['ETag'], response['ETag'])
+
+    def test_writes_change_the_etag(self):
+        response = self.client.get(self.url)
+        self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[2].pk]), {'position': 1}, content_type='application/json')
+        response = self.revalidate(self.url, response, queries=3)
+        self.assertEqual(response.status_code, 200)
+
+        self.songs[0].name = "Renamed"
+        self.songs[0].save()
+        self.assertEqual(self.revalidate(self.url, response, queries=3).status_code, 200)
+
+    @override_settings(MUSIC_API_RESPONSE_CACHE='music_api')
+    def test_cached_pages_keep_their_validators(self):
+        response_cache.get_cache().clear()
+        response = self.client.get(self.url)
+        self.assertEqual(self.revalidate(self.url, response, queries=1).status_code, 304)
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+
+    async def test_async_views_send_the_same_validators(self):
+        response = await self.async_client.get(self.url)
+        with override_settings(ROOT_URLCONF=benchmarks.api_urlconf(True)):
+            async_response = await self.async_client.get(f'/api/playlists/{self.playlist.pk}/songs')
+            not_modified = await self.async_client.get(f'/api/playlists/{self.playlist.pk}/songs', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(async_response['ETag'], response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_SNAPSHOT_MIN_TRACKS=5)
+class PlaylistSnapshotTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(10)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs[:8]]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+        self.url = reverse('list_playlist_songs', args=[self.playlist.pk])
+
+    def listed(self):
+        ids = []
+        for page in (1, 2, 3):
+            ids += [song['id'] for song in self.client.get(self.url, {'page': page, 'page_size': 3}).json()['results']]
+        return ids
+
+    def assertInSync(self):
+        self.assertTrue(snapshots.check(self.playlist.pk))
+        self.assertEqual(self.listed(), list(snapshots.ordered_song_ids(self.playlist.pk)))
+
+    def test_deep_pages_are_sliced_from_the_snapshot(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page': 3, 'page_size': 3})
+        self.assertEqual([song['position'] for song in response.json()['results']], [7, 8])
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+        self.assertInSync()
+
+    def refreshed(self):
+        # Single-track changes leave the snapshot to a background job.
+        self.assertFalse(snapshots.check(self.playlist.pk))
+        self.assertEqual(self.listed(), list(snapshots.ordered_song_ids(self.playlist.pk)))
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertFalse(Job.objects.exists())
+        self.assertInSync()
+
+    def test_mutations_keep_the_snapshot_in_sync(self):
+        self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[7].pk]), {'position': 2}, content_type='application/json')
+        self.refreshed()
+        positions.append(self.playlist.pk, self.songs[9].pk)
+        self.refreshed()
+        self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[0].pk]))
+        self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[2].pk]), {'position': 5}, content_type='application/json')
+        self.refreshed()
+        self.songs[1].delete()
+        self.refreshed()
+
+        for song in self.songs[2:5]:
+            self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, song.pk]))
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertIsNone(snapshots.check(self.playlist.pk))
+
+    @override_settings(MUSIC_API_SNAPSHOT_MIN_TRACKS=0)
+    def test_empty_playlists_get_an_empty_snapshot(self):
+        PlaylistSong.objects.filter(playlist=self.playlist).delete()
+        aggregates.touch(self.playlist.pk, tracks=-8)
+        self.assertEqual(snapshots.refresh(self.playlist.pk), 0)
+        self.assertTrue(snapshots.check(self.playlist.pk))
+        self.assertEqual(list(snapshots.ordered_song_ids(self.playlist.pk)), [])
+
+    def test_inconsistent_snapshots_are_not_served(self):
+        first, second = PlaylistSong.objects.filter(playlist=self.playlist).order_by('position')[:2]
+        PlaylistSong.objects.filter(pk=first.pk).update(position=second.position + 1)
+        self.assertEqual(self.listed()[:2], [self.songs[1].pk, self.songs[0].pk])
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_playlist_snapshots', '--check', stdout=StringIO())
+        call_command('rebuild_playlist_snapshots', stdout=StringIO())
+        self.assertInSync()
+
+
+class SongImportTests(TestCase):
+    def setUp(self):
+        Song.objects.create(name="Yesterday", artist="The Beatles", release_year=1965)
+
+    def post(self, body, content_type, query=''):
+        response = self.client.post(reverse('import_songs') + query, body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_csv_import_counts_inserted_skipped_and_rejected_rows(self):
+        body = "name,artist,release_year\nYesterday,The Beatles,1965\nHelp!,The Beatles,1965\nBad,The Beatles,1800\nLet It Be,The Beatles,1970\n"
+        reports = self.post(body, 'text/csv', '?batch_size=2')
+        self.assertEqual([(report['inserted'], report['skipped']) for report in reports[:-1]], [(1, 1), (1, 0)])
+        self.assertEqual(reports[1]['rejected'][0]['line'], 4)
+        self.assertEqual(reports[-1]['summary'], {'batches': 2, 'received': 4, 'inserted': 2, 'skipped': 1, 'rejected': 1})
+        self.assertEqual(Song.objects.count(), 3)
+
+    def test_ndjson_import_reports_rejected_lines(self):
+        body = '{"name": "Help!", "artist": "The Beatles", "release_year": 1965}\n\nnot json\n{"name": "", "artist": "The Beatles", "release_year": 1965}\n{"name": "Help!", "artist": "The Beatles", "release_year": 1965}\n'
+        reports = self.post(body, 'application/x-ndjson')
+        self.assertEqual([rejected['line'] for rejected in reports[0]['rejected']], [3, 4])
+        self.assertEqual(reports[-1]['summary'], {'batches': 1, 'received': 4, 'inserted': 1, 'skipped': 1, 'rejected': 2})
+
+    def test_csv_with_byte_order_mark(self):
+        body = "\ufeffname,artist,release_year\nHelp!,The Beatles,1965\n".encode()
+        reports = self.post(body, 'text/csv')
+        self.assertEqual(reports[-1]['summary'], {'batches': 1, 'received': 1, 'inserted': 1, 'skipped': 0, 'rejected': 0})
+
+    def test_ndjson_lines_that_are_not_utf8_are_rejected(self):
+        body = b'{"name": "Caf\xe9", "artist": "The Beatles", "release_year": 1965}\n{"name": "Help!", "artist": "The Beatles", "release_year": 1965}\n'
+        reports = self.post(body, 'application/x-ndjson')
+        self.assertEqual(reports[0]['rejected'], [{'line': 1, 'errors': ["Row is not valid UTF-8."]}])
+        self.assertEqual(reports[-1]['summary'], {'batches': 1, 'received': 2, 'inserted': 1, 'skipped': 0, 'rejected': 1})
+
+    def test_unsupported_content_type(self):
+        response = self.client.post(reverse('import_songs'), {'name': "Help!"}, content_type='application/json')
+        self.assertEqual(response.status_code, 415)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write("name,artist,release_year\nYesterday,The Beatles,1965\nHelp!,The Beatles,1965\nBad,The Beatles,\n")
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_songs', file.name, stdout=stdout, stderr=stderr)
+        self.assertIn("Imported 1 of 3 rows in 1 batches. Skipped 1 songs that already existed and rejected 1 rows.", stdout.getvalue())
+        self.assertEqual(json.loads(stderr.getvalue())['rejected'][0]['line'], 4)
+        self.assertTrue(Song.objects.filter(name="Help!").exists())
+
+        with self.assertRaises(CommandError):
+            call_command('import_songs', 'catalog.txt')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.songs = Song.objects.bulk_create([Song(name=f"Song, {i}", artist="Artist", release_year=2000 + i) for i in range(5)])
+        cls.playlist = Playlist.objects.create(name="Playlist1")
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=cls.playlist, song=song, position=positions.key_for_index(index))
+            for index, song in enumerate(reversed(cls.songs))
+        ])
+
+    def export(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_songs_in_id_order(self):
+        response, content = self.export('export_songs')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="songs.ndjson"')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows[0], {'id': self.songs[0].pk, 'name': "Song, 0", 'artist': "Artist", 'release_year': 2000})
+        self.assertEqual([row['id'] for row in rows], [song.pk for song in self.songs])
+
+        _, content = self.export('export_songs', since_id=self.songs[2].pk)
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [song.pk for song in self.songs[3:]])
+
+    def test_csv_playlist_songs_resume_with_their_positions(self):
+        response, content = self.export('export_playlist_songs', self.playlist.pk, output='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], list(export.PLAYLIST_SONG_FIELDS))
+        self.assertEqual(rows[1], [str(self.songs[4].pk), "Song, 4", "Artist", "2004", "1"])
+        self.assertEqual([row[0] for row in rows[1:]], [str(song.pk) for song in reversed(self.songs)])
+
+        _, content = self.export('export_playlist_songs', self.playlist.pk, output='csv', since_id=self.songs[3].pk)
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual([(row[0], row[-1]) for row in rows[1:]], [(str(song.pk), str(position)) for position, song in zip((3, 4, 5), reversed(self.songs[:3]))])
+
+    def test_invalid_exports(self):
+        url = reverse('export_playlist_songs', args=[self.playlist.pk])
+        self.assertEqual(self.client.get(url, {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since_id': self.songs[-1].pk + 1}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_playlist_songs', args=[self.playlist.pk + 1])).status_code, 404)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False) as file:
+            pass
+        self.addCleanup(os.remove, file.name)
+        call_command('export', 'playlist-songs', '--playlist', str(self.playlist.pk), '--since-id', str(self.songs[1].pk), '-o', file.name)
+        with open(file.name, encoding='utf-8') as exported:
+            rows = [json.loads(line) for line in exported]
+        self.assertEqual([(row['id'], row['position']) for row in rows], [(self.songs[0].pk, 5)])
+
+
+class PlaylistImportTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(3)]
+
+    def import_playlists(self, *entries):
+        return self.client.post(reverse('import_playlists'), {'playlists': list(entries)}, content_type='application/json')
+
+    def test_create_keeps_the_first_of_duplicate_ids(self):
+        s = [song.pk for song in self.songs]
+        response = self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [s[1], str(s[0]), s[1], s[0]]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(snapshots.ordered_song_ids(Playlist.objects.get().pk)), [s[1], s[0]])
+
+    def test_invalid_and_missing_ids_are_reported_together(self):
+        s = [song.pk for song in self.songs]
+        for songs in ([True], ["one"], [1.5]):
+            response = self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': songs}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, songs)
+        response = self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [s[0], s[2] + 2, s[2] + 1]}, content_type='application/json')
+        self.assertEqual(response.json(), f"Songs with IDs {s[2] + 2}, {s[2] + 1} do not exist.")
+
+        response = self.import_playlists({'name': "Playlist2", 'songs': [s[0], s[2] + 1]}, {'name': "Playlist3", 'songs': [s[2] + 2, s[1]]})
+        self.assertEqual(response.json(), f"Songs with IDs {s[2] + 1}, {s[2] + 2} do not exist.")
+        self.assertFalse(Playlist.objects.exists())
+
+    def test_failed_imports_create_nothing(self):
+        s = [song.pk for song in self.songs]
+        self.import_playlists({'name': "Playlist1", 'songs': [s[0]]})
+        for entries, message in (
+            ([{'name': "Playlist2", 'songs': [s[0]]}, {'name': "Playlist1", 'songs': [s[1]]}], "Playlists with the same name already exist: Playlist1."),
+            ([{'name': "Playlist2", 'songs': [s[0]]}, {'name': "Playlist2", 'songs': [s[1]]}], "Playlist names must be unique: Playlist2."),
+        ):
+            response = self.import_playlists(*entries)
+            self.assertEqual((response.status_code, response.json()), (400, message))
+        self.assertEqual(list(Playlist.objects.values_list('name', flat=True)), ["Playlist1"])
+        self.assertEqual(PlaylistSong.objects.count(), 1)
+
+    def test_imports_roll_back_as_a_whole(self):
+        # A constraint failing on the last song inserted undoes the
+        # playlists and songs inserted before it.
+        s = [song.pk for song in self.songs]
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TRIGGER reject_song BEFORE INSERT ON music_api_playlistsong WHEN NEW.song_id = {s[2]} BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        self.addCleanup(lambda: connection.cursor().execute("DROP TRIGGER IF EXISTS temp.reject_song"))
+        response = self.client.post(reverse('import_playlists'), {'playlists': [{'name': "Playlist1", 'songs': s[:2]}, {'name': "Playlist2", 'songs': [s[2]]}]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Playlist.objects.exists())
+        self.assertFalse(PlaylistSong.objects.exists())
+
+    def test_imported_playlists_reach_the_fuzzy_index(self):
+        index = fuzzy.index_for(Playlist)
+        index.invalidate()
+        index.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.import_playlists({'name': "Road Trip", 'songs': [self.songs[0].pk]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([pk for pk, _ in index.search("raod trip")], [response.json()['playlists'][0]['id']])
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class PlaylistPositionTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(6)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs[:4]]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+
+    def move(self, song, position):
+        return self.client.put(reverse('move_playlist_song', args=[self.playlist.pk, song.pk]), {'position': position}, content_type='application/json')
+
+    def test_position_must_be_an_integer(self):
+        for position in (True, "2", 1.5):
+            response = self.move(self.songs[0], position)
+            self.assertEqual((response.status_code, response.json()), (400, "Position must be an integer."), position)
+
+    def keys(self):
+        return list(PlaylistSong.objects.filter(playlist=self.playlist).order_by('position').values_list('song_id', 'position'))
+
+    def set_keys(self, *keys):
+        for song, key in zip(self.songs, keys):
+            PlaylistSong.objects.filter(playlist=self.playlist, song=song).update(position=key)
+
+    def test_moves_write_one_row_between_gapped_keys(self):
+        s = [song.pk for song in self.songs]
+        self.assertEqual(self.keys(), [(s[0], 1024), (s[1], 2048), (s[2], 3072), (s[3], 4096)])
+        with self.assertNumQueries(8):
+            self.assertEqual(self.move(self.songs[3], 2).status_code, 200)
+        self.assertEqual(self.keys(), [(s[0], 1024), (s[3], 1536), (s[1], 2048), (s[2], 3072)])
+
+        self.assertEqual(self.move(self.songs[0], 4).status_code, 200)
+        self.assertEqual(self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, s[1]])).status_code, 200)
+        self.assertEqual(self.keys(), [(s[3], 1536), (s[2], 3072), (s[0], 4096)])
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_exhausted_gaps_shift_the_songs_after(self):
+        s = [song.pk for song in self.songs]
+        self.set_keys(1, 2, 3, 4)
+        self.assertEqual(self.move(self.songs[3], 2).status_code, 200)
+        self.assertEqual(self.keys(), [(s[0], 1), (s[3], 513), (s[1], 1026), (s[2], 1027)])
+
+    def test_exhausted_gaps_are_shifted_with_one_range_update(self):
+        self.set_keys(1, 2, 3, 4)
+        with CaptureQueriesContext(connection) as queries:
+            self.move(self.songs[0], 3)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "music_api_playlistsong"')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('"position" = ("music_api_playlistsong"."position" + 1024)', updates[0])
+        self.assertEqual(PlaylistSong.objects.filter(playlist=self.playlist).order_by('position').values_list('song_id', flat=True)[2], self.songs[0].pk)
+
+    @override_settings(MUSIC_API_SNAPSHOT_MIN_TRACKS=3)
+    def test_aggregates_and_snapshot_follow_moves_removals_and_appends(self):
+        snapshots.rebuild()
+        self.move(self.songs[2], 1)
+        positions.append(self.playlist.pk, self.songs[4].pk)
+        self.client.delete(reverse('move_playlist_song', args=[self.playlist.pk, self.songs[0].pk]))
+        self.playlist.refresh_from_db()
+        self.assertEqual((self.playlist.track_count, self.playlist.version), (4, 4))
+        self.assertEqual(aggregates.drift(), [])
+
+        self.assertFalse(snapshots.check(self.playlist.pk))
+        jobs.run_pending()
+        self.assertTrue(snapshots.check(self.playlist.pk))
+        self.assertEqual(list(snapshots.ordered_song_ids(self.playlist.pk)), [self.songs[2].pk, self.songs[1].pk, self.songs[3].pk, self.songs[4].pk])
+
+    def test_crowded_keys_are_rebalanced_in_the_background(self):
+        s = [song.pk for song in self.songs]
+        self.set_keys(1024, 1040, 1050, 4096)
+        self.assertEqual(self.move(self.songs[0], 2).status_code, 200)
+        self.assertEqual(self.move(self.songs[3], 2).status_code, 200)
+        self.assertEqual(list(Job.objects.values_list('kind', 'params')), [('rebalance_positions', {'playlist_id': self.playlist.pk})])
+
+        version = Playlist.objects.get(pk=self.playlist.pk).version
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.keys(), [(s[1], 1024), (s[3], 2048), (s[0], 3072), (s[2], 4096)])
+        self.assertEqual(Playlist.objects.get(pk=self.playlist.pk).version, version + 1)
+        self.assertEqual(positions.rebalance(self.playlist.pk), 0)
+
+    def test_cursors_issued_before_a_rebalance_are_refused(self):
+        s = [song.pk for song in self.songs]
+        url = reverse('list_playlist_songs', args=[self.playlist.pk])
+        self.set_keys(1024, 1040, 1050, 4096)
+        first = self.client.get(url, {'cursor': '', 'page_size': 2}).json()
+        self.assertEqual(self.client.get(first['next']).status_code, 200)
+
+        positions.rebalance(self.playlist.pk)
+        self.assertEqual(self.client.get(first['next']).status_code, 409)
+
+        first = self.client.get(url, {'cursor': '', 'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        listed = [(song['id'], song['position']) for song in first['results'] + second['results']]
+        self.assertEqual(listed, [(song_id, position) for position, song_id in enumerate(s[:4], start=1)])
+
+    def test_shifting_keys_moves_the_key_generation(self):
+        self.set_keys(1024, 1025, 3072, 4096)
+        self.assertEqual(self.move(self.songs[3], 2).status_code, 200)
+        self.assertEqual(Playlist.objects.get(pk=self.playlist.pk).key_generation, 1)
+
+    def test_rebalance_command(self):
+        self.set_keys(1024, 1030, 5000, 9000)
+        stdout = StringIO()
+        call_command('rebalance_positions', stdout=stdout)
+        self.assertIn("Rebalanced 1 playlist(s).", stdout.getvalue())
+        self.assertEqual(positions.min_gap(self.playlist.pk), positions.POSITION_GAP)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_SNAPSHOT_MIN_TRACKS=5)
+class PlaylistSongBatchTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(10)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs[:6]]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+        self.url = reverse('edit_playlist_songs', args=[self.playlist.pk])
+
+    def edit(self, operations, **data):
+        return self.client.post(self.url, {'operations': operations, **data}, content_type='application/json')
+
+    def order(self):
+        return list(snapshots.ordered_song_ids(self.playlist.pk))
+
+    def test_operations_apply_in_order(self):
+        s = [song.pk for song in self.songs]
+        response = self.edit([
+            {'op': 'move', 'song': s[5], 'position': 1},
+            {'op': 'remove', 'song': s[0]},
+            {'op': 'add', 'song': s[7], 'position': 2},
+            {'op': 'add', 'song': s[8]},
+        ])
+        self.assertEqual(response.json(), {'version': 2, 'track_count': 7})
+        self.assertEqual(self.order(), [s[5], s[7], s[1], s[2], s[3], s[4], s[8]])
+        self.assertTrue(snapshots.check(self.playlist.pk))
+        self.assertEqual(aggregates.drift(), [])
+
+        response = self.edit([{'op': 'replace', 'songs': [s[9], s[1], s[5]]}], version=2)
+        self.assertEqual(response.json(), {'version': 3, 'track_count': 3})
+        self.assertEqual(self.order(), [s[9], s[1], s[5]])
+
+    def test_replace_accepts_numeric_string_ids(self):
+        s = [song.pk for song in self.songs]
+        response = self.edit([{'op': 'replace', 'songs': [str(s[8]), s[2]]}, {'op': 'move', 'song': s[8], 'position': 2}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(), [s[2], s[8]])
+
+    def test_only_displaced_songs_are_written(self):
+        before = dict(PlaylistSong.objects.values_list('song_id', 'position'))
+        s = [song.pk for song in self.songs]
+        self.edit([{'op': 'move', 'song': s[0], 'position': 6}, {'op': 'move', 'song': s[1], 'position': 6}])
+        after = dict(PlaylistSong.objects.values_list('song_id', 'position'))
+        self.assertEqual({song_id for song_id in before if before[song_id] != after[song_id]}, {s[0], s[1]})
+        self.assertEqual(self.order(), s[2:6] + [s[0], s[1]])
+
+    def test_invalid_batches_change_nothing(self):
+        s = [song.pk for song in self.songs]
+        order = self.order()
+        for operations, code in (
+            ([{'op': 'move', 'song': s[0], 'position': 2}, {'op': 'remove', 'song': s[9]}], 400),
+            ([{'op': 'add', 'song': s[1]}], 400),
+            ([{'op': 'move', 'song': s[0], 'position': 7}], 400),
+            ([{'op': 'add', 'song': s[-1] + 100}], 400),
+            ([{'op': 'shuffle'}], 400),
+            ([], 400),
+        ):
+            self.assertEqual(self.edit(operations).status_code, code, operations)
+
+        self.assertEqual(self.edit([{'op': 'remove', 'song': s[0]}], version=5).status_code, 409)
+        self.assertEqual(self.client.post(reverse('edit_playlist_songs', args=[self.playlist.pk + 1]), {'operations': [{'op': 'remove', 'song': s[0]}]}, content_type='application/json').status_code, 404)
+        self.assertEqual(self.order(), order)
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.version, 1)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_SNAPSHOT_MIN_TRACKS=5)
+class PlaylistSongAddTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(10)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs[:4]]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+        self.url = reverse('list_playlist_songs', args=[self.playlist.pk])
+
+    def add(self, songs, **data):
+        return self.client.post(self.url, {'songs': songs, **data}, content_type='application/json')
+
+    def order(self):
+        return list(snapshots.ordered_song_ids(self.playlist.pk))
+
+    def test_songs_are_appended_or_inserted(self):
+        s = [song.pk for song in self.songs]
+        response = self.add([s[4], s[0], s[5]])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'version': 2, 'track_count': 6, 'added': [s[4], s[5]], 'skipped': [s[0]]})
+        self.assertEqual(self.order(), s[:6])
+
+        self.add([s[6], s[7]], position=1)
+        self.add([s[8], s[9]], position=4)
+        self.assertEqual(self.order(), [s[6], s[7], s[0], s[8], s[9], s[1], s[2], s[3], s[4], s[5]])
+        self.assertTrue(snapshots.check(self.playlist.pk))
+        self.assertEqual(aggregates.drift(), [])
+
+    def test_tail_is_shifted_when_the_gap_is_full(self):
+        s = [song.pk for song in self.songs]
+        PlaylistSong.objects.filter(song_id=s[1]).update(position=positions.key_for_index(0) + 2)
+        # One more query than an insert into a gap, to move the key generation.
+        with self.assertNumQueries(11):
+            self.add(s[4:], position=2)
+        self.assertEqual(self.order(), [s[0]] + s[4:] + s[1:4])
+
+    def test_invalid_requests_change_nothing(self):
+        s = [song.pk for song in self.songs]
+        self.assertEqual(self.add([]).status_code, 400)
+        self.assertEqual(self.add([s[4]], position=6).status_code, 400)
+        self.assertEqual(self.add([s[4]], position="1").status_code, 400)
+        self.assertEqual(self.add([s[4], s[-1] + 100]).status_code, 400)
+        self.assertEqual(self.client.post(reverse('list_playlist_songs', args=[self.playlist.pk + 1]), {'songs': [s[4]]}, content_type='application/json').status_code, 404)
+        self.assertEqual(self.add(s[:4]).json()['skipped'], s[:4])
+        self.assertEqual(self.order(), s[:4])
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.version, 1)
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None, MUSIC_API_JOB_WORKERS=0, MUSIC_API_JOB_DELETE_MIN_TRACKS=5, MUSIC_API_JOB_BATCH_SIZE=2, MUSIC_API_JOB_PAUSE=0)
+class JobTests(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(6)]
+        self.client.post(reverse('playlists'), {'name': "Playlist1", 'songs': [song.pk for song in self.songs]}, content_type='application/json')
+        self.client.post(reverse('playlists'), {'name': "Playlist2", 'songs': [song.pk for song in self.songs[:2]]}, content_type='application/json')
+        self.playlist = Playlist.objects.get(name="Playlist1")
+
+    def poll(self, response):
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response['Location']).json()
+
+    def test_large_playlists_are_deleted_in_batches(self):
+        url = reverse('edit_playlist', args=[self.playlist.pk])
+        response = self.client.delete(url)
+        job = self.poll(response)
+        self.assertEqual((job['kind'], job['status']), ('delete_playlist', 'queued'))
+        self.assertEqual(self.client.delete(url).json()['id'], job['id'])
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('run_jobs', stdout=StringIO())
+        self.assertEqual(sum(query['sql'].startswith('DELETE FROM "music_api_playlistsong" WHERE "music_api_playlistsong"."id" IN') for query in queries), 3)
+
+        job = self.poll(response)
+        self.assertEqual((job['status'], job['progress'], job['total'], job['result']), ('done', 6, 6, {'deleted_tracks': 6}))
+        self.assertFalse(Playlist.objects.filter(pk=self.playlist.pk).exists())
+        self.assertEqual(self.client.delete(reverse('edit_playlist', args=[Playlist.objects.get(name="Playlist2").pk])).status_code, 200)
+
+    def test_imports_can_run_in_the_background(self):
+        response = self.client.post(reverse('import_songs') + '?background=true', "name,artist,release_year\nNew,Artist,2001\nBad,Artist,1800\n", content_type='text/csv')
+        job_id = self.poll(response)['id']
+        response = self.client.post(reverse('import_playlists') + '?background=1', {'playlists': [{'name': "Playlist3", 'songs': [self.songs[0].pk]}]}, content_type='application/json')
+        self.assertEqual(jobs.run_pending(), 2)
+
+        job = self.client.get(reverse('job', args=[job_id])).json()
+        self.assertEqual((job['status'], job['result']['inserted'], job['result']['rejected_rows'][0]['line']), ('done', 1, 3))
+        self.assertEqual(self.poll(response)['result']['created'], 1)
+        self.assertTrue(Song.objects.filter(name="New").exists())
+        self.assertFalse(jobs.run(job_id))
+
+    def test_failed_jobs_report_their_error(self):
+        response = self.client.post(reverse('jobs'), {'kind': 'recompute_aggregates'}, content_type='application/json')
+        self.assertEqual(self.client.post(reverse('jobs'), {'kind': 'drop_tables'}, content_type='application/json').status_code, 400)
+        job = jobs.enqueue('import_playlists', entries=[{'name': "Playlist1", 'songs': [self.songs[0].pk]}])
+        jobs.run_pending()
+
+        self.assertEqual(self.poll(response)['status'], 'done')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', "Playlists with the same name already exist: Playlist1."))
+        self.assertEqual(self.client.get(reverse('job', args=[job.pk + 1])).status_code, 404)
+
+
+class OpenAPISchemaTests(TestCase):
+    def test_committed_schema_is_up_to_date(self):
+        call_command('generate_openapi', '--check', stdout=StringIO())
+
+    def test_schema_is_served_with_validators(self):
+        response = self.client.get(reverse('openapi-schema'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/playlists/{playlist_id}/songs', response.json()['paths'])
+        response = self.client.get(reverse('openapi-schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with override_settings(MUSIC_API_OPENAPI_PATH=None, MUSIC_API_DOCS=False):
+            self.assertEqual(self.client.get(reverse('openapi-schema')).status_code, 404)
+
+
+class FastRenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Song.objects.create(name='Line\u2028break </script> "quoted"', artist="Beyonc\u00e9", release_year=2001)
+        Song.objects.create(name="Plain", artist="Artist", release_year=1999)
+        Playlist.objects.create(name="Caf\u00e9 \u2029 mix")
+
+    def test_plan_rows_match_serializer(self):
+        for serializer_class, queryset in ((SongSerializer, Song.objects.order_by('id')), (PlaylistSerializer, Playlist.objects.order_by('id'))):
+            plan = rows.plan_for(serializer_class)
+            expected = serializer_class(queryset, many=True).data
+            self.assertEqual(plan.shape(plan.values(queryset)), [dict(row) for row in expected])
+
+            paths = benchmarks.serialization_paths(serializer_class, queryset)
+            self.assertEqual(len({function() for function in paths.values()}), 1)
+
+    def test_renderer_matches_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        data = {
+            'floats': [1e16, 1e-5, 0.1, 1.5e300, -0.0],
+            'big': 2 ** 64,
+            'when': Playlist.objects.get().modified_at,
+            'text': "\u2028\u2029\u00e9</script>",
+            'songs': SongSerializer(Song.objects.all(), many=True).data,
+        }
+        for encoder in ('orjson', 'json'):
+            with self.subTest(encoder=encoder), override_settings(MUSIC_API_JSON_ENCODER=encoder):
+                self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(MUSIC_API_RESPONSE_CACHE=None)
+class ResponseFormatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        songs = Song.objects.bulk_create([Song(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(40)])
+        cls.playlist = Playlist.objects.create(name="Playlist1")
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=cls.playlist, song=song, position=positions.key_for_index(index))
+            for index, song in enumerate(songs)
+        ])
+        aggregates.recompute()
+        cls.url = reverse('list_playlist_songs', args=[cls.playlist.pk])
+
+    def test_columnar_json(self):
+        data = self.client.get(self.url).json()
+        response = self.client.get(self.url, headers={'Accept': renderers.COLUMNS_MEDIA_TYPE})
+        self.assertEqual(response['Content-Type'], renderers.COLUMNS_MEDIA_TYPE)
+        columnar = json.loads(response.content)
+        self.assertEqual(columnar['count'], data['count'])
+        self.assertEqual([dict(zip(columnar['columns'], row)) for row in columnar['results']], data['results'])
+
+        response = self.client.get(reverse('export_playlist_songs', args=[self.playlist.pk]), headers={'Accept': renderers.COLUMNS_MEDIA_TYPE})
+        exported = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(exported['columns'], list(export.PLAYLIST_SONG_FIELDS))
+        self.assertEqual(len(exported['results']), 40)
+
+    def test_gzip_above_threshold(self):
+        plain = self.client.get(self.url, {'page_size': 40})
+        response = self.client.get(self.url, {'page_size': 40}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        response = self.client.get(self.url, {'page_size': 40}, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        with override_settings(MUSIC_API_GZIP_MIN_BYTES=len(plain.content) + 1):
+            response = self.client.get(self.url, {'page_size': 40}, headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @skipUnless(renderers.msgpack, "msgpack is not installed.")
+    def test_msgpack(self):
+        msgpack = renderers.msgpack
+        data = self.client.get(self.url).json()
+        response = self.client.get(self.url, headers={'Accept': renderers.MSGPACK_MEDIA_TYPE})
+        self.assertEqual(msgpack.unpackb(response.content), data)
+
+        response = self.client.get(reverse('export_playlist_songs', args=[self.playlist.pk]), {'output': 'msgpack'})
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(b''.join(response.streaming_content))
+        rows = list(unpacker)
+        self.assertEqual(rows[0], list(export.PLAYLIST_SONG_FIELDS))
+        self.assertEqual(len(rows), 41)
+
+
+class SongPlaylistsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.songs = Song.objects.bulk_create([Song(name=f"Song{i}", artist="Artist", release_year=2000) for i in range(3)])
+        cls.playlists = Playlist.objects.bulk_create([Playlist(name=f"Playlist{i}") for i in range(7)])
+        # The first song is in every playlist, the second in the first two.
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=playlist, song=song, position=positions.key_for_index(index))
+            for playlist in cls.playlists
+            for index, song in enumerate(cls.songs[:2] if playlist.pk <= cls.playlists[1].pk else cls.songs[:1])
+        ])
+        aggregates.recompute()
+
+    def test_cursor_pages(self):
+        url = reverse('song_playlists', args=[self.songs[0].pk])
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {'page_size': 3}).json()
+        self.assertEqual(data['count'], 7)
+        self.assertEqual(data['results'][0], self.client.get(reverse('playlists')).json()['results'][0])
+
+        ids = [playlist['id'] for playlist in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            ids += [playlist['id'] for playlist in data['results']]
+        self.assertEqual(ids, [playlist.pk for playlist in self.playlists])
+        self.assertEqual([playlist['id'] for playlist in self.client.get(data['previous']).json()['results']], ids[3:6])
+
+        self.assertEqual(self.client.get(reverse('song_playlists', args=[self.songs[2].pk])).json()['count'], 0)
+        self.assertEqual(self.client.get(reverse('song_playlists', args=[self.songs[2].pk + 1])).status_code, 404)
+
+    def test_lookup_groups_playlists_per_song(self):
+        url = reverse('lookup_song_playlists')
+        song_ids = [self.songs[2].pk, self.songs[0].pk, self.songs[1].pk]
+        with self.assertNumQueries(3):
+            response = self.client.post(url + '?page_size=2', {'songs': song_ids}, content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual([(result['song'], result['count']) for result in results], [(song_ids[0], 0), (song_ids[1], 7), (song_ids[2], 2)])
+        self.assertEqual([playlist['id'] for playlist in results[1]['playlists']], [self.playlists[0].pk, self.playlists[1].pk])
+        self.assertIsNone(results[2]['next'])
+        rest = self.client.get(results[1]['next']).json()['results']
+        self.assertEqual([playlist['id'] for playlist in rest], [self.playlists[2].pk, self.playlists[3].pk])
+
+        response = self.client.post(url, {'songs': [self.songs[2].pk + 1]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
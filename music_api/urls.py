@@ -1,11 +1,39 @@
+from django.conf import settings
 from django.urls import path
-from .views import SongView, PlaylistView, PlaylistModifyDeleteView, ListPlaylistSongsView, PlaylistMoveDeleteSongView
+from django.views.decorators.csrf import csrf_exempt
+from .views import SongView, SongImportView, SongPlaylistsView, SongPlaylistsLookupView, PlaylistView, PlaylistImportView, PlaylistModifyDeleteView, ListPlaylistSongsView, PlaylistMoveDeleteSongView, PlaylistSongBatchView, SongExportView, PlaylistExportView, PlaylistSongExportView, CacheStatsView, JobView, JobStatusView
 from . import views
 
-urlpatterns = [
-    path('songs', SongView.as_view(), name='songs'),
-    path('playlists', PlaylistView.as_view(), name='playlists'),
-    path('playlists/<int:playlist_id>', PlaylistModifyDeleteView.as_view(), name='edit_playlist'),
-    path('playlists/<int:playlist_id>/songs', ListPlaylistSongsView.as_view(), name='list_playlist_songs'),
-    path('playlists/<int:playlist_id>/songs/<song_id>', PlaylistMoveDeleteSongView.as_view(), name='move_playlist_song'),
-]
\ No newline at end of file
+
+def build_urlpatterns(use_async=False):
+    if use_async:
+        from . import async_views
+        song_view = csrf_exempt(async_views.SongView.as_view())
+        playlist_view = csrf_exempt(async_views.PlaylistView.as_view())
+        list_playlist_songs_view = csrf_exempt(async_views.ListPlaylistSongsView.as_view())
+    else:
+        song_view = SongView.as_view()
+        playlist_view = PlaylistView.as_view()
+        list_playlist_songs_view = ListPlaylistSongsView.as_view()
+
+    return [
+        path('songs', song_view, name='songs'),
+        path('songs/import', SongImportView.as_view(), name='import_songs'),
+        path('songs/export', SongExportView.as_view(), name='export_songs'),
+        path('songs/playlists', SongPlaylistsLookupView.as_view(), name='lookup_song_playlists'),
+        path('songs/<int:song_id>/playlists', SongPlaylistsView.as_view(), name='song_playlists'),
+        path('playlists', playlist_view, name='playlists'),
+        path('playlists/import', PlaylistImportView.as_view(), name='import_playlists'),
+        path('playlists/export', PlaylistExportView.as_view(), name='export_playlists'),
+        path('playlists/<int:playlist_id>', PlaylistModifyDeleteView.as_view(), name='edit_playlist'),
+        path('playlists/<int:playlist_id>/songs', list_playlist_songs_view, name='list_playlist_songs'),
+        path('playlists/<int:playlist_id>/songs/export', PlaylistSongExportView.as_view(), name='export_playlist_songs'),
+        path('playlists/<int:playlist_id>/songs/batch', PlaylistSongBatchView.as_view(), name='edit_playlist_songs'),
+        path('playlists/<int:playlist_id>/songs/<song_id>', PlaylistMoveDeleteSongView.as_view(), name='move_playlist_song'),
+        path('jobs', JobView.as_view(), name='jobs'),
+        path('jobs/<int:job_id>', JobStatusView.as_view(), name='job'),
+        path('cache/stats', CacheStatsView.as_view(), name='cache_stats'),
+    ]
+
+
+urlpatterns = build_urlpatterns(getattr(settings, 'MUSIC_API_ASYNC_VIEWS', False))
@@ -1,16 +1,95 @@
+import json
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework import viewsets
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
-from .serializers import SongSerializer, PlaylistSerializer, PlaylistSongSerializer
-from .models import Song, Playlist, PlaylistSong
+from django.utils import timezone
+from .docs import openapi, swagger_auto_schema
+from .exceptions import ServiceError
+from .serializers import SongSerializer, PlaylistSerializer, JobSerializer
+from .models import Song, Playlist, PlaylistSong, Job
+from . import bulk, conditional, docs, edits, export, fuzzy, ingest, jobs, membership, metrics, pagination, positions, renderers, response_cache, rows, search, snapshots
+
+# The list endpoints also answer in columnar JSON and MessagePack when the
+# Accept header asks for them.
+LIST_RENDERER_CLASSES = api_settings.DEFAULT_RENDERER_CLASSES + renderers.COMPACT_RENDERER_CLASSES
+
+
+def is_fuzzy_request(request):
+    return request.GET.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+
+
+def is_background_request(request):
+    return request.GET.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def job_response(request, job):
+    url = request.build_absolute_uri(reverse('job', args=[job.pk]))
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+
+PLAYLIST_SONG_FIELDS = ('position', 'song_id', 'song__name', 'song__artist', 'song__release_year')
+
+
+def fuzzy_results(request, model, serializer_class, search_query):
+    page_size = pagination.get_page_size(request)
+    matches = fuzzy.search(model, search_query, limit=page_size)
+    objects = model.objects.in_bulk([pk for pk, _ in matches])
+
+    results = []
+    with metrics.timed('serialize'):
+        for pk, score in matches:
+            if pk in objects:
+                data = serializer_class(objects[pk]).data
+                data['similarity'] = round(score, 3)
+                results.append(data)
+
+    return {
+        'count': len(results),
+        'next': None,
+        'previous': None,
+        'results': results
+    }
+
+
+def fuzzy_response(request, model, serializer_class, search_query):
+    try:
+        return Response(fuzzy_results(request, model, serializer_class, search_query))
+    except ServiceError as e:
+        return Response(e.detail, status=e.status_code)
+
+
+def track_count_query(playlist_id):
+    return Playlist.objects.filter(pk=playlist_id).values_list('track_count', flat=True)
+
+
+def key_generation(request):
+    # Read with the playlist's version by the state query of conditional_get().
+    state = getattr(request, conditional.STATE_ATTRIBUTE, None)
+    return state[4] if state else None
+
+
+def playlist_song_results(page):
+    return [
+        {
+            'id': row['song_id'],
+            'name': row['song__name'],
+            'artist': row['song__artist'],
+            'release_year': row['song__release_year'],
+            'position': position,
+        }
+        for position, row in enumerate(page.object_list, start=page.start_position)
+    ]
 
 
 class SongView(APIView):
+    renderer_classes = LIST_RENDERER_CLASSES
+
     @swagger_auto_schema(
         operation_summary="List available songs",
         operation_description="This endpoint is used to list all the available songs in the app.",
@@ -21,12 +100,36 @@ class SongView(APIView):
                 description="Page Number",
                 type=openapi.TYPE_INTEGER,
             ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Results per page",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque cursor from a previous next/previous link. Pass an empty value to start cursor pagination.",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'count',
+                openapi.IN_QUERY,
+                description="Include the total count in cursor mode",
+                type=openapi.TYPE_BOOLEAN,
+            ),
             openapi.Parameter(
                 'q',
                 openapi.IN_QUERY,
-                description="Song Name",
+                description="Search song names and artists, best matches first. The last word matches as a prefix; use artist:name or name:title to search one field.",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                'fuzzy',
+                openapi.IN_QUERY,
+                description="Typo-tolerant name matching. Returns the closest matches to q with a similarity score.",
+                type=openapi.TYPE_BOOLEAN,
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -34,28 +137,30 @@ class SongView(APIView):
             )
         }
     )
+    @response_cache.cached_get(lambda: conditional.catalog_state('songs'))
+    @conditional.conditional_get(lambda: conditional.catalog_state('songs'))
     def get(self, request):
-        page_number = request.GET.get('page', 1)
         search_query = request.GET.get('q', '')
+        if search_query and is_fuzzy_request(request):
+            return fuzzy_response(request, Song, SongSerializer, search_query)
 
+        plan = rows.plan_for(SongSerializer)
         songs = Song.objects.order_by('id')
         if search_query:
-            songs = songs.filter(name__icontains=search_query)
+            songs = search.search_songs(songs, search_query, ranked=not pagination.is_cursor_request(request))
+        songs = plan.values(songs)
 
-        paginator = Paginator(songs, 10)
-        page_obj = paginator.get_page(page_number)
+        base_url = request.build_absolute_uri(reverse('songs'))
 
-        serializer = SongSerializer(page_obj.object_list, many=True)
+        try:
+            page = pagination.paginate(request, songs, base_url)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
 
-        base_url = request.build_absolute_uri(reverse('songs'))
+        with metrics.timed('serialize'):
+            results = plan.shape(page.object_list)
 
-        response_data = {
-            'count': paginator.count,
-            'next': base_url + f'?page={page_obj.next_page_number()}' if page_obj.has_next() else None,
-            'previous': base_url + f'?page={page_obj.previous_page_number()}' if page_obj.has_previous() else None,
-            'results': serializer.data
-        }
-        return Response(response_data)
+        return Response(page.response_data(results))
 
 
     @swagger_auto_schema(
@@ -78,17 +183,168 @@ class SongView(APIView):
     def post(self, request):
         serializer = SongSerializer(data=request.data)
         if serializer.is_valid():
-            existing_songs = Song.objects.filter(name=request.data.get('name'), artist=request.data.get('artist'))
-            if existing_songs.exists():
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
                 return Response("A song with the same name and artist already exists.", status=status.HTTP_400_BAD_REQUEST)
-            
-            serializer.save()
+
             return Response("Success. The song entry has been created.", status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
+class SongImportView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Import songs",
+        operation_description="This endpoint is used to add songs in bulk. Send a CSV (text/csv) or NDJSON (application/x-ndjson) body with name, artist and release_year per row. Songs that already exist are skipped. The response streams one NDJSON report per batch, listing rejected rows by line number, followed by a summary.",
+        manual_parameters=[
+            openapi.Parameter(
+                'batch_size',
+                openapi.IN_QUERY,
+                description="Rows per batch",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'background',
+                openapi.IN_QUERY,
+                description="Import in a background job and return 202 with the job to poll",
+                type=openapi.TYPE_BOOLEAN,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success. The import report is streamed as NDJSON."
+            ),
+            202: openapi.Response(
+                description="Accepted. The import runs in the background job returned."
+            )
+        },
+    )
+    def post(self, request):
+        format = ingest.format_for_content_type(request.content_type)
+        if format is None:
+            return Response("Send the songs as text/csv or application/x-ndjson.", status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        try:
+            batch_size = int(request.GET.get('batch_size', ingest.BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
+        if batch_size < 1:
+            return Response("Batch size must be a positive integer.", status=status.HTTP_400_BAD_REQUEST)
+
+        if is_background_request(request):
+            path = jobs.save_upload(request.stream, suffix=f'.{format}')
+            return job_response(request, jobs.enqueue('import_songs', path=path, format=format, batch_size=batch_size))
+
+        rows = ingest.read_rows(request.stream or [], format)
+        reports = ingest.summarize(ingest.ingest(rows, batch_size=batch_size))
+        return StreamingHttpResponse((json.dumps(report) + '\n' for report in reports), content_type='application/x-ndjson')
+
+
+
+class SongPlaylistsView(APIView):
+    renderer_classes = LIST_RENDERER_CLASSES
+
+    @swagger_auto_schema(
+        operation_summary="List playlists containing a song",
+        operation_description="This endpoint is used to find every playlist a song is in, e.g. before taking the song down. Results are ordered by playlist ID and paginated with a cursor; follow the next/previous links. count is always included.",
+        manual_parameters=[
+            openapi.Parameter(
+                'song_id',
+                openapi.IN_PATH,
+                description="Song Id",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Results per page",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque cursor from a previous next/previous link",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request, song_id):
+        try:
+            page_size = pagination.get_page_size(request)
+            count = membership.count(song_id)
+            if not count and not Song.objects.filter(pk=song_id).exists():
+                return Response("Song not found", status=status.HTTP_404_NOT_FOUND)
+
+            base_url = request.build_absolute_uri(reverse('song_playlists', args=[song_id]))
+            playlists, boundary = pagination.cursor_query(request, membership.playlists_of(song_id), membership.KEY, page_size)
+            page = pagination.cursor_result(request, base_url, membership.KEY, page_size, list(playlists), boundary, count)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        with metrics.timed('serialize'):
+            results = membership.plan().shape(page.object_list)
+
+        return Response(page.response_data(results))
+
+
+
+class SongPlaylistsLookupView(APIView):
+    renderer_classes = LIST_RENDERER_CLASSES
+
+    @swagger_auto_schema(
+        operation_summary="Find the playlists containing several songs",
+        operation_description="This endpoint is used to look up the playlists of many songs at once. Results follow the order of the songs sent. Each song lists its first page_size playlists by ID along with its playlist count, and a next link to the rest when there are more.",
+        manual_parameters=[
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Playlists listed per song",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'songs': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER), example=[2,5,3]),
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        },
+    )
+    def post(self, request):
+        try:
+            page_size = pagination.get_page_size(request)
+            song_ids = membership.clean_song_ids(request.data.get('songs'))
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        groups = membership.grouped(song_ids, page_size)
+        results = []
+        for song_id in song_ids:
+            count, playlists = groups.get(song_id, (0, []))
+            next_url = None
+            if count > len(playlists):
+                cursor = pagination.encode_cursor(playlists[-1]['id'], len(playlists), False)
+                next_url = request.build_absolute_uri(reverse('song_playlists', args=[song_id])) + f'?cursor={cursor}&page_size={page_size}'
+            results.append({'song': song_id, 'count': count, 'next': next_url, 'playlists': playlists})
+
+        return Response({'results': results})
+
+
+
 class PlaylistView(APIView):
+    renderer_classes = LIST_RENDERER_CLASSES
+
     @swagger_auto_schema(
         operation_summary="List available playlists",
         operation_description="This endpoint is used to list all the available playlists in the app.",
@@ -99,12 +355,36 @@ class PlaylistView(APIView):
                 description="Page Number",
                 type=openapi.TYPE_INTEGER,
             ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Results per page",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque cursor from a previous next/previous link. Pass an empty value to start cursor pagination.",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'count',
+                openapi.IN_QUERY,
+                description="Include the total count in cursor mode",
+                type=openapi.TYPE_BOOLEAN,
+            ),
             openapi.Parameter(
                 'q',
                 openapi.IN_QUERY,
                 description="Playlist Name",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                'fuzzy',
+                openapi.IN_QUERY,
+                description="Typo-tolerant name matching. Returns the closest matches to q with a similarity score.",
+                type=openapi.TYPE_BOOLEAN,
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -112,28 +392,30 @@ class PlaylistView(APIView):
             )
         }
     )
+    @response_cache.cached_get(lambda: conditional.catalog_state('playlists'))
+    @conditional.conditional_get(lambda: conditional.catalog_state('playlists'))
     def get(self, request):
-        page_number = request.GET.get('page', 1)
         search_query = request.GET.get('q', '')
+        if search_query and is_fuzzy_request(request):
+            return fuzzy_response(request, Playlist, PlaylistSerializer, search_query)
 
+        plan = rows.plan_for(PlaylistSerializer)
         playlists = Playlist.objects.order_by('id')
         if search_query:
             playlists = playlists.filter(name__icontains=search_query)
+        playlists = plan.values(playlists)
 
-        paginator = Paginator(playlists, 10)
-        page_obj = paginator.get_page(page_number)
+        base_url = request.build_absolute_uri(reverse('playlists'))
 
-        serializer = PlaylistSerializer(page_obj.object_list, many=True)
+        try:
+            page = pagination.paginate(request, playlists, base_url)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
 
-        base_url = request.build_absolute_uri(reverse('playlists'))
+        with metrics.timed('serialize'):
+            results = plan.shape(page.object_list)
 
-        response_data = {
-            'count': paginator.count,
-            'next': base_url + f'?page={page_obj.next_page_number()}' if page_obj.has_next() else None,
-            'previous': base_url + f'?page={page_obj.previous_page_number()}' if page_obj.has_previous() else None,
-            'results': serializer.data
-        }
-        return Response(response_data)
+        return Response(page.response_data(results))
 
 
     @swagger_auto_schema(
@@ -163,33 +445,90 @@ class PlaylistView(APIView):
             if not songs:
                 return Response("Include at least one song in the playlist.", status=status.HTTP_400_BAD_REQUEST)
 
-            playlist = serializer.save()
-
-            unique_song_ids = set()
-            for position, song_id in enumerate(songs, start=1):
-                if song_id in unique_song_ids:
-                    continue
-
-                try:
-                    song = Song.objects.get(pk=song_id)
-                except Song.DoesNotExist:
-                    playlist.delete()
-                    return Response(f"Song with ID {song_id} does not exist.", status=status.HTTP_400_BAD_REQUEST)
-                
-                playlist_song_data = {'playlist': playlist.pk, 'song': song.pk, 'position': position}
-                playlist_song_serializer = PlaylistSongSerializer(data=playlist_song_data)
-                if playlist_song_serializer.is_valid():
-                    playlist_song_serializer.save()
-                    unique_song_ids.add(song_id)
-                else:
-                    playlist.delete()
-                    return Response(playlist_song_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(songs, list):
+                return Response("Songs must be a list of song IDs.", status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                bulk.create_playlist(serializer.validated_data['name'], songs)
+            except ServiceError as e:
+                return Response(e.detail, status=e.status_code)
 
             return Response("Success. The playlist entry has been created.", status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
+class PlaylistImportView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Import playlists",
+        operation_description="This endpoint is used to create many playlists in one request, e.g. when migrating a library. Either every playlist is created or none are.",
+        manual_parameters=[
+            openapi.Parameter(
+                'background',
+                openapi.IN_QUERY,
+                description="Import in a background job and return 202 with the job to poll",
+                type=openapi.TYPE_BOOLEAN,
+            ),
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'playlists': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'name': openapi.Schema(type=openapi.TYPE_STRING, example="Playlist1"),
+                            'songs': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER), example=[2,5,3,10,8])
+                        }
+                    )
+                )
+            }
+        ),
+        responses={
+            201: openapi.Response(
+                description="Success. The playlist entries have been created."
+            ),
+            202: openapi.Response(
+                description="Accepted. The import runs in the background job returned."
+            )
+        },
+    )
+    def post(self, request):
+        entries = request.data.get('playlists')
+        if not isinstance(entries, list) or not entries:
+            return Response("Include at least one playlist to import.", status=status.HTTP_400_BAD_REQUEST)
+
+        validated_entries = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                return Response("Each playlist must be an object with a name and songs.", status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = PlaylistSerializer(data=entry)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            songs = entry.get('songs', [])
+            if not isinstance(songs, list) or not songs:
+                return Response(f"Include at least one song in the playlist {serializer.validated_data['name']}.", status=status.HTTP_400_BAD_REQUEST)
+
+            validated_entries.append({'name': serializer.validated_data['name'], 'songs': songs})
+
+        if is_background_request(request):
+            return job_response(request, jobs.enqueue('import_playlists', entries=validated_entries))
+
+        try:
+            playlists = bulk.import_playlists(validated_entries)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return Response({
+            'created': len(playlists),
+            'playlists': PlaylistSerializer(playlists, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+
+
 class PlaylistModifyDeleteView(APIView):
     @swagger_auto_schema(
         operation_summary="Edit playlist metadata",
@@ -226,7 +565,11 @@ class PlaylistModifyDeleteView(APIView):
             if existing_playlist.exists():
                 return Response("A playlist with the same name already exists. Enter a different name.", status=status.HTTP_400_BAD_REQUEST)
             
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save(modified_at=timezone.now())
+            except IntegrityError:
+                return Response("A playlist with the same name already exists. Enter a different name.", status=status.HTTP_400_BAD_REQUEST)
             return Response("Success. The name of the playlist has been edited.", status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -245,6 +588,9 @@ class PlaylistModifyDeleteView(APIView):
         responses={
             200: openapi.Response(
                 description="Success. The playlist has been deleted."
+            ),
+            202: openapi.Response(
+                description="Accepted. The playlist is large and is being deleted by the background job returned."
             )
         },
     )
@@ -254,12 +600,19 @@ class PlaylistModifyDeleteView(APIView):
         except Playlist.DoesNotExist:
             return Response("Playlist does not exist.", status=status.HTTP_404_NOT_FOUND)
 
+        threshold = getattr(settings, 'MUSIC_API_JOB_DELETE_MIN_TRACKS', None)
+        if threshold is not None and playlist.track_count >= threshold:
+            job = jobs.active('delete_playlist', playlist_id=playlist.pk) or jobs.enqueue('delete_playlist', playlist_id=playlist.pk)
+            return job_response(request, job)
+
         playlist.delete()
         return Response("Success. The playlist has been deleted.", status=status.HTTP_200_OK)
 
 
 
 class ListPlaylistSongsView(APIView):
+    renderer_classes = LIST_RENDERER_CLASSES
+
     @swagger_auto_schema(
         operation_summary="List playlist songs",
         operation_description="This endpoint is used to list all the songs associated with a playlist.",
@@ -270,6 +623,24 @@ class ListPlaylistSongsView(APIView):
                 description="Page Number",
                 type=openapi.TYPE_INTEGER,
             ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Results per page",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque cursor from a previous next/previous link. Pass an empty value to start cursor pagination.",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'count',
+                openapi.IN_QUERY,
+                description="Include the total count in cursor mode",
+                type=openapi.TYPE_BOOLEAN,
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -277,38 +648,77 @@ class ListPlaylistSongsView(APIView):
             )
         }
     )
+    @response_cache.cached_get(conditional.playlist_songs_state)
+    @conditional.conditional_get(conditional.playlist_songs_state)
     def get(self, request, playlist_id):
+        playlist_songs = PlaylistSong.objects.filter(playlist_id=playlist_id).values(*PLAYLIST_SONG_FIELDS)
+        base_url = request.build_absolute_uri(reverse('list_playlist_songs', args=[playlist_id]))
+
         try:
-            playlist = Playlist.objects.get(pk=playlist_id)
-        except Playlist.DoesNotExist:
+            page_size = pagination.get_page_size(request)
+            if not pagination.is_cursor_request(request):
+                page = snapshots.number_page(request, playlist_songs, playlist_id, base_url, page_size)
+            elif pagination.wants_count(request):
+                count = next(iter(track_count_query(playlist_id)), None)
+                page = None if count is None else pagination.cursor_page(request, playlist_songs, base_url, 'position', page_size, count, key_generation(request))
+            else:
+                page = pagination.cursor_page(request, playlist_songs, base_url, 'position', page_size, generation=key_generation(request))
+                if not page.object_list and not Playlist.objects.filter(pk=playlist_id).exists():
+                    page = None
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        if page is None:
             return Response("Playlist not found", status=status.HTTP_404_NOT_FOUND)
 
-        page_number = request.GET.get('page', 1)
+        with metrics.timed('serialize'):
+            results = playlist_song_results(page)
 
-        playlist_songs = playlist.playlistsong_set.order_by('position')
-        paginator = Paginator(playlist_songs, 10)
-        page_obj = paginator.get_page(page_number)
+        return Response(page.response_data(results))
 
-        response_data = {
-            'count': paginator.count,
-            'next': None,
-            'previous': None,
-            'results': []
-        }
 
-        base_url = request.build_absolute_uri(reverse('list_playlist_songs', args=[playlist_id]))
+    @swagger_auto_schema(
+        operation_summary="Add playlist songs",
+        operation_description="This endpoint is used to add songs to an existing playlist, at the end or at a given position. Songs already in the playlist are skipped.",
+        manual_parameters=[
+            openapi.Parameter(
+                'playlist_id',
+                openapi.IN_PATH,
+                description="Playlist Id",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'songs': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER), example=[2,5,3]),
+                'position': openapi.Schema(type=openapi.TYPE_INTEGER, example=1),
+            }
+        ),
+        responses={
+            201: openapi.Response(
+                description="Success. Returns the new version and track count of the playlist, and the songs added and skipped."
+            )
+        },
+    )
+    def post(self, request, playlist_id):
+        songs = request.data.get('songs')
+        if not songs:
+            return Response("Include at least one song.", status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(songs, list):
+            return Response("Songs must be a list of song IDs.", status=status.HTTP_400_BAD_REQUEST)
 
-        for playlist_song in page_obj.object_list:
-            song_data = SongSerializer(playlist_song.song).data
-            song_data['position'] = playlist_song.position
-            response_data['results'].append(song_data)
+        position = request.data.get('position')
+        if position is not None and not edits.is_integer(position):
+            return Response("Position must be an integer.", status=status.HTTP_400_BAD_REQUEST)
 
-        if page_obj.has_next():
-            response_data['next'] = base_url + f'?page={page_obj.next_page_number()}'
-        if page_obj.has_previous():
-            response_data['previous'] = base_url + f'?page={page_obj.previous_page_number()}'
+        try:
+            playlist = bulk.add_songs(playlist_id, songs, position)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
 
-        return Response(response_data)
+        return Response(playlist, status=status.HTTP_201_CREATED)
 
 
 
@@ -344,7 +754,7 @@ class PlaylistMoveDeleteSongView(APIView):
     )
     def put(self, request, playlist_id, song_id):
         try:
-            playlist_song = PlaylistSong.objects.get(playlist_id=playlist_id, song_id=song_id)
+            playlist_song = PlaylistSong.objects.select_related('playlist').get(playlist_id=playlist_id, song_id=song_id)
         except PlaylistSong.DoesNotExist:
             return Response("Playlist song not found.", status=status.HTTP_404_NOT_FOUND)
 
@@ -353,27 +763,13 @@ class PlaylistMoveDeleteSongView(APIView):
         if new_position is None:
             return Response("Position is required.", status=status.HTTP_400_BAD_REQUEST)
 
-        if not isinstance(new_position, int):
+        if not edits.is_integer(new_position):
             return Response("Position must be an integer.", status=status.HTTP_400_BAD_REQUEST)
 
-        song_count = PlaylistSong.objects.filter(playlist_id=playlist_id).count()
-
-        if new_position < 1 or new_position > song_count:
+        if new_position < 1 or new_position > playlist_song.playlist.track_count:
             return Response("Position is invalid.", status=status.HTTP_400_BAD_REQUEST)
 
-        old_position = playlist_song.position
-
-        songs_to_adjust = PlaylistSong.objects.filter(playlist_id=playlist_id, position__gte=min(old_position, new_position), position__lte=max(old_position, new_position)).exclude(id=playlist_song.id)
-
-        for song in songs_to_adjust:
-            if old_position < new_position:
-                song.position -= 1
-            else:
-                song.position += 1
-            song.save()
-
-        playlist_song.position = new_position
-        playlist_song.save()
+        positions.move(playlist_song, new_position)
 
         return Response("Success. Song has been moved to the new position in the playlist.", status=status.HTTP_200_OK)
 
@@ -407,12 +803,296 @@ class PlaylistMoveDeleteSongView(APIView):
         except PlaylistSong.DoesNotExist:
             return Response("Playlist song not found", status=status.HTTP_404_NOT_FOUND)
 
-        songs_to_adjust = PlaylistSong.objects.filter(playlist_id=playlist_id, position__gt=playlist_song.position)
+        positions.remove(playlist_song)
+
+        return Response("Success. Song has been removed from the playlist.", status=status.HTTP_200_OK)
+
 
-        for song in songs_to_adjust:
-            song.position -= 1
-            song.save()
 
-        playlist_song.delete()
+class PlaylistSongBatchView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Edit playlist songs in a batch",
+        operation_description="This endpoint is used to apply several edits to a playlist at once, e.g. after reordering it in an editor. The operations are applied in order, all or none of them, and only the songs whose position changes are written. Pass the version from a previous response to fail with 409 if the playlist has changed since.",
+        manual_parameters=[
+            openapi.Parameter(
+                'playlist_id',
+                openapi.IN_PATH,
+                description="Playlist Id",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'version': openapi.Schema(type=openapi.TYPE_INTEGER, example=3),
+                'operations': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'op': openapi.Schema(type=openapi.TYPE_STRING, enum=list(edits.OPERATIONS), example="move"),
+                            'song': openapi.Schema(type=openapi.TYPE_INTEGER, example=5),
+                            'position': openapi.Schema(type=openapi.TYPE_INTEGER, example=1),
+                            'songs': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER), example=[2,5,3]),
+                        }
+                    )
+                ),
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description="Success. Returns the new version and track count of the playlist."
+            )
+        },
+    )
+    def post(self, request, playlist_id):
+        version = request.data.get('version')
+        if version is not None and not edits.is_integer(version):
+            return Response("Version must be an integer.", status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            playlist = edits.edit(playlist_id, request.data.get('operations'), expected_version=version)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return Response(playlist, status=status.HTTP_200_OK)
+
+
+
+class JobView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Start maintenance job",
+        operation_description="This endpoint is used to start a maintenance job in the background: rebuild_snapshots, recompute_aggregates or rebuild_search_index.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'kind': openapi.Schema(type=openapi.TYPE_STRING, enum=list(jobs.MAINTENANCE_KINDS), example="rebuild_snapshots"),
+            }
+        ),
+        responses={
+            202: openapi.Response(
+                description="Accepted. Returns the job to poll."
+            )
+        },
+    )
+    def post(self, request):
+        kind = request.data.get('kind')
+        if kind not in jobs.MAINTENANCE_KINDS:
+            return Response(f"Kind must be one of {', '.join(jobs.MAINTENANCE_KINDS)}.", status=status.HTTP_400_BAD_REQUEST)
+
+        return job_response(request, jobs.active(kind) or jobs.enqueue(kind))
+
+
+
+class JobStatusView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Job status",
+        operation_description="This endpoint is used to poll the status, progress and result of a background job.",
+        manual_parameters=[
+            openapi.Parameter(
+                'job_id',
+                openapi.IN_PATH,
+                description="Job Id",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request, job_id):
+        try:
+            job = Job.objects.get(pk=job_id)
+        except Job.DoesNotExist:
+            return Response("Job does not exist.", status=status.HTTP_404_NOT_FOUND)
+
+        return Response(JobSerializer(job).data)
+
+
+
+def export_options(request):
+    """Return the format and since_id of an export. The format is given
+    with ?output=, or else picked from the Accept header."""
+    output = request.GET.get('output') or export.format_for_accept(request.META.get('HTTP_ACCEPT', '')) or 'ndjson'
+    if output not in export.FORMATS:
+        raise ServiceError(f"Output must be one of {', '.join(export.FORMATS)}.")
+
+    since_id = request.GET.get('since_id')
+    if since_id is not None:
+        try:
+            since_id = int(since_id)
+        except ValueError:
+            raise ServiceError("since_id must be an integer.")
+    return output, since_id
+
+
+def export_response(output, fields, rows, filename):
+    response = StreamingHttpResponse(export.render(output, fields, rows), content_type=export.CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export.EXTENSIONS[output]}"'
+    return response
+
+
+class SongExportView(APIView):
+    content_negotiation_class = renderers.FallbackContentNegotiation
+
+    @swagger_auto_schema(
+        operation_summary="Export songs",
+        operation_description="This endpoint is used to download the whole song catalog in one streamed response, ordered by ID.",
+        manual_parameters=[
+            openapi.Parameter(
+                'output',
+                openapi.IN_QUERY,
+                description="ndjson (default), csv, columns or msgpack. Can also be picked with the Accept header",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'since_id',
+                openapi.IN_QUERY,
+                description="Resume after this ID",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request):
+        try:
+            output, since_id = export_options(request)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return export_response(output, export.SONG_FIELDS, export.song_rows(since_id), 'songs')
+
+
+
+class PlaylistExportView(APIView):
+    content_negotiation_class = renderers.FallbackContentNegotiation
+
+    @swagger_auto_schema(
+        operation_summary="Export playlists",
+        operation_description="This endpoint is used to download every playlist in one streamed response, ordered by ID.",
+        manual_parameters=[
+            openapi.Parameter(
+                'output',
+                openapi.IN_QUERY,
+                description="ndjson (default), csv, columns or msgpack. Can also be picked with the Accept header",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'since_id',
+                openapi.IN_QUERY,
+                description="Resume after this ID",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request):
+        try:
+            output, since_id = export_options(request)
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return export_response(output, export.PLAYLIST_FIELDS, export.playlist_rows(since_id), 'playlists')
+
+
+
+class PlaylistSongExportView(APIView):
+    content_negotiation_class = renderers.FallbackContentNegotiation
+
+    @swagger_auto_schema(
+        operation_summary="Export playlist songs",
+        operation_description="This endpoint is used to download all the songs of a playlist in order in one streamed response. since_id is the ID of the last song already received.",
+        manual_parameters=[
+            openapi.Parameter(
+                'playlist_id',
+                openapi.IN_PATH,
+                description="Playlist Id",
+                type=openapi.TYPE_INTEGER,
+            ),
+            openapi.Parameter(
+                'output',
+                openapi.IN_QUERY,
+                description="ndjson (default), csv, columns or msgpack. Can also be picked with the Accept header",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                'since_id',
+                openapi.IN_QUERY,
+                description="Resume after this ID",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request, playlist_id):
+        if not Playlist.objects.filter(pk=playlist_id).exists():
+            return Response("Playlist not found", status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            output, since_id = export_options(request)
+            resume_from = export.resume_point(playlist_id, since_id) if since_id is not None else None
+        except ServiceError as e:
+            return Response(e.detail, status=e.status_code)
+
+        rows = export.playlist_song_rows(playlist_id, resume_from)
+        return export_response(output, export.PLAYLIST_SONG_FIELDS, rows, f'playlist-{playlist_id}-songs')
+
+
+
+class CacheStatsView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Response cache statistics",
+        operation_description="This endpoint is used to inspect the hit, miss and eviction counters of the list response cache in this worker.",
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+
+class MetricsView(APIView):
+    @swagger_auto_schema(
+        operation_summary="Request metrics",
+        operation_description="This endpoint is used to scrape the per-route request counters and latency histograms of this worker in the Prometheus text format.",
+        responses={
+            200: openapi.Response(
+                description="Success"
+            )
+        }
+    )
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+
+class OpenAPISchemaView(APIView):
+    swagger_schema = None
+
+    def get(self, request):
+        document = docs.document()
+        if document is None:
+            return Response("The OpenAPI schema has not been generated. Run manage.py generate_openapi.", status=status.HTTP_404_NOT_FOUND)
 
-        return Response("Success. Song has been removed from the playlist.", status=status.HTTP_200_OK)
\ No newline at end of file
+        content, etag, last_modified = document
+        response = conditional.not_modified(request, etag, last_modified)
+        if response is None:
+            response = conditional.add_headers(HttpResponse(content, content_type='application/json'), etag, last_modified)
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,11 +40,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'music_api',
-    'drf_yasg',
 ]
 
 MIDDLEWARE = [
+    'music_api.metrics.metrics_middleware',
+    'music_api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'music_api.database.read_routing_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,13 +79,69 @@ WSGI_APPLICATION = 'playlist_manager.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# The SQLite profile is tuned for a web server with several concurrent
+# workers. WAL lets readers run alongside a writer. Transactions take the
+# write lock when they begin, and a writer waits up to SQLITE_BUSY_TIMEOUT
+# seconds for it instead of failing with "database is locked". Connections
+# are kept open for DATABASE_CONN_MAX_AGE seconds.
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', str(BASE_DIR / 'db.sqlite3'))
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20))
+
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative sizes are in KiB rather than pages.
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+# music_api.backends.sqlite3 is Django's SQLite backend plus the
+# TRANSACTION_MODE and PRAGMAS entries below.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'music_api.backends.sqlite3',
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+        },
+        'TRANSACTION_MODE': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        'PRAGMAS': {
+            'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+            **SQLITE_PRAGMAS,
+        },
     }
 }
 
+# Reads made while serving GET, HEAD and OPTIONS requests go to the
+# "replica" alias when DATABASE_READ_PATH is set. Point it at the primary
+# file for a separate read-only connection, or at a replicated copy of it.
+
+DATABASE_READ_PATH = os.environ.get('DATABASE_READ_PATH')
+
+if DATABASE_READ_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'music_api.backends.sqlite3',
+        'NAME': f'file:{DATABASE_READ_PATH}?mode=ro',
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+        },
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+DATABASE_ROUTERS = ['music_api.database.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -120,6 +179,128 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'music_api': {
+        'BACKEND': os.environ.get('MUSIC_API_CACHE_BACKEND', 'music_api.response_cache.BoundedLocMemCache'),
+        'LOCATION': os.environ.get('MUSIC_API_CACHE_LOCATION', 'music-api-responses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('MUSIC_API_CACHE_MAX_ENTRIES', 100000)),
+            'MAX_BYTES': int(os.environ.get('MUSIC_API_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        },
+    },
+}
+
+
+# Music API
+# Serve the song, playlist and playlist songs lists from async views. Only
+# worthwhile under an ASGI server (playlist_manager.asgi).
+
+MUSIC_API_ASYNC_VIEWS = os.environ.get('MUSIC_API_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# JSON encoder of the API responses. 'orjson' is used when the package is
+# installed and renders the same bytes as 'json', the standard library
+# encoder DRF uses, only faster.
+
+MUSIC_API_JSON_ENCODER = os.environ.get('MUSIC_API_JSON_ENCODER', 'orjson')
+
+# Responses of at least this many bytes are gzipped for clients that send
+# Accept-Encoding: gzip.
+
+MUSIC_API_GZIP_MIN_BYTES = int(os.environ.get('MUSIC_API_GZIP_MIN_BYTES', 1024))
+
+# Page sizes used by the list endpoints. Clients can ask for a different size
+# with ?page_size=, up to MUSIC_API_MAX_PAGE_SIZE.
+
+MUSIC_API_PAGE_SIZE = 10
+
+MUSIC_API_MAX_PAGE_SIZE = 100
+
+# Build the in-memory trigram indexes used by ?fuzzy=true in the background
+# as soon as the first request arrives, instead of on the first fuzzy search.
+# Off under manage.py test, where each test builds the indexes it uses.
+
+MUSIC_API_FUZZY_PRELOAD = sys.argv[1:2] != ['test']
+
+MUSIC_API_FUZZY_MIN_SIMILARITY = 0.3
+
+# Cache alias used for list responses. Cached pages are keyed by the version
+# numbers that every write bumps in the database, so they need no timeout,
+# even when each worker has its own cache. Set the alias to None to turn the
+# response cache off.
+
+MUSIC_API_RESPONSE_CACHE = 'music_api'
+
+MUSIC_API_RESPONSE_CACHE_TIMEOUT = None
+
+# Cache-Control sent with the ETag and Last-Modified of list responses. The
+# default makes clients revalidate every time, which costs one indexed
+# lookup and returns a bodiless 304 when nothing changed. Something like
+# "public, max-age=5" lets a reverse proxy answer for a few seconds itself.
+
+MUSIC_API_CACHE_CONTROL = os.environ.get('MUSIC_API_CACHE_CONTROL', 'no-cache')
+
+# Playlists with at least this many tracks keep a packed copy of their track
+# order, so any page of them is read by slicing it instead of with OFFSET.
+# Set to None to turn snapshots off.
+
+MUSIC_API_SNAPSHOT_MIN_TRACKS = int(os.environ.get('MUSIC_API_SNAPSHOT_MIN_TRACKS', 1000)) or None
+
+
+# The OpenAPI document is written to MUSIC_API_OPENAPI_PATH by
+# `manage.py generate_openapi` and served from /api-docs/openapi.json. The
+# Swagger UI at /api-docs/ needs drf_yasg, which is only imported when
+# MUSIC_API_DOCS is on.
+
+MUSIC_API_DOCS = os.environ.get('MUSIC_API_DOCS', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+MUSIC_API_OPENAPI_PATH = os.environ.get('MUSIC_API_OPENAPI_PATH', str(BASE_DIR / 'openapi.json'))
+
+if MUSIC_API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'openapi-schema',
+}
+
+
+# Background jobs (music_api.jobs) run on this many threads inside the web
+# process. With 0, they wait for `manage.py run_jobs`. Playlists with at
+# least MUSIC_API_JOB_DELETE_MIN_TRACKS tracks are deleted by a job, a
+# batch of rows per transaction, pausing between batches so other writers
+# can take the database lock.
+
+MUSIC_API_JOB_WORKERS = int(os.environ.get('MUSIC_API_JOB_WORKERS', 1))
+
+MUSIC_API_JOB_DELETE_MIN_TRACKS = int(os.environ.get('MUSIC_API_JOB_DELETE_MIN_TRACKS', 10000)) or None
+
+MUSIC_API_JOB_BATCH_SIZE = 1000
+
+MUSIC_API_JOB_PAUSE = 0.01
+
+MUSIC_API_JOB_UPLOAD_DIR = os.environ.get('MUSIC_API_JOB_UPLOAD_DIR')
+
+
+# Share of requests whose SQL, serializer and render time is measured and
+# returned in a Server-Timing header. Every request is counted in the
+# /metrics latency histograms regardless.
+
+MUSIC_API_METRICS_SAMPLE_RATE = float(os.environ.get('MUSIC_API_METRICS_SAMPLE_RATE', 0.1))
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'music_api.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'music_api.renderers.ContentNegotiation',
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -15,26 +15,22 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from django.shortcuts import render
 from django.http import request
+from music_api import docs
+from music_api.views import MetricsView, OpenAPISchemaView
 
 def index(request):
     return render(request, 'index.html')
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Playlist Manager",
-      default_version="v1",
-      description="API Testing",
-    ),
-   public=True,
-)
-
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', index, name='Index'),
     path('api/', include('music_api.urls')),
-    path('api-docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('api-docs/openapi.json', OpenAPISchemaView.as_view(), name='openapi-schema'),
 ]
+
+# The Swagger UI loads the document above instead of generating its own.
+if docs.enabled():
+    urlpatterns.append(path('api-docs/', docs.swagger_ui_view(), name='schema-swagger-ui'))